@@ -1,5 +1,22 @@
-from django.contrib import admin
-from .models import Client, Compte, Transaction
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from .models import (
+    AlerteAnomalie, Client, Compte, CurseurConsommateur, EvenementOutbox, ExecutionVirementPermanent, ReleveArchive, Transaction,
+    VirementInterShard, VirementPermanent
+)
+from .pagination import EstimatedCountPaginator
+from .search import rechercher_ids
+
+
+class RechercheChangeList(ChangeList):
+    """Changelist ordered by search relevance unless a column sort is requested"""
+
+    def get_ordering(self, request, queryset):
+        if self.query and ORDER_VAR not in self.params:
+            return ['rang_recherche', '-pk']
+        return super().get_ordering(request, queryset)
 
 
 @admin.register(Client)
@@ -7,13 +24,35 @@ class ClientAdmin(admin.ModelAdmin):
     list_display = ('nom', 'prenom', 'cni', 'email', 'telephone', 'date_creation')
     search_fields = ('nom', 'prenom', 'cni', 'email')
     list_filter = ('date_creation',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Recherche via l'index plein texte plutôt que des scans icontains
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        ids = rechercher_ids(search_term)
+        rang = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+            default=Value(len(ids)),
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=ids).annotate(rang_recherche=rang), False
+
+    def get_changelist(self, request, **kwargs):
+        return RechercheChangeList
 
 
 @admin.register(Compte)
 class CompteAdmin(admin.ModelAdmin):
-    list_display = ('iban', 'client', 'type_compte', 'solde', 'actif', 'date_ouverture')
+    list_display = ('iban', 'client', 'type_compte', 'solde', 'actif', 'date_ouverture', 'derniere_activite')
+    list_select_related = ('client',)
     search_fields = ('iban', 'client__nom', 'client__prenom')
-    list_filter = ('type_compte', 'actif', 'date_ouverture')
+    list_filter = ('type_compte', 'actif')
+    date_hierarchy = 'date_ouverture'
+    autocomplete_fields = ('client',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     # solde is readonly to maintain data integrity - balance should only change through transactions
     readonly_fields = ('solde',)
 
@@ -21,6 +60,97 @@ class CompteAdmin(admin.ModelAdmin):
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ('type_transaction', 'compte_source', 'compte_destination', 'montant', 'date_transaction')
+    # Compte.__str__ lit client.nom : on joint les clients des deux comptes
+    list_select_related = ('compte_source__client', 'compte_destination__client')
     search_fields = ('compte_source__iban', 'compte_destination__iban', 'description')
-    list_filter = ('type_transaction', 'date_transaction')
+    list_filter = ('type_transaction',)
+    date_hierarchy = 'date_transaction'
+    autocomplete_fields = ('compte_source', 'compte_destination')
     readonly_fields = ('date_transaction',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(VirementPermanent)
+class VirementPermanentAdmin(admin.ModelAdmin):
+    list_display = ('compte_source', 'compte_destination', 'montant', 'frequence', 'prochaine_execution', 'actif')
+    list_select_related = ('compte_source__client', 'compte_destination__client')
+    search_fields = ('compte_source__iban', 'compte_destination__iban', 'description')
+    list_filter = ('frequence', 'actif')
+    date_hierarchy = 'prochaine_execution'
+    autocomplete_fields = ('compte_source', 'compte_destination')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(ExecutionVirementPermanent)
+class ExecutionVirementPermanentAdmin(admin.ModelAdmin):
+    list_display = ('ordre', 'date_echeance', 'statut', 'motif', 'transaction', 'date_execution')
+    list_select_related = ('ordre__compte_source__client', 'ordre__compte_destination__client', 'transaction')
+    list_filter = ('statut',)
+    date_hierarchy = 'date_echeance'
+    raw_id_fields = ('ordre', 'transaction')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(EvenementOutbox)
+class EvenementOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'position', 'type_evenement', 'transaction_id', 'date_creation')
+    list_filter = ('type_evenement',)
+    readonly_fields = ('type_evenement', 'transaction_id', 'donnees', 'date_creation', 'position')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(CurseurConsommateur)
+class CurseurConsommateurAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'dernier_id', 'date_maj')
+
+
+@admin.register(ReleveArchive)
+class ReleveArchiveAdmin(admin.ModelAdmin):
+    list_display = ('compte', 'periode', 'empreinte', 'taille', 'date_creation')
+    list_select_related = ('compte__client',)
+    search_fields = ('compte__iban', 'periode', 'empreinte')
+    readonly_fields = ('compte', 'periode', 'empreinte', 'taille', 'date_creation')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(VirementInterShard)
+class VirementInterShardAdmin(admin.ModelAdmin):
+    list_display = ('reference', 'compte_source', 'iban_destination', 'montant', 'statut', 'date_creation', 'date_maj')
+    list_select_related = ('compte_source__client',)
+    search_fields = ('reference', 'compte_source__iban', 'iban_destination')
+    list_filter = ('statut',)
+    date_hierarchy = 'date_creation'
+    readonly_fields = [champ.name for champ in VirementInterShard._meta.fields]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(AlerteAnomalie)
+class AlerteAnomalieAdmin(admin.ModelAdmin):
+    list_display = ('transaction', 'compte', 'score', 'motifs', 'statut', 'date_creation', 'date_revue')
+    list_select_related = ('compte__client', 'transaction')
+    search_fields = ('compte__iban',)
+    list_filter = ('statut',)
+    date_hierarchy = 'date_creation'
+    ordering = ('-score',)
+    readonly_fields = ('compte', 'transaction', 'score', 'motifs', 'date_creation', 'date_revue')
+    actions = ('marquer_legitime', 'confirmer_fraude')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def _reviser(self, request, queryset, statut):
+        nombre = queryset.filter(statut='A_REVOIR').update(statut=statut, date_revue=timezone.now())
+        self.message_user(request, f"{nombre} alerte(s) revue(s)", messages.SUCCESS)
+
+    @admin.action(description="Marquer comme légitime")
+    def marquer_legitime(self, request, queryset):
+        self._reviser(request, queryset, 'LEGITIME')
+
+    @admin.action(description="Confirmer la fraude")
+    def confirmer_fraude(self, request, queryset):
+        self._reviser(request, queryset, 'FRAUDE')
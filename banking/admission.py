@@ -0,0 +1,280 @@
+"""
+Per-account admission control in front of the write views.
+
+A burst of deposits or transfers on one account would otherwise pile up on the
+same ``select_for_update`` row lock and hold every worker thread. Each account
+gets at most ``CONCURRENCE_MAX`` requests in flight and ``FILE_MAX`` waiting
+for at most ``ATTENTE_MAX`` seconds; anything beyond is answered at once with
+429 and a Retry-After header. A transfer also takes a slot of the account it
+credits.
+
+Two modes, chosen by ``settings.ADMISSION['MODE']``:
+
+- ``local``: in-process counters, shared by the threads of one worker;
+- ``fichier``: ``flock`` slot files in a shared directory, shared by every
+  worker of the host; a crashed worker releases its slots with its file
+  descriptors. Accounts are hashed onto ``BANDES`` stripes so the directory
+  holds a bounded number of files; accounts of one stripe share its slots.
+"""
+import fcntl
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, JsonResponse
+
+CONFIGURATION_DEFAUT = {
+    'MODE': 'local',
+    'CONCURRENCE_MAX': 2,
+    'FILE_MAX': 8,
+    'ATTENTE_MAX': 0.5,
+    'REPERTOIRE': None,
+    'BANDES': 1024,
+}
+
+
+class CompteSature(Exception):
+    """The account already has too many requests in flight"""
+
+    def __init__(self, motif, retry_after):
+        super().__init__(motif)
+        self.motif = motif
+        self.retry_after = retry_after
+
+
+class _Limiteur:
+    """Bounded in-flight concurrency and queue per key, with per-process metrics"""
+
+    def __init__(self, concurrence_max, file_max, attente_max):
+        self.concurrence_max = concurrence_max
+        self.file_max = file_max
+        self.attente_max = attente_max
+        self.retry_after = max(1, math.ceil(attente_max))
+        self._verrou = threading.Lock()
+        self._en_cours = {}
+        self._en_attente = {}
+        self._compteurs = {'admis': 0, 'rejets_file_pleine': 0, 'rejets_delai': 0, 'attente_max_observee': 0}
+
+    def _ajuster(self, table, cle, delta):
+        # Appelé sous self._verrou
+        valeur = table.get(cle, 0) + delta
+        if valeur:
+            table[cle] = valeur
+        else:
+            table.pop(cle, None)
+
+    def _rejeter(self, motif):
+        with self._verrou:
+            self._compteurs[f'rejets_{motif}'] += 1
+        raise CompteSature(motif, self.retry_after)
+
+    def metriques(self):
+        """Snapshot of this process's in-flight and waiting requests per account"""
+        with self._verrou:
+            comptes = {
+                cle: {'en_cours': self._en_cours.get(cle, 0), 'en_attente': self._en_attente.get(cle, 0)}
+                for cle in set(self._en_cours) | set(self._en_attente)
+            }
+            return {
+                'mode': self.mode,
+                'concurrence_max': self.concurrence_max,
+                'file_max': self.file_max,
+                'profondeur_file': sum(self._en_attente.values()),
+                'comptes': comptes,
+                **self._compteurs,
+            }
+
+
+class LimiteurLocal(_Limiteur):
+    """In-process limiter: one condition variable per busy account"""
+    mode = 'local'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._conditions = {}
+
+    def acquerir(self, cle):
+        """Wait for a slot on ``cle``; raises CompteSature when the queue is full or the wait too long"""
+        with self._verrou:
+            if self._en_cours.get(cle, 0) < self.concurrence_max and not self._en_attente.get(cle):
+                self._ajuster(self._en_cours, cle, 1)
+                self._compteurs['admis'] += 1
+                return cle
+            if self._en_attente.get(cle, 0) >= self.file_max:
+                self._compteurs['rejets_file_pleine'] += 1
+                raise CompteSature('file_pleine', self.retry_after)
+
+            condition = self._conditions.setdefault(cle, threading.Condition(self._verrou))
+            self._ajuster(self._en_attente, cle, 1)
+            self._compteurs['attente_max_observee'] = max(
+                self._compteurs['attente_max_observee'], self._en_attente[cle]
+            )
+            fin = time.monotonic() + self.attente_max
+            try:
+                while self._en_cours.get(cle, 0) >= self.concurrence_max:
+                    reste = fin - time.monotonic()
+                    if reste <= 0:
+                        self._compteurs['rejets_delai'] += 1
+                        raise CompteSature('delai', self.retry_after)
+                    condition.wait(reste)
+                self._ajuster(self._en_cours, cle, 1)
+                self._compteurs['admis'] += 1
+                return cle
+            finally:
+                self._ajuster(self._en_attente, cle, -1)
+                if cle not in self._en_attente and cle not in self._en_cours:
+                    self._conditions.pop(cle, None)
+
+    def liberer(self, jeton):
+        with self._verrou:
+            self._ajuster(self._en_cours, jeton, -1)
+            condition = self._conditions.get(jeton)
+            if condition is not None:
+                condition.notify()
+                if jeton not in self._en_cours and jeton not in self._en_attente:
+                    del self._conditions[jeton]
+
+
+class LimiteurFichier(_Limiteur):
+    """Cross-process limiter: a slot is an exclusive ``flock`` on one of N files per account stripe"""
+    mode = 'fichier'
+    SONDAGE_MIN = 0.002
+    SONDAGE_MAX = 0.05
+
+    def __init__(self, repertoire, *args, bandes=CONFIGURATION_DEFAUT['BANDES'], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.repertoire = repertoire
+        self.bandes = bandes
+        os.makedirs(repertoire, exist_ok=True)
+
+    def _verrouiller(self, cle, genre, nombre):
+        """File descriptor holding a free ``genre`` slot of the stripe of ``cle``, or None"""
+        # Au plus BANDES × (CONCURRENCE_MAX + FILE_MAX) fichiers, quel que soit le nombre de comptes
+        bande = cle % self.bandes
+        for i in range(nombre):
+            fd = os.open(os.path.join(self.repertoire, f'{bande}.{genre}.{i}'), os.O_CREAT | os.O_RDWR, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def _admis(self, cle, fd):
+        with self._verrou:
+            self._ajuster(self._en_cours, cle, 1)
+            self._compteurs['admis'] += 1
+        return cle, fd
+
+    def acquerir(self, cle):
+        fd = self._verrouiller(cle, 'slot', self.concurrence_max)
+        if fd is not None:
+            return self._admis(cle, fd)
+
+        # Une place dans la file est elle-même un verrou : la file est bornée entre workers
+        place = self._verrouiller(cle, 'file', self.file_max)
+        if place is None:
+            self._rejeter('file_pleine')
+        with self._verrou:
+            self._ajuster(self._en_attente, cle, 1)
+            self._compteurs['attente_max_observee'] = max(
+                self._compteurs['attente_max_observee'], self._en_attente[cle]
+            )
+        try:
+            fin = time.monotonic() + self.attente_max
+            pause = self.SONDAGE_MIN
+            while True:
+                fd = self._verrouiller(cle, 'slot', self.concurrence_max)
+                if fd is not None:
+                    return self._admis(cle, fd)
+                reste = fin - time.monotonic()
+                if reste <= 0:
+                    self._rejeter('delai')
+                time.sleep(min(pause, reste))
+                pause = min(pause * 2, self.SONDAGE_MAX)
+        finally:
+            os.close(place)
+            with self._verrou:
+                self._ajuster(self._en_attente, cle, -1)
+
+    def liberer(self, jeton):
+        cle, fd = jeton
+        os.close(fd)
+        with self._verrou:
+            self._ajuster(self._en_cours, cle, -1)
+
+
+_limiteur = None
+_verrou_creation = threading.Lock()
+
+
+def limiteur_courant():
+    """Limiter configured by ``settings.ADMISSION`` (None when disabled)"""
+    global _limiteur
+    if _limiteur is None:
+        with _verrou_creation:
+            if _limiteur is None:
+                config = {**CONFIGURATION_DEFAUT, **getattr(settings, 'ADMISSION', {})}
+                parametres = (config['CONCURRENCE_MAX'], config['FILE_MAX'], config['ATTENTE_MAX'])
+                if config['MODE'] == 'fichier':
+                    _limiteur = LimiteurFichier(config['REPERTOIRE'], *parametres, bandes=config['BANDES'])
+                elif config['MODE'] == 'local':
+                    _limiteur = LimiteurLocal(*parametres)
+                else:
+                    _limiteur = False
+    return _limiteur or None
+
+
+@receiver(setting_changed)
+def reinitialiser_limiteur(setting, **kwargs):
+    """Rebuild the limiter when the ADMISSION setting changes (tests)"""
+    global _limiteur
+    if setting == 'ADMISSION':
+        _limiteur = None
+
+
+def controle_admission(reponse_json=False, destination=None):
+    """
+    Guard the POSTs of a view taking ``compte_id`` with the per-account limiter.
+
+    ``destination(request, compte_id)`` names the account a transfer credits
+    (None if unknown): it is admitted too, so a burst towards one hot account
+    is bounded like a burst from it.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def enveloppe(request, compte_id, *args, **kwargs):
+            limiteur = limiteur_courant()
+            if limiteur is None or request.method != 'POST':
+                return vue(request, compte_id, *args, **kwargs)
+            cles = {compte_id}
+            if destination is not None:
+                cles.add(destination(request, compte_id))
+            cles.discard(None)
+            jetons = []
+            try:
+                # Dans l'ordre des ids, comme les verrous de ligne : deux virements croisés ne s'attendent pas
+                for cle in sorted(cles):
+                    jetons.append(limiteur.acquerir(cle))
+            except CompteSature as e:
+                for jeton in reversed(jetons):
+                    limiteur.liberer(jeton)
+                message = "Trop d'opérations simultanées sur ce compte, veuillez réessayer."
+                if reponse_json:
+                    response = JsonResponse({'erreur': message, 'motif': e.motif}, status=429)
+                else:
+                    response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+                response['Retry-After'] = str(e.retry_after)
+                return response
+            try:
+                return vue(request, compte_id, *args, **kwargs)
+            finally:
+                for jeton in reversed(jetons):
+                    limiteur.liberer(jeton)
+        return enveloppe
+    return decorateur
@@ -0,0 +1,202 @@
+"""
+Vectorized balance analytics for a single account.
+
+An account's movements are pulled once as columns (day, amount, sign, type)
+through ``values_list`` and turned into NumPy arrays. Amounts are read as the
+stored integer centimes so sums stay exact; the daily balance series is rebuilt from
+the current balance with ``bincount`` + ``cumsum`` instead of a Python loop.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Transaction as BankTransaction
+from .monnaie import centimes as en_centimes, vers_centimes
+
+
+def en_decimal(centimes):
+    """Integer centimes to a 2-place Decimal"""
+    return Decimal(int(round(centimes))).scaleb(-2)
+
+
+def charger_mouvements(compte, debut):
+    """
+    Movements of ``compte`` since ``debut`` as NumPy columns.
+
+    Returns a dict of arrays: ``jours`` (datetime64[D], local dates),
+    ``centimes`` (int64, signed: positive when money comes in) and ``types``.
+    """
+    entrant = Q(type_transaction='DEPOT') | Q(type_transaction='VIREMENT', compte_destination=compte)
+    lignes = BankTransaction.objects.filter(
+        Q(compte_source=compte) | Q(compte_destination=compte),
+        date_transaction__gte=debut
+    ).annotate(
+        jour=TruncDate('date_transaction'),
+        sens=Case(When(entrant, then=Value(1)), default=Value(-1), output_field=IntegerField()),
+        centimes=en_centimes('montant'),
+    ).order_by().values_list('jour', 'centimes', 'sens', 'type_transaction')
+
+    colonnes = list(zip(*lignes))
+    if not colonnes:
+        return {
+            'jours': np.array([], dtype='datetime64[D]'),
+            'centimes': np.array([], dtype=np.int64),
+            'types': np.array([], dtype='<U8'),
+        }
+
+    jours, centimes, sens, types = colonnes
+    centimes = np.array(centimes, dtype=np.int64)
+    return {
+        'jours': np.array(jours, dtype='datetime64[D]'),
+        'centimes': centimes * np.array(sens, dtype=np.int64),
+        'types': np.array(types),
+    }
+
+
+def serie_soldes(compte, jours=90, maintenant=None):
+    """
+    Daily end-of-day balances (centimes) over the last ``jours`` days.
+
+    The opening balance is derived from the current balance minus the period's
+    net flow, so history before the period is never read.
+    """
+    maintenant = maintenant or timezone.now()
+    premier_jour = timezone.localdate(maintenant) - timedelta(days=jours - 1)
+    debut = np.datetime64(premier_jour, 'D')
+
+    mouvements = charger_mouvements(compte, timezone.make_aware(datetime.combine(premier_jour, time.min)))
+    index = (mouvements['jours'] - debut).astype(np.int64)
+    flux = mouvements['centimes']
+
+    taille = jours
+    entrees = np.bincount(index, weights=np.clip(flux, 0, None), minlength=taille)[:taille]
+    sorties = np.bincount(index, weights=np.clip(-flux, 0, None), minlength=taille)[:taille]
+
+    # Solde d'ouverture = solde actuel moins le flux net de la période
+    solde_initial = vers_centimes(compte.solde) - int(flux.sum())
+    soldes = solde_initial + np.cumsum(entrees - sorties)
+
+    return {
+        'dates': debut + np.arange(taille),
+        'soldes': soldes,
+        'entrees': entrees,
+        'sorties': sorties,
+        'mouvements': mouvements,
+    }
+
+
+def moyenne_mobile(valeurs, fenetre):
+    """Trailing moving average; the first values average what is available"""
+    if len(valeurs) == 0:
+        return np.array([], dtype=np.float64)
+    cumul = np.cumsum(np.insert(valeurs.astype(np.float64), 0, 0.0))
+    positions = np.arange(1, len(valeurs) + 1)
+    effectif = np.minimum(positions, fenetre)
+    return (cumul[positions] - cumul[positions - effectif]) / effectif
+
+
+def indicateurs(serie, fenetre=30):
+    """Summary statistics over the last ``fenetre`` days of a balance series"""
+    soldes = serie['soldes'][-fenetre:]
+    entrees = serie['entrees'][-fenetre:].sum()
+    sorties = serie['sorties'][-fenetre:].sum()
+    variations = np.diff(serie['soldes'][-(fenetre + 1):])
+    p10, p50, p90 = np.percentile(soldes, [10, 50, 90])
+
+    return {
+        'solde_min': en_decimal(soldes.min()),
+        'solde_max': en_decimal(soldes.max()),
+        'solde_moyen': en_decimal(soldes.mean()),
+        'percentiles': {'p10': en_decimal(p10), 'p50': en_decimal(p50), 'p90': en_decimal(p90)},
+        'volatilite': en_decimal(variations.std()) if len(variations) else Decimal('0.00'),
+        'entrees': en_decimal(entrees),
+        'sorties': en_decimal(sorties),
+        'ratio_entrees_sorties': round(float(entrees / sorties), 4) if sorties else None,
+    }
+
+
+def totaux_par_type(serie, depuis):
+    """Totals and counts per operation type since ``depuis`` (a date)"""
+    mouvements = serie['mouvements']
+    recents = mouvements['jours'] >= np.datetime64(depuis, 'D')
+    centimes = mouvements['centimes'][recents]
+    types = mouvements['types'][recents]
+
+    totaux = {}
+    for nom, masque in (
+        ('depots', types == 'DEPOT'),
+        ('retraits', types == 'RETRAIT'),
+        ('virements_envoyes', (types == 'VIREMENT') & (centimes < 0)),
+        ('virements_recus', (types == 'VIREMENT') & (centimes > 0)),
+    ):
+        totaux[f'total_{nom}'] = en_decimal(np.abs(centimes[masque]).sum())
+        totaux[f'count_{nom}'] = int(masque.sum())
+    totaux['transaction_count'] = int(recents.sum())
+    return totaux
+
+
+def lttb(x, y, seuil):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; each bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the average of the next bucket, which preserves peaks and troughs.
+    """
+    n = len(x)
+    if seuil >= n or seuil < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bornes = np.linspace(1, n - 1, seuil - 1).astype(np.int64)
+    indices = np.empty(seuil, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(seuil - 2):
+        debut, fin = bornes[i], bornes[i + 1]
+        if i + 2 < len(bornes):
+            suivant = slice(bornes[i + 1], bornes[i + 2])
+            moyenne_x, moyenne_y = x[suivant].mean(), y[suivant].mean()
+        else:
+            moyenne_x, moyenne_y = x[-1], y[-1]
+        aires = np.abs(
+            (x[a] - moyenne_x) * (y[debut:fin] - y[a])
+            - (x[a] - x[debut:fin]) * (moyenne_y - y[a])
+        )
+        a = debut + int(np.argmax(aires))
+        indices[i + 1] = a
+    return indices
+
+
+def courbe_soldes(compte, jours=90, points=200, maintenant=None):
+    """Daily balance curve downsampled to at most ``points`` points with LTTB"""
+    serie = serie_soldes(compte, jours=jours, maintenant=maintenant)
+    soldes = serie['soldes'] / 100
+    gardes = lttb(np.arange(len(soldes)), soldes, points)
+    return {
+        'compte_id': compte.id,
+        'total': len(soldes),
+        'dates': [str(d) for d in serie['dates'][gardes]],
+        'soldes': soldes[gardes].round(2).tolist(),
+    }
+
+
+def analyser_compte(compte, jours=90, fenetre=30, fenetre_mobile=7, maintenant=None):
+    """Balance series and indicators for one account, JSON-serializable"""
+    serie = serie_soldes(compte, jours=jours, maintenant=maintenant)
+    resultat = indicateurs(serie, fenetre=min(fenetre, jours))
+    resultat.update({
+        'compte_id': compte.id,
+        'jours': jours,
+        'fenetre': fenetre,
+        'dates': [str(d) for d in serie['dates']],
+        'soldes': (serie['soldes'] / 100).round(2).tolist(),
+        'moyenne_mobile': (moyenne_mobile(serie['soldes'], fenetre_mobile) / 100).round(2).tolist(),
+    })
+    return resultat
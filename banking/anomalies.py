@@ -0,0 +1,126 @@
+"""
+Streaming anomaly scoring of withdrawals and outgoing transfers.
+
+Each debit is scored in constant time against the running statistics of its
+account kept in one ``ProfilRisque`` row, never against the account history:
+
+- amount: z-score against the mean and variance of the account's previous
+  debits, maintained with Welford's algorithm (numerically stable, one pass);
+- velocity: number of debits since the start of the current window of
+  ``FENETRE_VELOCITE`` seconds.
+
+The profile is read and written in the operation's transaction, after the
+account row is locked, so concurrent debits of one account are scored one
+after the other. A debit over ``SEUIL_Z`` or ``OPERATIONS_MAX_FENETRE`` is
+not blocked: it lands in the ``AlerteAnomalie`` review queue. Standing orders
+are pre-authorized and neither scored nor counted.
+
+``reconstruire_profils`` rebuilds every profile from the history in one
+streaming pass (command ``rejouer_profils_risque``).
+"""
+import logging
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import AlerteAnomalie, ExecutionVirementPermanent, ProfilRisque, Transaction as BankTransaction
+from .shards import liste_shards, shard
+
+logger = logging.getLogger(__name__)
+
+CONFIGURATION_DEFAUT = {
+    'SEUIL_Z': 4.0,
+    'HISTORIQUE_MIN': 10,  # débits observés avant de juger un montant
+    'FENETRE_VELOCITE': 3600,  # secondes
+    'OPERATIONS_MAX_FENETRE': 10,
+}
+
+# Plancher de l'écart type, relatif à la moyenne : un loyer toujours identique
+# ne rend pas suspect le moindre centime de plus
+ECART_TYPE_MIN = 0.05
+
+
+def configuration():
+    """Scoring settings, read at call time so they can be overridden"""
+    return {**CONFIGURATION_DEFAUT, **getattr(settings, 'ANOMALIES', {})}
+
+
+def debits_notes():
+    """Transactions seen by the scoring: withdrawals and outgoing transfers, standing orders excepted"""
+    return BankTransaction.objects.filter(
+        type_transaction__in=['RETRAIT', 'VIREMENT'], compte_source__isnull=False,
+    ).exclude(Exists(ExecutionVirementPermanent.objects.filter(transaction=OuterRef('pk'))))
+
+
+def _observer(profil, montant, instant, config):
+    """Score one debit against ``profil``, then fold it in; returns (score, motifs)"""
+    valeur = float(montant)
+    score, motifs = 0.0, []
+
+    if profil.nombre >= max(config['HISTORIQUE_MIN'], 2):
+        ecart_type = max(math.sqrt(profil.m2 / (profil.nombre - 1)), ECART_TYPE_MIN * abs(profil.moyenne), 0.01)
+        score = (valeur - profil.moyenne) / ecart_type
+        if score >= config['SEUIL_Z']:
+            motifs.append(f"montant inhabituel (z={score:.1f})")
+
+    fenetre = timedelta(seconds=config['FENETRE_VELOCITE'])
+    if profil.debut_fenetre is None or instant - profil.debut_fenetre >= fenetre:
+        profil.debut_fenetre, profil.operations_fenetre = instant, 0
+    profil.operations_fenetre += 1
+    if profil.operations_fenetre > config['OPERATIONS_MAX_FENETRE']:
+        motifs.append(f"{profil.operations_fenetre} débits en {config['FENETRE_VELOCITE'] // 60} min")
+        # Ramené à l'échelle du z-score pour trier la file de revue
+        score = max(score, config['SEUIL_Z'] * profil.operations_fenetre / config['OPERATIONS_MAX_FENETRE'])
+
+    # Welford
+    profil.nombre += 1
+    ecart = valeur - profil.moyenne
+    profil.moyenne += ecart / profil.nombre
+    profil.m2 += ecart * (valeur - profil.moyenne)
+    return score, motifs
+
+
+def noter_operation(trans):
+    """Score a debit inside its atomic block, after the account lock; returns its AlerteAnomalie or None"""
+    config = configuration()
+    profil = ProfilRisque.objects.select_for_update().filter(compte_id=trans.compte_source_id).first()
+    nouveau = profil is None
+    if nouveau:
+        profil = ProfilRisque(compte_id=trans.compte_source_id)
+    score, motifs = _observer(profil, trans.montant, trans.date_transaction, config)
+    profil.save(force_insert=nouveau)
+    if not motifs:
+        return None
+
+    logger.info("Transaction %s du compte %s signalée : %s", trans.id, trans.compte_source_id, ', '.join(motifs))
+    return AlerteAnomalie.objects.create(
+        compte_id=trans.compte_source_id, transaction=trans, score=score, motifs=' ; '.join(motifs)[:200],
+    )
+
+
+def reconstruire_profils():
+    """Rebuild the profiles of every shard from the debits history; returns the number of profiles"""
+    config = configuration()
+    total = 0
+    for alias in liste_shards():
+        with shard(alias), transaction.atomic(using=alias):
+            total += _reconstruire_shard(config)
+    return total
+
+
+def _reconstruire_shard(config):
+    # Un seul passage dans l'ordre chronologique, un profil en mémoire par compte
+    profils = {}
+    debits = debits_notes().order_by('date_transaction', 'id').values_list('compte_source_id', 'montant', 'date_transaction')
+    for compte_id, montant, instant in debits.iterator(chunk_size=2000):
+        profil = profils.get(compte_id)
+        if profil is None:
+            profil = profils[compte_id] = ProfilRisque(compte_id=compte_id)
+        _observer(profil, montant, instant, config)
+
+    ProfilRisque.objects.all().delete()
+    ProfilRisque.objects.bulk_create(profils.values(), batch_size=1000)
+    return len(profils)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BankingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'banking'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from banking_project.database import appliquer_pragmas_sqlite
+        from . import signals  # noqa: F401
+
+        connection_created.connect(appliquer_pragmas_sqlite)
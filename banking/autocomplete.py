@@ -0,0 +1,89 @@
+"""
+IBAN prefix lookup used by the transfer form autocomplete.
+
+Prefixes are matched with a range predicate (``iban >= p AND iban < p + U+FFFF``)
+so the unique IBAN index is used on every backend, and recent answers are kept
+in a small per-process LRU cache cleared whenever an account changes. With
+several shards each one is read in IBAN order and the answers are merged.
+"""
+import threading
+import time
+from collections import OrderedDict
+from heapq import merge
+from itertools import islice
+from operator import itemgetter
+
+from .models import Compte
+from .shards import liste_shards, sharding_actif
+
+PREFIXE_MIN = 4
+RESULTATS_MAX = 10
+
+
+class CacheBorne:
+    """Small thread-safe LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, taille_max=512, ttl=30):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            expiration, valeur = entree
+            if expiration < time.monotonic():
+                del self._entrees[cle]
+                return None
+            self._entrees.move_to_end(cle)
+            return valeur
+
+    def set(self, cle, valeur):
+        with self._verrou:
+            self._entrees[cle] = (time.monotonic() + self.ttl, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def clear(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def __len__(self):
+        return len(self._entrees)
+
+
+cache_ibans = CacheBorne()
+
+
+def normaliser_iban(valeur):
+    """Uppercase an IBAN and drop the spaces of its printed form"""
+    return (valeur or '').replace(' ', '').upper()
+
+
+def rechercher_ibans(prefixe, limite=RESULTATS_MAX):
+    """Active accounts whose IBAN starts with ``prefixe``"""
+    prefixe = normaliser_iban(prefixe)
+    if len(prefixe) < PREFIXE_MIN:
+        return []
+
+    cle = (prefixe, limite)
+    resultats = cache_ibans.get(cle)
+    if resultats is None:
+        requete = Compte.objects.filter(
+            iban__gte=prefixe, iban__lt=prefixe + '\uffff', actif=True
+        ).order_by('iban').values_list('id', 'iban', 'client__nom', 'client__prenom')
+        if sharding_actif():
+            parties = [requete.using(alias)[:limite] for alias in liste_shards()]
+            lignes = islice(merge(*parties, key=itemgetter(1)), limite)
+        else:
+            lignes = requete[:limite]
+        resultats = [
+            {'id': pk, 'iban': iban, 'titulaire': f"{nom} {prenom}"}
+            for pk, iban, nom, prenom in lignes
+        ]
+        cache_ibans.set(cle, resultats)
+    return resultats
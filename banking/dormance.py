@@ -0,0 +1,83 @@
+"""
+Dormant accounts.
+
+``Compte.derniere_activite`` is written together with the balance by every
+movement of the account (operations, legs of cross-shard transfers, standing
+orders), so the last activity of an account is one column read instead of a
+``MAX(date_transaction)`` over both directions of its transactions. Interest
+credits are not an activity of the holder and leave it unchanged.
+
+``traiter_comptes_dormants`` deactivates, shard by shard, the active accounts
+without activity for ``DORMANCE_DELAI_JOURS`` days with a single UPDATE on a
+range of the partial index ``compte_activite_idx`` (command
+``traiter_comptes_dormants``). ``dater_activite`` recomputes every stamp from
+the history (command ``dater_activite_comptes``, run once after the migration
+that added the column).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .autocomplete import cache_ibans
+from .models import Compte, InteretCompte, Transaction as BankTransaction
+from .rollups import decompter_desactivations
+from .shards import liste_shards, shard
+
+DELAI_JOURS_DEFAUT = 365
+
+
+def seuil_dormance(maintenant=None):
+    """Accounts without activity since this instant are dormant"""
+    delai = int(getattr(settings, 'DORMANCE_DELAI_JOURS', DELAI_JOURS_DEFAUT))
+    return (maintenant or timezone.now()) - timedelta(days=delai)
+
+
+def comptes_dormants(seuil):
+    """Active accounts of the current shard without activity since ``seuil``"""
+    return Compte.objects.filter(actif=True, derniere_activite__lt=seuil)
+
+
+def traiter_comptes_dormants(maintenant=None, simulation=False):
+    """Deactivate the dormant accounts of every shard; returns their number per shard"""
+    seuil = seuil_dormance(maintenant)
+    rapport = {}
+    for alias in liste_shards():
+        with shard(alias), transaction.atomic(using=alias):
+            dormants = comptes_dormants(seuil).order_by()
+            if simulation:
+                rapport[alias] = dormants.count()
+                continue
+            # Verrou des lignes visées, pour les statistiques par type, puis un seul UPDATE sur le même intervalle
+            desactives = list(dormants.select_for_update().values_list('id', 'type_compte'))
+            rapport[alias] = dormants.update(actif=False)
+            decompter_desactivations(desactives)
+    if any(rapport.values()) and not simulation:
+        # Signaux de Compte contournés par update()
+        cache_ibans.clear()
+    return rapport
+
+
+def _derniere_operation(champ):
+    """Date of the newest non-interest transaction with the outer account as ``champ``"""
+    return Subquery(
+        BankTransaction.objects.filter(**{champ: OuterRef('pk')})
+        .exclude(Exists(InteretCompte.objects.filter(transaction=OuterRef('pk'))))
+        .order_by('-date_transaction').values('date_transaction')[:1]
+    )
+
+
+def dater_activite():
+    """Recompute ``derniere_activite`` of every account from its transactions; returns the number of accounts"""
+    total = 0
+    for alias in liste_shards():
+        with shard(alias), transaction.atomic(using=alias):
+            # Sans mouvement : la date d'ouverture
+            total += Compte.objects.update(derniere_activite=Greatest(
+                Coalesce(_derniere_operation('compte_source'), F('date_ouverture')),
+                Coalesce(_derniere_operation('compte_destination'), F('date_ouverture')),
+            ))
+    return total
@@ -1,16 +1,67 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
-from .models import Compte
+from django.db.models import Q
+from django.urls import reverse_lazy
+from django.utils import timezone
+from .autocomplete import normaliser_iban
+from .models import Compte, Transaction
+from .search import filtrer_description
+from .shards import liste_shards
+
+
+class IbanAutocompleteInput(forms.TextInput):
+    """Text input wired to the IBAN prefix lookup endpoint"""
+
+    def __init__(self, attrs=None):
+        defaults = {
+            'class': 'form-control iban-autocomplete',
+            'autocomplete': 'off',
+            'data-url': reverse_lazy('api_recherche_iban'),
+            'placeholder': 'CM76...',
+        }
+        defaults.update(attrs or {})
+        super().__init__(defaults)
+
+
+class CompteIbanField(forms.CharField):
+    """Account chosen by IBAN, resolved with a single keyed lookup"""
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        kwargs.setdefault('max_length', 34)
+        kwargs.setdefault('widget', IbanAutocompleteInput)
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, Compte):
+            return value.iban
+        return super().prepare_value(value)
+
+    def to_python(self, value):
+        if isinstance(value, Compte):
+            value = value.iban
+        return normaliser_iban(super().to_python(value))
+
+    def clean(self, value):
+        iban = super().clean(value)
+        if not iban:
+            return None
+        try:
+            return self.queryset.select_related('client').get(iban=iban)
+        except Compte.DoesNotExist:
+            raise forms.ValidationError("Aucun compte actif ne correspond à cet IBAN.")
+
 
 class VirementForm(forms.Form):
-    compte_source = forms.ModelChoiceField(
+    compte_source = CompteIbanField(
         queryset=Compte.objects.filter(actif=True),
         label="Compte source",
-        widget=forms.Select(attrs={'class': 'form-control'})
     )
     iban_destination = forms.CharField(
         max_length=34,
         label="IBAN destination",
-        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'FR76...'})
+        widget=IbanAutocompleteInput()
     )
     montant = forms.DecimalField(
         max_digits=12,
@@ -32,16 +83,124 @@ class VirementForm(forms.Form):
         if client:
             self.fields['compte_source'].queryset = Compte.objects.filter(client=client, actif=True)
 
+    def clean_iban_destination(self):
+        iban = normaliser_iban(self.cleaned_data['iban_destination'])
+        # Le destinataire peut être sur un autre shard que le compte source
+        if not any(Compte.objects.using(alias).filter(iban=iban, actif=True).exists() for alias in liste_shards()):
+            raise forms.ValidationError("Le compte destinataire avec cet IBAN n'existe pas.")
+        return iban
+
     def clean(self):
         cleaned_data = super().clean()
         compte_source = cleaned_data.get('compte_source')
         iban_destination = cleaned_data.get('iban_destination')
-        montant = cleaned_data.get('montant')
 
         if compte_source and iban_destination and (compte_source.iban == iban_destination):
             raise forms.ValidationError("Le compte de destination ne peut pas être le même que le compte source.")
 
-        if compte_source and montant and (compte_source.solde < montant):
-            raise forms.ValidationError("Solde insuffisant sur le compte source.")
-        
+        # Le solde est vérifié sous verrou au moment du débit (effectuer_virement),
+        # ce qui permet aussi de rejouer une requête idempotente déjà exécutée.
         return cleaned_data
+
+
+def _debut_du_jour(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+class FiltresHistoriqueForm(forms.Form):
+    """
+    Filters of the global transaction history.
+
+    Every filter becomes a predicate an index can serve: dates are compared as
+    aware datetime ranges on ``date_transaction`` (never ``__date``, which
+    wraps the column in a function), an IBAN or a client is resolved to
+    account ids first, and the keyword goes through the description index.
+    """
+    PERIODE_CHOICES = [
+        ('', 'Toutes'),
+        ('7d', '7 derniers jours'),
+        ('30d', '30 derniers jours'),
+        ('last_month', 'Mois dernier'),
+    ]
+    PERIODES_GLISSANTES = {'7d': 7, '30d': 30}
+
+    type = forms.ChoiceField(choices=[('', 'Tous')] + Transaction.TYPE_CHOICES, required=False, label="Type")
+    periode = forms.ChoiceField(choices=PERIODE_CHOICES, required=False, label="Période")
+    du = forms.DateField(required=False, label="Du")
+    au = forms.DateField(required=False, label="Au")
+    montant_min = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0, required=False, label="Montant min")
+    montant_max = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0, required=False, label="Montant max")
+    iban = forms.CharField(max_length=34, required=False, label="IBAN")
+    client = forms.IntegerField(min_value=1, required=False, label="N° client")
+    q = forms.CharField(max_length=100, required=False, label="Description")
+
+    def clean_iban(self):
+        return normaliser_iban(self.cleaned_data['iban'])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        du, au = cleaned_data.get('du'), cleaned_data.get('au')
+        if du and au and du > au:
+            self.add_error('au', "La date de fin précède la date de début.")
+        montant_min, montant_max = cleaned_data.get('montant_min'), cleaned_data.get('montant_max')
+        if montant_min is not None and montant_max is not None and montant_min > montant_max:
+            self.add_error('montant_max', "Le montant maximum est inférieur au minimum.")
+        return cleaned_data
+
+    def filtres(self):
+        """Valid filters only: an invalid field is reported and ignored"""
+        if not self.is_bound:
+            return {}
+        if not hasattr(self, 'cleaned_data'):
+            self.is_valid()
+        return {champ: valeur for champ, valeur in self.cleaned_data.items() if valeur not in (None, '')}
+
+    def bornes(self, maintenant=None):
+        """(start, end) aware datetimes of the requested dates, end excluded; None when open"""
+        filtres = self.filtres()
+        maintenant = maintenant or timezone.now()
+        debut = fin = None
+        periode = filtres.get('periode')
+        if periode in self.PERIODES_GLISSANTES:
+            debut = maintenant - timedelta(days=self.PERIODES_GLISSANTES[periode])
+        elif periode == 'last_month':
+            fin = _debut_du_jour(timezone.localdate(maintenant).replace(day=1))
+            debut = _debut_du_jour((fin.date() - timedelta(days=1)).replace(day=1))
+        if 'du' in filtres:
+            debut = max(filter(None, [debut, _debut_du_jour(filtres['du'])]))
+        if 'au' in filtres:
+            fin = min(filter(None, [fin, _debut_du_jour(filtres['au'] + timedelta(days=1))]))
+        return debut, fin
+
+    def filtrer(self, transactions, maintenant=None):
+        """Apply the valid filters to a Transaction queryset"""
+        filtres = self.filtres()
+        if 'type' in filtres:
+            transactions = transactions.filter(type_transaction=filtres['type'])
+
+        debut, fin = self.bornes(maintenant)
+        if debut is not None:
+            transactions = transactions.filter(date_transaction__gte=debut)
+        if fin is not None:
+            transactions = transactions.filter(date_transaction__lt=fin)
+
+        if 'montant_min' in filtres:
+            transactions = transactions.filter(montant__gte=filtres['montant_min'])
+        if 'montant_max' in filtres:
+            transactions = transactions.filter(montant__lte=filtres['montant_max'])
+
+        if 'iban' in filtres:
+            # Un compte du shard par son id, sinon la contrepartie d'un virement inter-shards
+            compte_id = Compte.objects.filter(iban=filtres['iban']).values_list('id', flat=True).first()
+            if compte_id is not None:
+                transactions = transactions.filter(Q(compte_source_id=compte_id) | Q(compte_destination_id=compte_id))
+            else:
+                transactions = transactions.filter(iban_contrepartie=filtres['iban'])
+
+        if 'client' in filtres:
+            comptes = list(Compte.objects.filter(client_id=filtres['client']).values_list('id', flat=True))
+            transactions = transactions.filter(Q(compte_source_id__in=comptes) | Q(compte_destination_id__in=comptes))
+
+        if 'q' in filtres:
+            transactions = filtrer_description(transactions, filtres['q'])
+        return transactions
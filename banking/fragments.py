@@ -0,0 +1,44 @@
+"""
+Versions of the data shown in cached template fragments.
+
+Fragment keys (``{% cache %}``) carry the values that identify what a fragment
+shows: an account row its id and balance, a transaction table the newest
+transaction id it contains. Data that has no such marker, like client names
+printed in the tables, gets a version counter, bumped by signals whenever it
+changes; putting the counter in the key retires every fragment that showed the
+old data.
+
+The counters are ``SequenceShard`` rows of the ``default`` database, not cache
+entries: every worker reads the same value and eviction never resets it. They
+are bumped once the change commits, so a fragment rendered under the new
+version never shows the old data.
+"""
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+
+from .models import SequenceShard
+
+PREFIXE = 'fragments.version.'
+
+
+def version(espace):
+    """Current version number of ``espace`` (e.g. ``'clients'``)"""
+    nom = PREFIXE + espace
+    return SequenceShard.objects.using(DEFAULT_DB_ALIAS).filter(nom=nom).values_list('valeur', flat=True).first() or 0
+
+
+def invalider(espace, using=DEFAULT_DB_ALIAS):
+    """Bump the version of ``espace`` when the transaction in progress on ``using`` commits"""
+    transaction.on_commit(lambda: _incrementer(PREFIXE + espace), using=using)
+
+
+def _incrementer(nom):
+    sequences = SequenceShard.objects.using(DEFAULT_DB_ALIAS)
+    if sequences.filter(nom=nom).update(valeur=F('valeur') + 1):
+        return
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            sequences.create(nom=nom, valeur=1)
+    except IntegrityError:
+        # Créée entre-temps par un autre worker
+        sequences.filter(nom=nom).update(valeur=F('valeur') + 1)
@@ -0,0 +1,219 @@
+"""
+In-memory ledger replay, without model instances.
+
+``GrandLivre`` keeps balances as whole centimes in a flat ``array('q')``
+indexed through a dict of account ids. Rows are streamed with
+``values_list().iterator()``, with the amounts read as raw centimes
+(``monnaie.centimes``): no model instance and no Decimal is built per row.
+
+Every balance change is a Transaction row:
+
+- DEPOT credits ``compte_source`` (interest included);
+- RETRAIT and VIREMENT debit ``compte_source`` when it is set;
+- VIREMENT credits ``compte_destination`` when it is set (the credit leg of
+  a cross-shard transfer has no source, and its debit leg no destination).
+
+So on every shard ``Compte.solde == solde_ouverture + movements``.
+``verifier`` replays the history and checks this, and can write back the
+replayed balances of the accounts it is given. ``simuler`` replays it in order
+under other rules (for example another daily withdrawal limit) and counts what
+they would have refused. Both are run by the ``rejouer_grand_livre`` command.
+
+Accounts are loaded before the transactions are streamed, in a second query:
+an account opened in between has movements but no entry. The legs of such
+movements on that account are skipped, like the other shard's leg of a
+cross-shard transfer, and the account ids reported in ``GrandLivre.inconnus``.
+"""
+import time
+from array import array
+from collections import Counter
+
+from django.db import connections, transaction
+from django.db.models.functions import TruncDate
+
+from .models import Compte, Transaction as BankTransaction
+from .monnaie import centimes
+from .shards import base_courante, liste_shards, shard
+
+TAILLE_PAQUET = 10_000
+
+
+class GrandLivre:
+    """Balances in centimes of a set of accounts"""
+    __slots__ = ('positions', 'ids', 'soldes', 'inconnus')
+
+    def __init__(self):
+        self.positions = {}
+        self.ids = array('q')
+        self.soldes = array('q')
+        # Comptes absents du livre (ouverts après son chargement) dont des mouvements ont été écartés
+        self.inconnus = set()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ouvrir(self, compte_id, solde=0):
+        self.positions[compte_id] = len(self.ids)
+        self.ids.append(compte_id)
+        self.soldes.append(solde)
+
+    def solde(self, compte_id):
+        return self.soldes[self.positions[compte_id]]
+
+    def appliquer(self, mouvements):
+        """Apply ``(type, source_id, destination_id, centimes)`` rows as recorded; returns their number"""
+        positions, soldes, inconnus = self.positions, self.soldes, self.inconnus
+        nombre = 0
+        for nombre, (type_transaction, source, destination, montant) in enumerate(mouvements, 1):
+            if source is not None:
+                position = positions.get(source)
+                if position is None:
+                    inconnus.add(source)
+                else:
+                    soldes[position] += montant if type_transaction == 'DEPOT' else -montant
+            if destination is not None:
+                position = positions.get(destination)
+                if position is None:
+                    inconnus.add(destination)
+                else:
+                    soldes[position] += montant
+        return nombre
+
+    def simuler(self, mouvements, regles=()):
+        """
+        Replay dated ``(type, source_id, destination_id, centimes, jour)`` rows in order.
+
+        A debit beyond the balance or refused by one of ``regles`` is skipped,
+        together with its credit when both accounts are here. Returns the
+        number of accepted rows and the refusals per reason.
+        """
+        positions, soldes = self.positions, self.soldes
+        acceptes, refus = 0, Counter()
+        for type_transaction, source, destination, montant, jour in mouvements:
+            # Jambe d'un compte absent du livre : ignorée, comme celle de l'autre shard d'un virement
+            if source is not None and source not in positions:
+                self.inconnus.add(source)
+                source = None
+            if destination is not None and destination not in positions:
+                self.inconnus.add(destination)
+                destination = None
+            if source is not None and type_transaction != 'DEPOT':
+                position = positions[source]
+                motif = "Solde insuffisant" if soldes[position] < montant else None
+                for regle in regles:
+                    motif = motif or regle.refuser(position, type_transaction, montant, jour)
+                if motif:
+                    refus[motif] += 1
+                    continue
+                for regle in regles:
+                    regle.enregistrer(position, type_transaction, montant, jour)
+                soldes[position] -= montant
+            elif source is not None:
+                soldes[positions[source]] += montant
+            if destination is not None:
+                soldes[positions[destination]] += montant
+            acceptes += 1
+        return acceptes, refus
+
+
+class PlafondJournalier:
+    """Rule: at most ``plafond`` centimes of ``types`` debits per account and day"""
+    __slots__ = ('plafond', 'types', 'motif', 'jours', 'cumuls')
+
+    def __init__(self, livre, plafond, types=('RETRAIT',)):
+        self.plafond = plafond
+        self.types = frozenset(types)
+        self.motif = f"Plafond journalier de {plafond // 100} dépassé"
+        # Jour (ordinal) et cumul du dernier débit de chaque compte
+        self.jours = array('q', bytes(8 * len(livre)))
+        self.cumuls = array('q', bytes(8 * len(livre)))
+
+    def _cumul(self, position, jour):
+        return self.cumuls[position] if self.jours[position] == jour.toordinal() else 0
+
+    def refuser(self, position, type_transaction, montant, jour):
+        if type_transaction in self.types and self._cumul(position, jour) + montant > self.plafond:
+            return self.motif
+        return None
+
+    def enregistrer(self, position, type_transaction, montant, jour):
+        if type_transaction in self.types:
+            self.cumuls[position] = self._cumul(position, jour) + montant
+            self.jours[position] = jour.toordinal()
+
+
+def charger_comptes(verrouiller=False):
+    """Ledger of the accounts of the current shard at their opening balance"""
+    livre = GrandLivre()
+    comptes = Compte.objects.order_by()
+    if verrouiller:
+        comptes = comptes.select_for_update()
+    for compte_id, solde in comptes.values_list('id', centimes('solde_ouverture')).iterator(chunk_size=TAILLE_PAQUET):
+        livre.ouvrir(compte_id, solde)
+    return livre
+
+
+def mouvements(dates=False):
+    """Transactions of the current shard as streamed tuples; in order and with their local day if ``dates``"""
+    colonnes = ('type_transaction', 'compte_source_id', 'compte_destination_id', centimes('montant'))
+    if dates:
+        requete = BankTransaction.objects.annotate(jour=TruncDate('date_transaction')).order_by(
+            'date_transaction', 'id'
+        ).values_list(*colonnes, 'jour')
+    else:
+        requete = BankTransaction.objects.order_by().values_list(*colonnes)
+    return requete.iterator(chunk_size=TAILLE_PAQUET)
+
+
+def verifier(corriger=()):
+    """
+    Replay every shard and compare with ``Compte.solde``.
+
+    Returns the counts, the duration, the differences
+    ``(compte_id, rejoué, enregistré)`` in centimes and the accounts skipped
+    because they were opened during the replay. Without ``corriger`` the
+    accounts are not locked, so an operation running meanwhile can show up as
+    a difference. ``corriger`` lists the accounts whose replayed balance is
+    written back, after review: the history may be the wrong side, e.g. when
+    deleting a counterparty account cascaded to its transfers. Each shard's
+    accounts are then locked while it is replayed.
+    """
+    corriger = set(corriger)
+    rapport = {'comptes': 0, 'mouvements': 0, 'ecarts': [], 'corriges': [], 'inconnus': set(), 'duree': 0.0}
+    debut = time.perf_counter()
+    for alias in liste_shards():
+        with shard(alias), transaction.atomic(using=alias):
+            livre = charger_comptes(verrouiller=bool(corriger))
+            rapport['mouvements'] += livre.appliquer(mouvements())
+            rapport['comptes'] += len(livre)
+            rapport['inconnus'] |= livre.inconnus
+            soldes = Compte.objects.order_by().values_list('id', centimes('solde'))
+            ecarts = [
+                (compte_id, livre.solde(compte_id), solde)
+                for compte_id, solde in soldes.iterator(chunk_size=TAILLE_PAQUET)
+                if compte_id in livre.positions and livre.solde(compte_id) != solde
+            ]
+            corriges = [(compte_id, rejoue) for compte_id, rejoue, _ in ecarts if compte_id in corriger]
+            if corriges:
+                with connections[base_courante()].cursor() as cursor:
+                    cursor.executemany(
+                        f"UPDATE {Compte._meta.db_table} SET solde = %s WHERE id = %s",
+                        [(rejoue, compte_id) for compte_id, rejoue in corriges]
+                    )
+            rapport['ecarts'].extend(ecarts)
+            rapport['corriges'].extend(compte_id for compte_id, _ in corriges)
+    rapport['duree'] = time.perf_counter() - debut
+    return rapport
+
+
+def simuler(plafond_retrait, types=('RETRAIT',)):
+    """Replay the history of every shard under another daily limit (centimes); returns the counts"""
+    rapport = {'acceptes': 0, 'refus': Counter(), 'inconnus': set()}
+    for alias in liste_shards():
+        with shard(alias):
+            livre = charger_comptes()
+            acceptes, refus = livre.simuler(mouvements(dates=True), [PlafondJournalier(livre, plafond_retrait, types)])
+            rapport['acceptes'] += acceptes
+            rapport['refus'].update(refus)
+            rapport['inconnus'] |= livre.inconnus
+    return rapport
@@ -0,0 +1,151 @@
+"""
+Idempotency keys for write operations.
+
+Agency terminals retry POSTs when the network is flaky. A request carrying an
+``Idempotency-Key`` header (or an ``idempotency_key`` form field) is executed
+at most once: the key row is inserted in the same database transaction as the
+operation, so a concurrent or later retry hits the unique constraint and gets
+the stored result back instead of creating another Transaction.
+
+An operation committing on several databases (a transfer to another shard)
+cannot run inside that transaction: its debit would only be committed with
+the key, after the credit on the other shard. For those the key is reserved
+and committed first, the operation runs on its own and its result is stored
+afterwards; a retry in between, or after a crash in between, is refused with
+``OperationEnCours`` rather than executed twice.
+"""
+import hashlib
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import CleIdempotence
+from .shards import base_courante
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+IDEMPOTENCY_TTL = timedelta(hours=getattr(settings, 'IDEMPOTENCY_TTL_HOURS', 24))
+CLE_MAX_LENGTH = CleIdempotence._meta.get_field('cle').max_length
+
+
+class CleIdempotenceConflit(ValueError):
+    """The key was already used for a different operation or payload"""
+
+
+class OperationEnCours(CleIdempotenceConflit):
+    """The operation of this key was started and has no stored result (running, or interrupted)"""
+
+
+def generer_cle():
+    """New key for forms rendered by the server"""
+    return uuid.uuid4().hex
+
+
+def cle_depuis_requete(request):
+    """Read the idempotency key from the header or the POST data, if any"""
+    cle = request.META.get(IDEMPOTENCY_HEADER) or request.POST.get(IDEMPOTENCY_FIELD)
+    if not cle:
+        return None
+    cle = cle.strip()
+    if len(cle) > CLE_MAX_LENGTH:
+        raise ValueError("Clé d'idempotence invalide")
+    return cle or None
+
+
+def empreinte(parametres):
+    """Stable hash of the request parameters bound to a key"""
+    contenu = json.dumps(parametres, sort_keys=True, default=str)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+def _rejouer(enregistrement, operation, signature):
+    if enregistrement.operation != operation or enregistrement.empreinte != signature:
+        raise CleIdempotenceConflit("Cette clé d'idempotence a déjà été utilisée pour une autre opération")
+    if not enregistrement.resultat:
+        raise OperationEnCours("Opération déjà commencée avec cette clé d'idempotence, réessayez plus tard")
+    return enregistrement.resultat, True
+
+
+def executer_une_fois(cle, operation, parametres, fonction, atomique=True):
+    """
+    Run ``fonction`` at most once for ``cle``.
+
+    Returns ``(resultat, rejoue)``; ``rejoue`` is True when the stored result of
+    an earlier execution is returned. Without a key the function simply runs.
+    Failed operations are not recorded, so they can be retried with the same key.
+    With ``atomique=False`` the key is committed before ``fonction`` runs.
+    """
+    if not cle:
+        return fonction(), False
+
+    signature = empreinte(parametres)
+    maintenant = timezone.now()
+
+    enregistrement = CleIdempotence.objects.filter(cle=cle).first()
+    if enregistrement is not None:
+        if enregistrement.date_expiration > maintenant:
+            return _rejouer(enregistrement, operation, signature)
+        enregistrement.delete()
+
+    if not atomique:
+        return _executer_hors_transaction(cle, operation, signature, maintenant, fonction)
+
+    try:
+        # Sur le shard de la requête : la clé est validée avec l'opération
+        with transaction.atomic(using=base_courante()):
+            enregistrement = CleIdempotence.objects.create(
+                cle=cle,
+                operation=operation,
+                empreinte=signature,
+                date_expiration=maintenant + IDEMPOTENCY_TTL,
+            )
+            resultat = fonction()
+            enregistrement.resultat = resultat
+            enregistrement.save(update_fields=['resultat'])
+    except IntegrityError:
+        # Une requête concurrente avec la même clé a été validée avant nous
+        enregistrement = CleIdempotence.objects.filter(cle=cle).first()
+        if enregistrement is None:
+            raise
+        return _rejouer(enregistrement, operation, signature)
+
+    return resultat, False
+
+
+def _executer_hors_transaction(cle, operation, signature, maintenant, fonction):
+    try:
+        with transaction.atomic(using=base_courante()):
+            enregistrement = CleIdempotence.objects.create(
+                cle=cle,
+                operation=operation,
+                empreinte=signature,
+                date_expiration=maintenant + IDEMPOTENCY_TTL,
+            )
+    except IntegrityError:
+        enregistrement = CleIdempotence.objects.filter(cle=cle).first()
+        if enregistrement is None:
+            raise
+        return _rejouer(enregistrement, operation, signature)
+
+    try:
+        resultat = fonction()
+    except (ValueError, ObjectDoesNotExist):
+        # Refusée sans mouvement (ou débit recrédité) : la clé peut resservir
+        enregistrement.delete()
+        raise
+    # Toute autre erreur laisse la clé réservée : le débit a pu être validé
+    enregistrement.resultat = resultat
+    enregistrement.save(update_fields=['resultat'])
+    return resultat, False
+
+
+def purger_cles_expirees(maintenant=None):
+    """Delete expired keys using the date_expiration index; returns the count"""
+    maintenant = maintenant or timezone.now()
+    supprimees, _ = CleIdempotence.objects.filter(date_expiration__lte=maintenant).delete()
+    return supprimees
@@ -0,0 +1,228 @@
+"""
+Bulk onboarding of clients and their accounts from CSV.
+
+One row per account: ``nom, prenom, cni, email, telephone, adresse`` plus the
+optional ``type_compte`` (COURANT by default), ``solde`` and ``iban``
+(generated when empty). Rows sharing a CNI describe several accounts of the
+same new client. The file is streamed ``taille_lot`` rows at a time; each
+chunk checks CNI, e-mail and IBAN uniqueness with one ``__in`` query per
+column, then inserts its clients and accounts with ``bulk_create`` in one
+atomic block, together with the search index and the rollups that the
+Compte/Client signals would otherwise have maintained.
+
+Invalid rows are never inserted: they come back in the report with their
+line number and the reason.
+"""
+import csv
+import secrets
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .autocomplete import cache_ibans, normaliser_iban
+from .fragments import invalider
+from .models import Client, Compte
+from .rollups import comptabiliser_comptes
+from .search import indexer_clients
+from .shards import sharding_actif
+
+TAILLE_LOT = 1000
+COLONNES_REQUISES = ('nom', 'prenom', 'cni', 'email', 'telephone', 'adresse')
+COLONNES_OPTIONNELLES = ('type_compte', 'solde', 'iban')
+TYPES_COMPTE = {valeur for valeur, _ in Compte.TYPE_CHOICES}
+LONGUEURS = {
+    champ: Client._meta.get_field(champ).max_length for champ in ('nom', 'prenom', 'cni', 'email', 'telephone')
+}
+IBAN_MAX = Compte._meta.get_field('iban').max_length
+SOLDE_MAX = Decimal(10) ** (Compte._meta.get_field('solde').max_digits - 2)
+
+
+def generer_iban():
+    """Random Cameroon-format IBAN, same scheme as the account creation view"""
+    return f"CM76{secrets.token_hex(14).upper()}"
+
+
+def _valider(brut):
+    """Cleaned values of a CSV row, or raise ValueError with the reason"""
+    donnees = {champ: (brut.get(champ) or '').strip() for champ in COLONNES_REQUISES + COLONNES_OPTIONNELLES}
+    manquants = [champ for champ in COLONNES_REQUISES if not donnees[champ]]
+    if manquants:
+        raise ValueError(f"Champ(s) vide(s) : {', '.join(manquants)}")
+    for champ, longueur in LONGUEURS.items():
+        if len(donnees[champ]) > longueur:
+            raise ValueError(f"{champ} dépasse {longueur} caractères")
+    try:
+        validate_email(donnees['email'])
+    except ValidationError:
+        raise ValueError("E-mail invalide")
+
+    donnees['type_compte'] = donnees['type_compte'].upper() or 'COURANT'
+    if donnees['type_compte'] not in TYPES_COMPTE:
+        raise ValueError(f"Type de compte inconnu : {donnees['type_compte']}")
+    try:
+        solde = Decimal(donnees['solde'] or '0')
+    except InvalidOperation:
+        raise ValueError("Solde invalide")
+    if not solde.is_finite() or solde < 0 or solde >= SOLDE_MAX or solde != solde.quantize(Decimal('0.01')):
+        raise ValueError("Solde invalide")
+    donnees['solde'] = solde
+    donnees['iban'] = normaliser_iban(donnees['iban'])
+    if len(donnees['iban']) > IBAN_MAX:
+        raise ValueError("IBAN trop long")
+    return donnees
+
+
+class _Import:
+    """State of one import run: what earlier chunks created, and the report"""
+
+    def __init__(self):
+        self.clients = {}  # cni -> Client créé pendant cet import
+        self.emails = set()
+        self.ibans = set()
+        self.rapport = {'lignes': 0, 'clients': 0, 'comptes': 0, 'rejets': []}
+
+    def rejeter(self, numero, motif, brut):
+        self.rapport['rejets'].append({'ligne': numero, 'motif': motif, 'donnees': brut})
+
+    def traiter_lot(self, lot):
+        """Validate one chunk against the database with set-based lookups, then insert it"""
+        valides = []
+        for numero, brut in lot:
+            try:
+                valides.append((numero, brut, _valider(brut)))
+            except ValueError as e:
+                self.rejeter(numero, str(e), brut)
+        if not valides:
+            return
+
+        cnis = {d['cni'] for _, _, d in valides} - self.clients.keys()
+        cnis_existants = set(Client.objects.filter(cni__in=cnis).values_list('cni', flat=True))
+        emails_existants = set(
+            Client.objects.filter(email__in={d['email'] for _, _, d in valides}).values_list('email', flat=True)
+        )
+        ibans_existants = set(
+            Compte.objects.filter(iban__in={d['iban'] for _, _, d in valides if d['iban']}).values_list('iban', flat=True)
+        )
+
+        # Décisions sur des copies : rien n'est retenu si l'insertion du lot échoue
+        clients, emails, ibans = dict(self.clients), set(self.emails), set(self.ibans)
+        nouveaux, comptes, lignes = [], [], []
+        for numero, brut, d in valides:
+            client = clients.get(d['cni'])
+            if client is not None:
+                if client.email != d['email']:
+                    self.rejeter(numero, "CNI déjà utilisée avec un autre e-mail dans le fichier", brut)
+                    continue
+            elif d['cni'] in cnis_existants:
+                self.rejeter(numero, "CNI déjà enregistrée", brut)
+                continue
+            elif d['email'] in emails_existants or d['email'] in emails:
+                self.rejeter(numero, "E-mail déjà utilisé", brut)
+                continue
+            if d['iban'] and (d['iban'] in ibans_existants or d['iban'] in ibans):
+                self.rejeter(numero, "IBAN déjà utilisé", brut)
+                continue
+
+            if client is None:
+                client = Client(**{champ: d[champ] for champ in COLONNES_REQUISES})
+                clients[d['cni']] = client
+                emails.add(d['email'])
+                nouveaux.append(client)
+            if d['iban']:
+                ibans.add(d['iban'])
+            # bulk_create sans signaux : solde d'ouverture posé ici
+            comptes.append(Compte(
+                client=client, iban=d['iban'], solde=d['solde'], solde_ouverture=d['solde'], type_compte=d['type_compte']
+            ))
+            lignes.append((numero, brut))
+
+        self._attribuer_ibans(comptes, ibans)
+        try:
+            with transaction.atomic():
+                Client.objects.bulk_create(nouveaux)
+                for compte in comptes:
+                    compte.client_id = compte.client.pk
+                Compte.objects.bulk_create(comptes)
+                indexer_clients(nouveaux)
+                comptabiliser_comptes(comptes)
+        except IntegrityError:
+            # Doublon inséré par ailleurs entre la vérification et l'insertion
+            for numero, brut in lignes:
+                self.rejeter(numero, "Conflit d'unicité pendant l'insertion du lot", brut)
+            return
+
+        self.clients, self.emails, self.ibans = clients, emails, ibans
+        self.rapport['clients'] += len(nouveaux)
+        self.rapport['comptes'] += len(comptes)
+
+    def _attribuer_ibans(self, comptes, ibans):
+        """Generate the missing IBANs, checking the whole chunk against the database at once"""
+        manquants = [compte for compte in comptes if not compte.iban]
+        while manquants:
+            for compte in manquants:
+                compte.iban = generer_iban()
+            pris = set(Compte.objects.filter(iban__in=[c.iban for c in manquants]).values_list('iban', flat=True))
+            restants = []
+            for compte in manquants:
+                if compte.iban in pris or compte.iban in ibans:
+                    restants.append(compte)
+                else:
+                    ibans.add(compte.iban)
+            manquants = restants
+
+
+def importer_csv(fichier, taille_lot=TAILLE_LOT):
+    """
+    Import the clients and accounts of a CSV text stream.
+
+    Raises ValueError when required columns are missing. Returns the number
+    of rows read, clients and accounts created, the rejected rows (line,
+    reason, raw values), the duration and the throughput.
+    """
+    if sharding_actif():
+        # Unicité et identifiants par lot pensés pour une seule base
+        raise ValueError("L'import CSV n'est pas disponible quand les clients sont répartis sur plusieurs shards")
+    lecteur = csv.DictReader(fichier)
+    colonnes = {(nom or '').strip() for nom in lecteur.fieldnames or []}
+    manquantes = [nom for nom in COLONNES_REQUISES if nom not in colonnes]
+    if manquantes:
+        raise ValueError(f"Colonnes manquantes : {', '.join(manquantes)}")
+    lecteur.fieldnames = [(nom or '').strip() for nom in lecteur.fieldnames]
+
+    etat = _Import()
+    depart = time.perf_counter()
+    lot = []
+    for brut in lecteur:
+        etat.rapport['lignes'] += 1
+        lot.append((lecteur.line_num, brut))
+        if len(lot) >= taille_lot:
+            etat.traiter_lot(lot)
+            lot = []
+    if lot:
+        etat.traiter_lot(lot)
+
+    etat.rapport['rejets'].sort(key=lambda rejet: rejet['ligne'])
+    if etat.rapport['comptes']:
+        cache_ibans.clear()
+        invalider('clients')
+    duree = time.perf_counter() - depart
+    return {
+        **etat.rapport,
+        'duree': duree,
+        'lignes_par_seconde': etat.rapport['lignes'] / duree if duree else 0,
+    }
+
+
+def ecrire_rejets(rejets, fichier):
+    """Write the rejected rows as CSV: line number, reason, then the original columns"""
+    writer = csv.writer(fichier)
+    writer.writerow(('ligne', 'motif') + COLONNES_REQUISES + COLONNES_OPTIONNELLES)
+    for rejet in rejets:
+        donnees = rejet['donnees']
+        writer.writerow(
+            [rejet['ligne'], rejet['motif']]
+            + [donnees.get(champ) or '' for champ in COLONNES_REQUISES + COLONNES_OPTIONNELLES]
+        )
@@ -0,0 +1,182 @@
+"""
+Monthly interest accrual on savings (EPARGNE) accounts.
+
+Accounts are streamed in id order, ``taille_lot`` at a time. For each chunk the
+movements since the start of the period are read once as columns, and the
+end-of-day balance of every account on every day of the period is rebuilt with
+NumPy from the current balance (same approach as ``analytics.serie_soldes``,
+over a whole chunk at once). Interest is the exact/365 sum of positive daily
+balances times the annual rate, rounded down to the centime.
+
+Interest is posted as a DEPOT so every existing report counts it as an inflow.
+An ``InteretCompte`` row per (period, account) makes a rerun skip accounts
+already credited for the period.
+"""
+import time
+from datetime import date, datetime, time as heure
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .analytics import en_decimal
+from .monnaie import centimes as en_centimes, vers_centimes
+from .models import Compte, EvenementOutbox, InteretCompte, Transaction as BankTransaction
+from .outbox import evenement_transaction
+from .rollups import comptabiliser_lot
+from .shards import base_courante, liste_shards, shard
+
+TAILLE_LOT = 1000
+BASE_JOURS = 365
+
+
+def bornes_periode(periode):
+    """First day of the month ``AAAA-MM`` and first day of the next month"""
+    try:
+        annee, mois = (int(partie) for partie in periode.split('-'))
+        debut = date(annee, mois, 1)
+    except ValueError:
+        raise ValueError("Période invalide, format attendu : AAAA-MM")
+    fin = date(annee + mois // 12, mois % 12 + 1, 1)
+    return debut, fin
+
+
+def interets_courus(soldes, ouvertures, comptes, jours, montants, nb_jours, taux, base=BASE_JOURS):
+    """
+    Interest in centimes for a chunk of accounts.
+
+    ``soldes``: current balances (centimes); ``ouvertures``: index of the
+    opening day in the period (0 if opened before); ``comptes``/``jours``/
+    ``montants``: signed movements as account position, day index in the
+    period (``nb_jours`` for movements after the period) and centimes.
+    """
+    flux = np.zeros((len(soldes), nb_jours + 1), dtype=np.int64)
+    np.add.at(flux, (comptes, jours), montants)
+
+    # Solde de fin de journée j = solde actuel - mouvements postérieurs à j
+    posterieurs = flux.sum(axis=1)[:, None] - np.cumsum(flux, axis=1)[:, :nb_jours]
+    soldes_jour = soldes[:, None] - posterieurs
+    ouverts = np.arange(nb_jours)[None, :] >= ouvertures[:, None]
+    nombres = (np.clip(soldes_jour, 0, None) * ouverts).sum(axis=1)
+    # Taux rationnel exact : pas d'arrondi flottant avant la troncature au centime
+    numerateur, denominateur = Decimal(taux).as_integer_ratio()
+    return nombres * numerateur // (denominateur * base)
+
+
+def _mouvements(ids, debut, nb_jours):
+    """Movements of the chunk accounts since ``debut`` as (position, day, signed centimes) arrays"""
+    lignes = BankTransaction.objects.filter(
+        Q(compte_source_id__in=ids) | Q(compte_destination_id__in=ids),
+        date_transaction__gte=timezone.make_aware(datetime.combine(debut, heure.min)),
+    ).annotate(jour=TruncDate('date_transaction'), centimes=en_centimes('montant')).order_by().values_list(
+        'compte_source_id', 'compte_destination_id', 'type_transaction', 'centimes', 'jour'
+    )
+    colonnes = list(zip(*lignes))
+    if not colonnes:
+        vide = np.array([], dtype=np.int64)
+        return vide, vide, vide
+
+    sources, destinations, types, montants, dates = colonnes
+    ids = np.asarray(ids, dtype=np.int64)
+    centimes = np.array(montants, dtype=np.int64)
+    jours = np.minimum((np.array(dates, dtype='datetime64[D]') - np.datetime64(debut, 'D')).astype(np.int64), nb_jours)
+
+    def positions(colonne):
+        colonne = np.array([pk if pk is not None else -1 for pk in colonne], dtype=np.int64)
+        position = np.minimum(np.searchsorted(ids, colonne), len(ids) - 1)
+        return position, ids[position] == colonne
+
+    source, source_ok = positions(sources)
+    destination, destination_ok = positions(destinations)
+    signe = np.where(np.array(types) == 'DEPOT', 1, -1)
+    return (
+        np.concatenate([source[source_ok], destination[destination_ok]]),
+        np.concatenate([jours[source_ok], jours[destination_ok]]),
+        np.concatenate([(signe * centimes)[source_ok], centimes[destination_ok]]),
+    )
+
+
+def _traiter_lot(ids, periode, debut, nb_jours, taux):
+    """Compute and post one chunk atomically; returns (accounts processed, total credited)"""
+    with transaction.atomic(using=base_courante()):
+        comptes = list(Compte.objects.select_for_update().filter(id__in=ids).order_by('id'))
+        deja = set(InteretCompte.objects.filter(periode=periode, compte_id__in=ids).values_list('compte_id', flat=True))
+        comptes = [c for c in comptes if c.id not in deja]
+        if not comptes:
+            return 0, Decimal('0')
+        ids = [c.id for c in comptes]
+
+        soldes = np.array([vers_centimes(c.solde) for c in comptes], dtype=np.int64)
+        ouvertures = np.clip(
+            [(timezone.localdate(c.date_ouverture) - debut).days for c in comptes], 0, nb_jours
+        )
+        interets = interets_courus(soldes, ouvertures, *_mouvements(ids, debut, nb_jours), nb_jours, taux)
+
+        credits, lignes = [], []
+        for compte, centimes in zip(comptes, interets.tolist()):
+            montant = en_decimal(centimes)
+            trans = None
+            if centimes > 0:
+                compte.solde += montant
+                trans = BankTransaction(
+                    compte_source=compte,
+                    type_transaction='DEPOT',
+                    montant=montant,
+                    description=f"Intérêts créditeurs {periode}",
+                )
+                credits.append((compte, trans))
+            lignes.append(InteretCompte(compte=compte, periode=periode, taux=taux, montant=montant, transaction=trans))
+
+        # Les intérêts ne sont pas une activité du titulaire : derniere_activite inchangée
+        Compte.objects.bulk_update([compte for compte, _ in credits], ['solde'])
+        BankTransaction.objects.bulk_create([trans for _, trans in credits])
+        EvenementOutbox.objects.bulk_create([evenement_transaction(trans, compte.solde) for compte, trans in credits])
+        comptabiliser_lot([(trans, 'EPARGNE', None) for _, trans in credits])
+        InteretCompte.objects.bulk_create(lignes)
+
+    return len(comptes), sum((trans.montant for _, trans in credits), Decimal('0'))
+
+
+def calculer_interets(periode, taux=None, taille_lot=TAILLE_LOT):
+    """
+    Accrue and post the interest of period ``AAAA-MM`` on every active savings account.
+
+    The period must be over. Returns a report with the number of accounts,
+    the total credited, the duration and the throughput.
+    """
+    debut, fin = bornes_periode(periode)
+    if fin > timezone.localdate():
+        raise ValueError("La période n'est pas terminée")
+    taux = Decimal(str(taux if taux is not None else getattr(settings, 'TAUX_INTERET_EPARGNE', '0.025')))
+    nb_jours = (fin - debut).days
+
+    depart = time.perf_counter()
+    comptes, total = 0, Decimal('0')
+    for alias in liste_shards():
+        with shard(alias):
+            a_traiter = Compte.objects.filter(type_compte='EPARGNE', actif=True).exclude(
+                id__in=InteretCompte.objects.filter(periode=periode).values('compte_id')
+            ).order_by('id')
+            dernier = 0
+            while True:
+                ids = list(a_traiter.filter(id__gt=dernier).values_list('id', flat=True)[:taille_lot])
+                if not ids:
+                    break
+                dernier = ids[-1]
+                nombre, montant = _traiter_lot(ids, periode, debut, nb_jours, taux)
+                comptes += nombre
+                total += montant
+
+    duree = time.perf_counter() - depart
+    return {
+        'periode': periode,
+        'taux': taux,
+        'comptes': comptes,
+        'total': total,
+        'duree': duree,
+        'comptes_par_seconde': comptes / duree if duree else 0,
+    }
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from banking.profilage import agreger_profils, configuration
+
+
+class Command(BaseCommand):
+    help = "Agrège les profils enregistrés par ProfilageMiddleware : fonctions les plus coûteuses par vue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repertoire', help="Répertoire des profils (PROFILAGE['REPERTOIRE'] par défaut)")
+        parser.add_argument('--top', type=int, default=20, help="Nombre de fonctions par vue")
+        parser.add_argument('--tri', choices=['cumulative', 'tottime'], default='cumulative',
+                            help="Temps cumulé ou temps propre")
+        parser.add_argument('--vue', help="Limiter à une vue (nom d'URL, ex. telecharger_releve)")
+
+    def handle(self, *args, **options):
+        repertoire = options['repertoire'] or configuration()['REPERTOIRE']
+        rapports = agreger_profils(repertoire, options['top'], options['tri'], options['vue'])
+        if not rapports:
+            self.stdout.write(self.style.WARNING(f"Aucun profil dans {repertoire}"))
+            return
+
+        for vue, rapport in rapports.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{vue} : {rapport['profils']} profil(s), {rapport['duree_moyenne_ms']:.1f} ms en moyenne "
+                f"dont SQL {rapport['duree_sql_moyenne_ms']:.1f} ms ({rapport['requetes_moyennes']:.1f} requêtes)"
+            ))
+            self.stdout.write(f"{'appels':>10} {'propre (s)':>11} {'cumulé (s)':>11}  fonction")
+            for ligne in rapport['fonctions']:
+                self.stdout.write(
+                    f"{ligne['appels']:>10} {ligne['temps_propre']:>11.4f} {ligne['temps_cumule']:>11.4f}  {ligne['fonction']}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"{len(rapports)} vue(s) analysée(s)"))
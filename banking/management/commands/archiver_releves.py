@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.releves import archiver_periode, periodes_precedentes
+
+
+class Command(BaseCommand):
+    help = "Génère et archive les relevés PDF d'un mois clôturé pour tous les comptes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periode', help="Mois AAAA-MM (mois précédent par défaut)")
+
+    def handle(self, *args, **options):
+        periode = options['periode'] or periodes_precedentes(1)[0]
+        try:
+            nouveaux, deja = archiver_periode(periode)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{periode} : {nouveaux} relevé(s) archivé(s), {deja} déjà présent(s)"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from banking.interets import TAILLE_LOT, calculer_interets
+
+
+class Command(BaseCommand):
+    help = "Calcule et verse les intérêts du mois écoulé sur les comptes épargne"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periode', help="Mois AAAA-MM (mois précédent par défaut)")
+        parser.add_argument('--taux', help="Taux annuel, par ex. 0.025 (TAUX_INTERET_EPARGNE par défaut)")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Comptes par transaction")
+
+    def handle(self, *args, **options):
+        periode = options['periode']
+        if not periode:
+            premier = timezone.localdate().replace(day=1)
+            precedent = premier.replace(year=premier.year - 1, month=12) if premier.month == 1 else premier.replace(month=premier.month - 1)
+            periode = precedent.strftime('%Y-%m')
+
+        try:
+            rapport = calculer_interets(periode, taux=options['taux'], taille_lot=options['taille_lot'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['periode']} : intérêts de {rapport['comptes']} compte(s), {rapport['total']} F CFA versés "
+            f"au taux de {rapport['taux']} ({rapport['duree']:.1f} s, {rapport['comptes_par_seconde']:.0f} comptes/s)"
+        ))
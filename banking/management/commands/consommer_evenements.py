@@ -0,0 +1,43 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from banking.outbox import LIMITE_MAX, acquitter_flux, avancer, curseurs, formater_position, lire_flux, serialiser
+
+
+class Command(BaseCommand):
+    help = "Copie les nouveaux événements de l'outbox dans un fichier JSON Lines puis les acquitte"
+
+    def add_arguments(self, parser):
+        parser.add_argument('consommateur', help="Nom du consommateur (curseur propre)")
+        parser.add_argument('fichier', help="Fichier JSON Lines complété à chaque lot")
+        parser.add_argument('--lot', type=int, default=500, help="Événements par lot")
+        parser.add_argument('--suivre', action='store_true', help="Continuer à attendre les nouveaux événements")
+        parser.add_argument('--intervalle', type=float, default=1.0, help="Attente entre deux lectures vides (secondes)")
+
+    def handle(self, *args, **options):
+        consommateur = options['consommateur']
+        taille = min(options['lot'], LIMITE_MAX)
+        positions = curseurs(consommateur)
+        total = 0
+
+        while True:
+            evenements = lire_flux(positions, taille)
+            if evenements:
+                with open(options['fichier'], 'a', encoding='utf-8') as fichier:
+                    for alias, evenement in evenements:
+                        fichier.write(json.dumps(serialiser(evenement, alias), ensure_ascii=False) + '\n')
+                    fichier.flush()
+                    os.fsync(fichier.fileno())
+                # Acquittement seulement après écriture durable du lot :
+                # une interruption entre les deux rejoue le lot (livraison au moins une fois)
+                positions = acquitter_flux(consommateur, avancer(positions, evenements))
+                total += len(evenements)
+            if len(evenements) < taille:
+                if not options['suivre']:
+                    break
+                time.sleep(options['intervalle'])
+
+        self.stdout.write(self.style.SUCCESS(f"{total} événement(s) consommé(s), curseur {consommateur} = {formater_position(positions)}"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from banking.dormance import dater_activite
+
+
+class Command(BaseCommand):
+    help = ("Recalcule la dernière activité de chaque compte à partir de ses transactions "
+            "(intérêts exclus, date d'ouverture à défaut)")
+
+    def handle(self, *args, **options):
+        comptes = dater_activite()
+        self.stdout.write(self.style.SUCCESS(f"Dernière activité recalculée pour {comptes} compte(s)"))
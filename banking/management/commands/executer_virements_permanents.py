@@ -0,0 +1,39 @@
+import csv
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.virements_permanents import TAILLE_LOT, executer_virements_permanents
+
+
+class Command(BaseCommand):
+    help = "Exécute les virements permanents arrivés à échéance (traitement de nuit)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Date d'exécution AAAA-MM-JJ (aujourd'hui par défaut)")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Ordres par transaction")
+        parser.add_argument('--rapport', help="Fichier CSV recevant le résultat de chaque ordre")
+
+    def handle(self, *args, **options):
+        jour = None
+        if options['date']:
+            try:
+                jour = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ")
+
+        rapport = executer_virements_permanents(jour, taille_lot=options['taille_lot'])
+
+        if options['rapport']:
+            with open(options['rapport'], 'w', newline='', encoding='utf-8') as fichier:
+                ecrivain = csv.writer(fichier)
+                ecrivain.writerow(['ordre_id', 'echeance', 'statut', 'motif', 'transaction_id'])
+                ecrivain.writerows(rapport['resultats'])
+
+        traites = rapport['executes'] + rapport['rejetes']
+        debit = traites / rapport['duree'] if rapport['duree'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['jour']} : {rapport['executes']} virement(s) exécuté(s), "
+            f"{rapport['rejetes']} rejeté(s) en {rapport['lots']} lot(s) "
+            f"({rapport['duree']:.1f} s, {debit:.0f} ordres/s)"
+        ))
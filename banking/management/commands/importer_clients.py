@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.import_clients import TAILLE_LOT, ecrire_rejets, importer_csv
+
+
+class Command(BaseCommand):
+    help = "Importe des clients et leurs comptes depuis un fichier CSV (une ligne par compte)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="CSV : nom, prenom, cni, email, telephone, adresse[, type_compte, solde, iban]")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Lignes par transaction")
+        parser.add_argument('--rejets', help="Fichier CSV où écrire les lignes rejetées")
+        parser.add_argument('--encodage', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        if options['taille_lot'] < 1:
+            raise CommandError("--taille-lot doit être positif")
+        try:
+            with open(options['fichier'], newline='', encoding=options['encodage']) as fichier:
+                rapport = importer_csv(fichier, options['taille_lot'])
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{rapport['lignes']} ligne(s) lue(s) en {rapport['duree']:.1f} s "
+            f"({rapport['lignes_par_seconde']:.0f} lignes/s)"
+        )
+        rejets = rapport['rejets']
+        if rejets:
+            if options['rejets']:
+                with open(options['rejets'], 'w', newline='', encoding='utf-8') as fichier:
+                    ecrire_rejets(rejets, fichier)
+                self.stdout.write(self.style.WARNING(f"{len(rejets)} ligne(s) rejetée(s), détail dans {options['rejets']}"))
+            else:
+                self.stdout.write(self.style.WARNING(f"{len(rejets)} ligne(s) rejetée(s) :"))
+                for rejet in rejets:
+                    self.stdout.write(f"  ligne {rejet['ligne']} : {rejet['motif']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['clients']} client(s) et {rapport['comptes']} compte(s) importés"
+        ))
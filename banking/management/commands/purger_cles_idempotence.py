@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from banking.idempotency import purger_cles_expirees
+
+
+class Command(BaseCommand):
+    help = "Supprime les clés d'idempotence expirées"
+
+    def handle(self, *args, **options):
+        supprimees = purger_cles_expirees()
+        self.stdout.write(self.style.SUCCESS(f"{supprimees} clé(s) d'idempotence supprimée(s)"))
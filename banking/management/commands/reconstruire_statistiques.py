@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from banking.rollups import reconstruire
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques agrégées à partir des transactions et des comptes"
+
+    def handle(self, *args, **options):
+        lignes = reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{lignes} ligne(s) de statistiques reconstruite(s)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from banking.search import reindexer_clients
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche des clients (après un import en masse)"
+
+    def handle(self, *args, **options):
+        total = reindexer_clients()
+        self.stdout.write(self.style.SUCCESS(f"{total} client(s) indexé(s)"))
@@ -0,0 +1,74 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.grand_livre import simuler, verifier
+from banking.monnaie import depuis_centimes, vers_centimes
+from banking.rollups import reconstruire
+
+ECARTS_AFFICHES = 20
+
+
+class Command(BaseCommand):
+    help = ("Rejoue l'historique des transactions en mémoire : vérifie (ou corrige) les soldes des comptes, "
+            "ou simule un autre plafond de retrait journalier")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corriger', nargs='+', type=int, default=[], metavar='COMPTE_ID',
+                            help="Réécrire le solde rejoué de ces comptes, après examen de leurs écarts "
+                                 "(comptes verrouillés pendant le rejeu)")
+        parser.add_argument('--plafond-retrait', help="Simuler ce plafond de retrait journalier (F CFA) au lieu de vérifier")
+
+    def handle(self, *args, **options):
+        if options['plafond_retrait']:
+            return self.simuler(options['plafond_retrait'])
+
+        rapport = verifier(corriger=options['corriger'])
+        debit = rapport['mouvements'] / rapport['duree'] if rapport['duree'] else 0
+        self.stdout.write(
+            f"{rapport['comptes']} compte(s), {rapport['mouvements']} mouvement(s) rejoué(s) "
+            f"en {rapport['duree']:.2f} s ({debit:.0f} mouvements/s)"
+        )
+        self.signaler_inconnus(rapport['inconnus'])
+        ecarts = rapport['ecarts']
+        for compte_id, rejoue, enregistre in ecarts[:ECARTS_AFFICHES]:
+            self.stdout.write(
+                f"  compte {compte_id} : rejoué {depuis_centimes(rejoue)}, enregistré {depuis_centimes(enregistre)}"
+            )
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS("Tous les soldes sont reproduits à l'identique"))
+            return
+        if rapport['corriges']:
+            reconstruire()
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(rapport['corriges'])} solde(s) corrigé(s), statistiques reconstruites"
+            ))
+        restants = len(ecarts) - len(rapport['corriges'])
+        if restants:
+            # Pas de réécriture d'office : un historique amputé (suppression en cascade) donnerait un faux solde
+            raise CommandError(
+                f"{restants} solde(s) différent(s) du rejeu "
+                "(--corriger COMPTE_ID… pour réécrire ceux dont l'écart est expliqué)"
+            )
+
+    def signaler_inconnus(self, inconnus):
+        if inconnus:
+            self.stdout.write(
+                f"  {len(inconnus)} compte(s) ouvert(s) pendant le rejeu, mouvements ignorés : "
+                + ', '.join(str(compte_id) for compte_id in sorted(inconnus)[:ECARTS_AFFICHES])
+            )
+
+    def simuler(self, plafond):
+        try:
+            plafond = vers_centimes(Decimal(plafond))
+        except (InvalidOperation, ValueError):
+            raise CommandError("--plafond-retrait doit être un montant au centime près")
+        if plafond <= 0:
+            raise CommandError("--plafond-retrait doit être positif")
+
+        rapport = simuler(plafond)
+        refuses = sum(rapport['refus'].values())
+        self.stdout.write(f"{rapport['acceptes']} mouvement(s) accepté(s), {refuses} refusé(s)")
+        self.signaler_inconnus(rapport['inconnus'])
+        for motif, nombre in rapport['refus'].most_common():
+            self.stdout.write(f"  {motif} : {nombre}")
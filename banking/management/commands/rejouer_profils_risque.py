@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from banking.anomalies import reconstruire_profils
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les profils de risque des comptes en rejouant l'historique des débits en un seul passage"
+
+    def handle(self, *args, **options):
+        profils = reconstruire_profils()
+        self.stdout.write(self.style.SUCCESS(f"{profils} profil(s) de risque reconstruit(s)"))
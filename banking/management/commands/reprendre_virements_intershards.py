@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.virements_intershards import DELAI_REPRISE, reprendre_virements_intershards
+
+
+class Command(BaseCommand):
+    help = "Termine ou annule les virements inter-shards débités mais pas encore crédités (au démarrage, puis périodiquement)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delai', type=float, default=DELAI_REPRISE.total_seconds(),
+            help="Ne reprendre que les virements débités depuis au moins ce nombre de secondes",
+        )
+
+    def handle(self, *args, **options):
+        if options['delai'] < 0:
+            raise CommandError("--delai doit être positif ou nul")
+        rapport = reprendre_virements_intershards(delai=timedelta(seconds=options['delai']))
+
+        message = (
+            f"{rapport['termines']} virement(s) terminé(s), {rapport['annules']} annulé(s), "
+            f"{rapport['en_echec']} en échec"
+        )
+        if rapport['en_echec']:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from banking.models import Client, Compte
+from banking.stress import executer_stress, verifier_invariants
+
+
+class Command(BaseCommand):
+    help = ("Test de charge concurrent des dépôts, retraits et virements sur des comptes dédiés, "
+            "puis vérification des invariants (base jetable uniquement)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=200, help="Opérations par thread")
+        parser.add_argument('--comptes', type=int, default=20, help="Comptes créés pour le test")
+        parser.add_argument('--solde-initial', default='1000000', help="Solde initial de chaque compte")
+        parser.add_argument('--montant-max', default='200000', help="Montant maximal d'une opération")
+        parser.add_argument('--graine', type=int, help="Graine aléatoire (rejouabilité)")
+        parser.add_argument(
+            '--base-jetable', action='store_true',
+            help="Confirme que la base configurée peut être sacrifiée : les clients, comptes, transactions, "
+                 "événements et statistiques créés par le test n'en sont jamais retirés",
+        )
+
+    def handle(self, *args, **options):
+        if not options['base_jetable']:
+            # Les comptes « Stress » et leurs mouvements restent en base et leurs événements partent
+            # dans l'outbox : jamais sur une base qui sert à autre chose qu'au test
+            raise CommandError("Refusé sans --base-jetable : le test écrit dans la base configurée sans rien supprimer")
+        if options['comptes'] < 2 or options['threads'] < 1:
+            raise CommandError("Il faut au moins 2 comptes et 1 thread")
+        comptes = self.creer_comptes(options['comptes'], Decimal(options['solde_initial']))
+        soldes_initiaux = {c.id: c.solde for c in comptes}
+
+        rapport = executer_stress(
+            comptes, options['threads'], options['operations'], Decimal(options['montant_max']), options['graine']
+        )
+
+        self.stdout.write(f"{rapport['total']} opérations, {rapport['threads']} threads, "
+                          f"{rapport['duree']:.1f} s ({rapport['par_seconde']:.0f} op/s)")
+        self.stdout.write(f"{'opération':<10} {'réussies':>9} {'refusées':>9} {'conflits':>9} {'échecs':>7} "
+                          f"{'op/s':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for operation, stats in rapport['operations'].items():
+            self.stdout.write(
+                f"{operation:<10} {stats['reussies']:>9} {stats['refusees']:>9} {stats['conflits']:>9} "
+                f"{stats['echecs']:>7} {stats['par_seconde']:>7.0f} {stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f}"
+            )
+
+        violations = verifier_invariants(soldes_initiaux, rapport['depart_id'])
+        if violations:
+            for violation in violations:
+                self.stderr.write(self.style.ERROR(violation))
+            raise CommandError(f"{len(violations)} invariant(s) violé(s)")
+        self.stdout.write(self.style.SUCCESS(
+            "Invariants respectés : conservation, soldes cohérents et positifs, plafond journalier, statistiques"
+        ))
+
+    def creer_comptes(self, nombre, solde):
+        with transaction.atomic():
+            premier = (Client.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+            comptes = []
+            for i in range(premier, premier + nombre):
+                client = Client.objects.create(
+                    nom=f"Stress{i}", prenom='Test', cni=f"STRESS-{i:09d}",
+                    email=f"stress{i}@example.cm", telephone='+237600000000', adresse='Douala',
+                )
+                # create() un par un : les signaux tiennent l'index de recherche et les statistiques à jour
+                comptes.append(Compte.objects.create(client=client, iban=f"CM76ST{i:022d}", solde=solde))
+        return comptes
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.routage import configuration, synchroniser_sqlite
+
+
+class Command(BaseCommand):
+    help = "Recopie la base SQLite primaire dans la réplique en lecture (développement local)"
+
+    def handle(self, *args, **options):
+        alias = configuration()['ALIAS']
+        try:
+            pages = synchroniser_sqlite(alias)
+        except ValueError as e:
+            raise CommandError(f"{e} (définir DB_REPLICA_NAME)")
+
+        self.stdout.write(self.style.SUCCESS(f"Réplique « {alias} » synchronisée ({pages} pages)"))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from banking.dormance import DELAI_JOURS_DEFAUT, traiter_comptes_dormants
+
+
+class Command(BaseCommand):
+    help = "Désactive les comptes actifs sans mouvement du titulaire depuis DORMANCE_DELAI_JOURS jours"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simulation', action='store_true', help="Compter les comptes dormants sans les désactiver")
+
+    def handle(self, *args, **options):
+        rapport = traiter_comptes_dormants(simulation=options['simulation'])
+        total = sum(rapport.values())
+        delai = getattr(settings, 'DORMANCE_DELAI_JOURS', DELAI_JOURS_DEFAUT)
+        if len(rapport) > 1:
+            for alias, nombre in rapport.items():
+                self.stdout.write(f"  {alias} : {nombre}")
+        if options['simulation']:
+            self.stdout.write(self.style.WARNING(f"{total} compte(s) sans mouvement depuis {delai} jours (simulation)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{total} compte(s) dormant(s) désactivé(s) (délai {delai} jours)"))
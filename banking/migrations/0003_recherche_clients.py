@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def creer_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS banking_client_fts USING fts5("
+            "nom, prenom, cni, email, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO banking_client_fts(rowid, nom, prenom, cni, email) "
+            "SELECT id, nom, prenom, cni, email FROM banking_client"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS banking_client_trgm ON banking_client "
+            "USING gin ((lower(nom || ' ' || prenom || ' ' || cni || ' ' || email)) gin_trgm_ops)"
+        )
+
+
+def supprimer_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS banking_client_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS banking_client_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0002_cle_idempotence'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0003_recherche_clients'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['date_creation'], name='client_date_creation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compte',
+            index=models.Index(fields=['date_ouverture'], name='compte_date_ouverture_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date_transaction'], name='transaction_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['compte_source', 'date_transaction'], name='transaction_source_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['compte_destination', 'date_transaction'], name='transaction_dest_date_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:05
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0004_index_dates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VirementPermanent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.01)])),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('frequence', models.CharField(choices=[('QUOTIDIEN', 'Quotidien'), ('HEBDOMADAIRE', 'Hebdomadaire'), ('MENSUEL', 'Mensuel')], default='MENSUEL', max_length=12)),
+                ('date_debut', models.DateField()),
+                ('date_fin', models.DateField(blank=True, null=True)),
+                ('prochaine_execution', models.DateField()),
+                ('actif', models.BooleanField(default=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('compte_destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='virements_permanents_recus', to='banking.compte', verbose_name='Compte destination')),
+                ('compte_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='virements_permanents', to='banking.compte', verbose_name='Compte source')),
+            ],
+            options={
+                'verbose_name': 'Virement permanent',
+                'verbose_name_plural': 'Virements permanents',
+                'ordering': ['prochaine_execution'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExecutionVirementPermanent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_echeance', models.DateField()),
+                ('statut', models.CharField(choices=[('EXECUTE', 'Exécuté'), ('REJETE', 'Rejeté')], max_length=10)),
+                ('motif', models.CharField(blank=True, max_length=200)),
+                ('date_execution', models.DateTimeField(auto_now_add=True)),
+                ('ordre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='executions', to='banking.virementpermanent')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='banking.transaction')),
+            ],
+            options={
+                'verbose_name': 'Exécution de virement permanent',
+                'verbose_name_plural': 'Exécutions de virements permanents',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='virementpermanent',
+            index=models.Index(fields=['actif', 'prochaine_execution'], name='virement_perm_echeance_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='executionvirementpermanent',
+            constraint=models.UniqueConstraint(fields=('ordre', 'date_echeance'), name='execution_unique_par_echeance'),
+        ),
+    ]
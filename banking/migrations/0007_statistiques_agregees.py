@@ -0,0 +1,97 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:13
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+CHAMPS_OPERATION = {
+    'DEPOT': ('total_depots', 'nb_depots'),
+    'RETRAIT': ('total_retraits', 'nb_retraits'),
+    'VIREMENT': ('total_virements', 'nb_virements'),
+}
+
+
+def remplir(apps, schema_editor):
+    """Backfill the new rollups from the existing history, as ``reconstruire`` does"""
+    alias = schema_editor.connection.alias
+    Compte = apps.get_model('banking', 'Compte')
+    Transaction = apps.get_model('banking', 'Transaction')
+    StatistiqueJournaliere = apps.get_model('banking', 'StatistiqueJournaliere')
+    StatistiqueTypeCompte = apps.get_model('banking', 'StatistiqueTypeCompte')
+
+    jours = defaultdict(dict)
+    lignes = Transaction.objects.using(alias).annotate(
+        jour=TruncDate('date_transaction')
+    ).order_by().values('jour', 'type_transaction').annotate(total=Sum('montant'), nombre=Count('id'))
+    for ligne in lignes:
+        total, nombre = CHAMPS_OPERATION[ligne['type_transaction']]
+        jours[ligne['jour']].update({total: ligne['total'], nombre: ligne['nombre']})
+    StatistiqueJournaliere.objects.using(alias).bulk_create(
+        [StatistiqueJournaliere(jour=jour, **valeurs) for jour, valeurs in jours.items()], batch_size=1000
+    )
+
+    types = Compte.objects.using(alias).order_by().values('type_compte').annotate(
+        nombre=Count('id'), actifs=Count('id', filter=Q(actif=True)), encours=Sum('solde')
+    )
+    StatistiqueTypeCompte.objects.using(alias).bulk_create([
+        StatistiqueTypeCompte(
+            type_compte=ligne['type_compte'], nb_comptes=ligne['nombre'],
+            nb_comptes_actifs=ligne['actifs'], encours=ligne['encours'] or 0,
+        )
+        for ligne in types
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0006_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('fragment', models.PositiveSmallIntegerField(default=0)),
+                ('total_depots', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('nb_depots', models.PositiveIntegerField(default=0)),
+                ('total_retraits', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('nb_retraits', models.PositiveIntegerField(default=0)),
+                ('total_virements', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('nb_virements', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière',
+                'verbose_name_plural': 'Statistiques journalières',
+            },
+        ),
+        migrations.CreateModel(
+            name='StatistiqueTypeCompte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_compte', models.CharField(choices=[('COURANT', 'Compte Courant'), ('EPARGNE', 'Compte Épargne')], max_length=10)),
+                ('fragment', models.PositiveSmallIntegerField(default=0)),
+                ('nb_comptes', models.IntegerField(default=0)),
+                ('nb_comptes_actifs', models.IntegerField(default=0)),
+                ('encours', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'verbose_name': 'Statistique par type de compte',
+                'verbose_name_plural': 'Statistiques par type de compte',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquetypecompte',
+            constraint=models.UniqueConstraint(fields=('type_compte', 'fragment'), name='statistique_type_fragment_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquejournaliere',
+            constraint=models.UniqueConstraint(fields=('jour', 'fragment'), name='statistique_jour_fragment_unique'),
+        ),
+        # Sans cela les compteurs incrémentaux partiraient de zéro sur une base déjà remplie
+        migrations.RunPython(remplir, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0007_statistiques_agregees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteretCompte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.CharField(max_length=7)),
+                ('taux', models.DecimalField(decimal_places=4, max_digits=6)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('date_calcul', models.DateTimeField(auto_now_add=True)),
+                ('compte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interets', to='banking.compte')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='banking.transaction')),
+            ],
+            options={
+                'verbose_name': 'Intérêts',
+                'verbose_name_plural': 'Intérêts',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='interetcompte',
+            constraint=models.UniqueConstraint(fields=('periode', 'compte'), name='interets_unique_par_periode'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+import django.core.validators
+from django.db import migrations, models
+
+import banking.monnaie
+
+# (modèle, champ, ancienne définition Decimal, nouvelle définition en centimes)
+CHAMPS = [
+    (
+        'compte', 'solde',
+        dict(max_digits=12, decimal_places=2, default=0,
+             validators=[django.core.validators.MinValueValidator(0)], verbose_name='Solde'),
+        dict(max_digits=12, default=0,
+             validators=[django.core.validators.MinValueValidator(0)], verbose_name='Solde'),
+    ),
+    (
+        'transaction', 'montant',
+        dict(max_digits=12, decimal_places=2, validators=[django.core.validators.MinValueValidator(0.01)]),
+        dict(max_digits=12, validators=[django.core.validators.MinValueValidator(0.01)]),
+    ),
+    (
+        'virementpermanent', 'montant',
+        dict(max_digits=12, decimal_places=2, validators=[django.core.validators.MinValueValidator(0.01)]),
+        dict(max_digits=12, validators=[django.core.validators.MinValueValidator(0.01)]),
+    ),
+    ('interetcompte', 'montant', dict(max_digits=12, decimal_places=2), dict(max_digits=12)),
+    ('statistiquejournaliere', 'total_depots', dict(max_digits=18, decimal_places=2, default=0), dict(max_digits=18, default=0)),
+    ('statistiquejournaliere', 'total_retraits', dict(max_digits=18, decimal_places=2, default=0), dict(max_digits=18, default=0)),
+    ('statistiquejournaliere', 'total_virements', dict(max_digits=18, decimal_places=2, default=0), dict(max_digits=18, default=0)),
+    ('statistiquetypecompte', 'encours', dict(max_digits=18, decimal_places=2, default=0), dict(max_digits=18, default=0)),
+]
+
+
+def _requetes(apps, schema_editor, sql):
+    qn = schema_editor.quote_name
+    for modele, champ, _, _ in CHAMPS:
+        table = apps.get_model('banking', modele)._meta.db_table
+        schema_editor.execute(sql.format(table=qn(table), decimal=qn(champ), centimes=qn(f'{champ}_centimes')))
+
+
+def convertir(apps, schema_editor):
+    """Decimal amounts to whole centimes, one set-based UPDATE per column"""
+    _requetes(apps, schema_editor, "UPDATE {table} SET {centimes} = CAST(ROUND({decimal} * 100) AS BIGINT)")
+
+
+def restaurer(apps, schema_editor):
+    _requetes(apps, schema_editor, "UPDATE {table} SET {decimal} = {centimes} / 100.0")
+
+
+def _operations():
+    avant, apres = [], []
+    for modele, champ, ancien, nouveau in CHAMPS:
+        avant += [
+            migrations.AddField(modele, f'{champ}_centimes', models.BigIntegerField(null=True)),
+            # Nullable le temps de la conversion : la migration reste réversible sur une base remplie
+            migrations.AlterField(modele, champ, models.DecimalField(null=True, **ancien)),
+        ]
+        apres += [
+            migrations.RemoveField(modele, champ),
+            migrations.RenameField(modele, f'{champ}_centimes', champ),
+            migrations.AlterField(modele, champ, banking.monnaie.MoneyField(**nouveau)),
+        ]
+    return avant + [migrations.RunPython(convertir, restaurer)] + apres
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0008_interets'),
+    ]
+
+    operations = _operations()
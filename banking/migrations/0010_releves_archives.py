@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0009_montants_en_centimes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleveArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.CharField(max_length=7)),
+                ('empreinte', models.CharField(max_length=64)),
+                ('taille', models.PositiveIntegerField()),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('compte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='releves', to='banking.compte')),
+            ],
+            options={
+                'verbose_name': 'Relevé archivé',
+                'verbose_name_plural': 'Relevés archivés',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relevearchive',
+            constraint=models.UniqueConstraint(fields=('compte', 'periode'), name='releve_unique_par_periode'),
+        ),
+    ]
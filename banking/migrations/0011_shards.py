@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:42
+
+import banking.monnaie
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0010_releves_archives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('valeur', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Séquence de shard',
+                'verbose_name_plural': 'Séquences de shard',
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='iban_contrepartie',
+            field=models.CharField(blank=True, max_length=34, verbose_name='IBAN contrepartie'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='reference',
+            field=models.UUIDField(blank=True, null=True, unique=True, verbose_name='Référence inter-shards'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='compte_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions_sortantes', to='banking.compte', verbose_name='Compte source'),
+        ),
+        migrations.CreateModel(
+            name='VirementInterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.UUIDField(unique=True)),
+                ('iban_destination', models.CharField(max_length=34)),
+                ('compte_destination_id', models.BigIntegerField()),
+                ('montant', banking.monnaie.MoneyField(max_digits=12)),
+                ('description', models.TextField(blank=True)),
+                ('statut', models.CharField(choices=[('DEBITE', 'Débité, crédit en attente'), ('TERMINE', 'Terminé'), ('ANNULE', 'Annulé (source recréditée)')], default='DEBITE', max_length=10)),
+                ('motif', models.CharField(blank=True, max_length=200)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+                ('compte_source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='virements_intershards', to='banking.compte')),
+            ],
+            options={
+                'verbose_name': 'Virement inter-shards',
+                'verbose_name_plural': 'Virements inter-shards',
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='virement_intershard_statut_idx')],
+            },
+        ),
+    ]
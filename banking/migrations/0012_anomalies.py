@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0011_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilRisque',
+            fields=[
+                ('compte', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profil_risque', serialize=False, to='banking.compte')),
+                ('nombre', models.PositiveIntegerField(default=0)),
+                ('moyenne', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+                ('debut_fenetre', models.DateTimeField(blank=True, null=True)),
+                ('operations_fenetre', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Profil de risque',
+                'verbose_name_plural': 'Profils de risque',
+            },
+        ),
+        migrations.CreateModel(
+            name='AlerteAnomalie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('motifs', models.CharField(max_length=200)),
+                ('statut', models.CharField(choices=[('A_REVOIR', 'À revoir'), ('LEGITIME', 'Légitime'), ('FRAUDE', 'Fraude confirmée')], default='A_REVOIR', max_length=10)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_revue', models.DateTimeField(blank=True, null=True)),
+                ('compte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertes', to='banking.compte')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alerte', to='banking.transaction')),
+            ],
+            options={
+                'verbose_name': "Alerte d'anomalie",
+                'verbose_name_plural': "Alertes d'anomalie",
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='alerte_statut_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:52
+
+import banking.monnaie
+from django.db import migrations
+
+
+def renseigner(apps, schema_editor):
+    """Opening balance = current balance minus the net flow of every recorded movement, in one UPDATE"""
+    qn = schema_editor.quote_name
+    comptes = qn(apps.get_model('banking', 'Compte')._meta.db_table)
+    transactions = qn(apps.get_model('banking', 'Transaction')._meta.db_table)
+
+    def flux(colonne, types):
+        return (
+            f"COALESCE((SELECT SUM(t.montant) FROM {transactions} t "
+            f"WHERE t.{colonne} = {comptes}.id AND t.type_transaction IN ({types})), 0)"
+        )
+
+    entrees = flux('compte_source_id', "'DEPOT'")
+    sorties = flux('compte_source_id', "'RETRAIT', 'VIREMENT'")
+    recus = flux('compte_destination_id', "'VIREMENT'")
+    schema_editor.execute(f"UPDATE {comptes} SET solde_ouverture = solde - {entrees} + {sorties} - {recus}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0012_anomalies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compte',
+            name='solde_ouverture',
+            field=banking.monnaie.MoneyField(default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(renseigner, migrations.RunPython.noop),
+    ]
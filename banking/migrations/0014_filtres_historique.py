@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+# Index plein texte des descriptions tenu à jour par des triggers, donc aussi pour
+# les bulk_create des traitements par lots. Une migration qui reconstruit la table
+# banking_transaction sous SQLite (AlterField, RemoveField...) supprime ces triggers :
+# elle doit rappeler creer_index_description.
+TRIGGERS_SQLITE = [
+    "CREATE TRIGGER IF NOT EXISTS banking_transaction_fts_ai AFTER INSERT ON banking_transaction BEGIN "
+    "INSERT INTO banking_transaction_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS banking_transaction_fts_ad AFTER DELETE ON banking_transaction BEGIN "
+    "INSERT INTO banking_transaction_fts(banking_transaction_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS banking_transaction_fts_au AFTER UPDATE OF description ON banking_transaction BEGIN "
+    "INSERT INTO banking_transaction_fts(banking_transaction_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    "INSERT INTO banking_transaction_fts(rowid, description) VALUES (new.id, new.description); END",
+]
+
+
+def creer_index_description(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS banking_transaction_fts USING fts5("
+            "description, content='banking_transaction', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        for trigger in TRIGGERS_SQLITE:
+            schema_editor.execute(trigger)
+        schema_editor.execute("INSERT INTO banking_transaction_fts(banking_transaction_fts) VALUES ('rebuild')")
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # Même expression que le icontains de Django : UPPER(description::text) LIKE UPPER(%s)
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS banking_transaction_description_trgm ON banking_transaction "
+            "USING gin ((UPPER(description::text)) gin_trgm_ops)"
+        )
+
+
+def supprimer_index_description(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for suffixe in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS banking_transaction_fts_{suffixe}")
+        schema_editor.execute("DROP TABLE IF EXISTS banking_transaction_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS banking_transaction_description_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0013_solde_ouverture'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type_transaction', 'date_transaction'], name='transaction_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['iban_contrepartie', 'date_transaction'], name='transaction_contrepartie_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['montant'], name='transaction_montant_idx'),
+        ),
+        migrations.RunPython(creer_index_description, supprimer_index_description),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Les comptes existants reçoivent l'heure de la migration : aucun n'est dormant
+# avant que `python manage.py dater_activite_comptes` ne lise leur historique.
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0014_filtres_historique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compte',
+            name='derniere_activite',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Dernière activité'),
+        ),
+        migrations.AddIndex(
+            model_name='compte',
+            index=models.Index(condition=models.Q(('actif', True)), fields=['derniere_activite'], name='compte_activite_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:28
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+# Les événements existants gardent leur id comme position : les curseurs déjà acquittés restent valables
+
+
+def renseigner(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    EvenementOutbox = apps.get_model('banking', 'EvenementOutbox')
+    SequenceShard = apps.get_model('banking', 'SequenceShard')
+    EvenementOutbox.objects.using(alias).update(position=F('id'))
+    plus_grand = EvenementOutbox.objects.using(alias).aggregate(m=Max('id'))['m'] or 0
+    SequenceShard.objects.using(alias).update_or_create(nom='banking.evenementoutbox.position', defaults={'valeur': plus_grand})
+
+
+def effacer(apps, schema_editor):
+    apps.get_model('banking', 'SequenceShard').objects.using(schema_editor.connection.alias).filter(
+        nom='banking.evenementoutbox.position'
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0015_derniere_activite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evenementoutbox',
+            name='position',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='evenementoutbox',
+            index=models.Index(condition=models.Q(('position__isnull', True)), fields=['id'], name='outbox_a_ordonner_idx'),
+        ),
+        migrations.RunPython(renseigner, effacer),
+    ]
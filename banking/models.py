@@ -1,6 +1,10 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .monnaie import MoneyField
+from .shards import ShardManager
 
 
 class Client(models.Model):
@@ -12,11 +16,16 @@ class Client(models.Model):
     telephone = models.CharField(max_length=20)
     adresse = models.TextField()
     date_creation = models.DateTimeField(auto_now_add=True)
+
+    objects = ShardManager()
     
     class Meta:
         verbose_name = "Client"
         verbose_name_plural = "Clients"
         ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['date_creation'], name='client_date_creation_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nom} {self.prenom} (CNI: {self.cni})"
@@ -31,21 +40,31 @@ class Compte(models.Model):
     
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='comptes')
     iban = models.CharField(max_length=34, unique=True, verbose_name="IBAN")
-    solde = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2, 
-        default=0, 
+    solde = MoneyField(
+        max_digits=12,
+        default=0,
         validators=[MinValueValidator(0)],
         verbose_name="Solde"
     )
+    # Solde à l'ouverture : le solde courant est ce montant plus les mouvements (voir grand_livre)
+    solde_ouverture = MoneyField(max_digits=12, default=0, editable=False)
     type_compte = models.CharField(max_length=10, choices=TYPE_CHOICES, default='COURANT')
     date_ouverture = models.DateTimeField(auto_now_add=True)
     actif = models.BooleanField(default=True)
+    # Dernier mouvement du titulaire, écrit avec le solde (voir dormance)
+    derniere_activite = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Dernière activité")
+
+    objects = ShardManager()
     
     class Meta:
         verbose_name = "Compte"
         verbose_name_plural = "Comptes"
         ordering = ['-date_ouverture']
+        indexes = [
+            models.Index(fields=['date_ouverture'], name='compte_date_ouverture_idx'),
+            # Comptes actifs sans mouvement depuis le délai de dormance
+            models.Index(fields=['derniere_activite'], name='compte_activite_idx', condition=models.Q(actif=True)),
+        ]
     
     def __str__(self):
         return f"{self.iban} - {self.client.nom} ({self.solde}€)"
@@ -59,10 +78,14 @@ class Transaction(models.Model):
         ('VIREMENT', 'Virement'),
     ]
     
+    # Un virement entre deux shards est enregistré en deux jambes, une sur chaque shard :
+    # la contrepartie absente du shard n'est connue que par son IBAN
     compte_source = models.ForeignKey(
         Compte, 
         on_delete=models.CASCADE, 
         related_name='transactions_sortantes',
+        null=True,
+        blank=True,
         verbose_name="Compte source"
     )
     compte_destination = models.ForeignKey(
@@ -74,18 +97,30 @@ class Transaction(models.Model):
         verbose_name="Compte destination"
     )
     type_transaction = models.CharField(max_length=10, choices=TYPE_CHOICES)
-    montant = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2,
+    montant = MoneyField(
+        max_digits=12,
         validators=[MinValueValidator(0.01)]
     )
     description = models.TextField(blank=True)
     date_transaction = models.DateTimeField(auto_now_add=True)
+    iban_contrepartie = models.CharField(max_length=34, blank=True, verbose_name="IBAN contrepartie")
+    reference = models.UUIDField(null=True, blank=True, unique=True, verbose_name="Référence inter-shards")
+
+    objects = ShardManager()
     
     class Meta:
         verbose_name = "Transaction"
         verbose_name_plural = "Transactions"
         ordering = ['-date_transaction']
+        indexes = [
+            models.Index(fields=['date_transaction'], name='transaction_date_idx'),
+            models.Index(fields=['compte_source', 'date_transaction'], name='transaction_source_date_idx'),
+            models.Index(fields=['compte_destination', 'date_transaction'], name='transaction_dest_date_idx'),
+            # Filtres de l'historique global (FiltresHistoriqueForm)
+            models.Index(fields=['type_transaction', 'date_transaction'], name='transaction_type_date_idx'),
+            models.Index(fields=['iban_contrepartie', 'date_transaction'], name='transaction_contrepartie_idx'),
+            models.Index(fields=['montant'], name='transaction_montant_idx'),
+        ]
     
     def __str__(self):
         return f"{self.type_transaction} - {self.montant}€ - {self.date_transaction.strftime('%d/%m/%Y %H:%M')}"
@@ -96,9 +131,319 @@ class Transaction(models.Model):
         Note: This provides model-level validation as a safety layer.
         Primary validation is done in views before transaction.atomic blocks.
         """
-        if self.type_transaction == 'VIREMENT' and not self.compte_destination:
+        if self.type_transaction == 'VIREMENT' and not (self.compte_destination_id or self.iban_contrepartie):
             raise ValidationError("Un virement nécessite un compte de destination")
+        if not (self.compte_source_id or self.compte_destination_id):
+            raise ValidationError("Une transaction concerne au moins un compte")
         
-        if self.type_transaction in ['RETRAIT', 'VIREMENT']:
+        if self.type_transaction in ['RETRAIT', 'VIREMENT'] and self.compte_source_id:
             if self.montant > self.compte_source.solde:
                 raise ValidationError("Solde insuffisant pour effectuer cette transaction")
+
+
+class CleIdempotence(models.Model):
+    """Idempotency key recorded for a write operation and its original result"""
+    cle = models.CharField(max_length=100, unique=True, verbose_name="Clé")
+    operation = models.CharField(max_length=50)
+    empreinte = models.CharField(max_length=64)
+    resultat = models.JSONField(default=dict)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_expiration = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Clé d'idempotence"
+        verbose_name_plural = "Clés d'idempotence"
+
+    def __str__(self):
+        return f"{self.cle} ({self.operation})"
+
+
+class VirementPermanent(models.Model):
+    """Recurring transfer (rent, tontine, salary split) executed by the scheduler"""
+    FREQUENCE_CHOICES = [
+        ('QUOTIDIEN', 'Quotidien'),
+        ('HEBDOMADAIRE', 'Hebdomadaire'),
+        ('MENSUEL', 'Mensuel'),
+    ]
+
+    compte_source = models.ForeignKey(
+        Compte,
+        on_delete=models.CASCADE,
+        related_name='virements_permanents',
+        verbose_name="Compte source"
+    )
+    compte_destination = models.ForeignKey(
+        Compte,
+        on_delete=models.CASCADE,
+        related_name='virements_permanents_recus',
+        verbose_name="Compte destination"
+    )
+    montant = MoneyField(
+        max_digits=12,
+        validators=[MinValueValidator(0.01)]
+    )
+    description = models.CharField(max_length=200, blank=True)
+    frequence = models.CharField(max_length=12, choices=FREQUENCE_CHOICES, default='MENSUEL')
+    date_debut = models.DateField()
+    date_fin = models.DateField(null=True, blank=True)
+    prochaine_execution = models.DateField()
+    actif = models.BooleanField(default=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Virement permanent"
+        verbose_name_plural = "Virements permanents"
+        ordering = ['prochaine_execution']
+        indexes = [
+            models.Index(fields=['actif', 'prochaine_execution'], name='virement_perm_echeance_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.compte_source.iban} → {self.compte_destination.iban} : {self.montant}€ ({self.get_frequence_display()})"
+
+    def clean(self):
+        if self.compte_source_id and self.compte_source_id == self.compte_destination_id:
+            raise ValidationError("Le compte de destination ne peut pas être le même que le compte source.")
+        if self.date_fin and self.date_fin < self.date_debut:
+            raise ValidationError("La date de fin précède la date de début.")
+
+
+class ExecutionVirementPermanent(models.Model):
+    """Outcome of one standing order for one due date"""
+    STATUT_CHOICES = [
+        ('EXECUTE', 'Exécuté'),
+        ('REJETE', 'Rejeté'),
+    ]
+
+    ordre = models.ForeignKey(VirementPermanent, on_delete=models.CASCADE, related_name='executions')
+    date_echeance = models.DateField()
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES)
+    motif = models.CharField(max_length=200, blank=True)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    date_execution = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Exécution de virement permanent"
+        verbose_name_plural = "Exécutions de virements permanents"
+        constraints = [
+            models.UniqueConstraint(fields=['ordre', 'date_echeance'], name='execution_unique_par_echeance'),
+        ]
+
+    def __str__(self):
+        return f"#{self.ordre_id} {self.date_echeance} : {self.statut}"
+
+
+class EvenementOutbox(models.Model):
+    """Event written in the same database transaction as the operation it describes"""
+    type_evenement = models.CharField(max_length=50)
+    transaction_id = models.BigIntegerField(null=True, blank=True)
+    donnees = models.JSONField(default=dict)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    # Rang dans le flux, attribué après la validation (outbox.ordonner_evenements)
+    position = models.BigIntegerField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        verbose_name = "Événement (outbox)"
+        verbose_name_plural = "Événements (outbox)"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['id'], name='outbox_a_ordonner_idx', condition=models.Q(position__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.type_evenement}"
+
+
+class CurseurConsommateur(models.Model):
+    """Last outbox feed position acknowledged by a downstream consumer"""
+    nom = models.CharField(max_length=50, unique=True)
+    dernier_id = models.BigIntegerField(default=0)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Curseur consommateur"
+        verbose_name_plural = "Curseurs consommateurs"
+
+    def __str__(self):
+        return f"{self.nom} @ {self.dernier_id}"
+
+
+class StatistiqueJournaliere(models.Model):
+    """Daily operation totals, split across a few fragment rows to spread write contention"""
+    jour = models.DateField()
+    fragment = models.PositiveSmallIntegerField(default=0)
+    total_depots = MoneyField(max_digits=18, default=0)
+    nb_depots = models.PositiveIntegerField(default=0)
+    total_retraits = MoneyField(max_digits=18, default=0)
+    nb_retraits = models.PositiveIntegerField(default=0)
+    total_virements = MoneyField(max_digits=18, default=0)
+    nb_virements = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Statistique journalière"
+        verbose_name_plural = "Statistiques journalières"
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'fragment'], name='statistique_jour_fragment_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.jour} [{self.fragment}]"
+
+
+class StatistiqueTypeCompte(models.Model):
+    """Account counts and outstanding balance per account type, split like StatistiqueJournaliere"""
+    type_compte = models.CharField(max_length=10, choices=Compte.TYPE_CHOICES)
+    fragment = models.PositiveSmallIntegerField(default=0)
+    nb_comptes = models.IntegerField(default=0)
+    nb_comptes_actifs = models.IntegerField(default=0)
+    encours = MoneyField(max_digits=18, default=0)
+
+    class Meta:
+        verbose_name = "Statistique par type de compte"
+        verbose_name_plural = "Statistiques par type de compte"
+        constraints = [
+            models.UniqueConstraint(fields=['type_compte', 'fragment'], name='statistique_type_fragment_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.type_compte} [{self.fragment}]"
+
+
+class InteretCompte(models.Model):
+    """Interest posted to a savings account for one period (AAAA-MM)"""
+    compte = models.ForeignKey(Compte, on_delete=models.CASCADE, related_name='interets')
+    periode = models.CharField(max_length=7)
+    taux = models.DecimalField(max_digits=6, decimal_places=4)
+    montant = MoneyField(max_digits=12)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    date_calcul = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Intérêts"
+        verbose_name_plural = "Intérêts"
+        constraints = [
+            models.UniqueConstraint(fields=['periode', 'compte'], name='interets_unique_par_periode'),
+        ]
+
+    def __str__(self):
+        return f"{self.compte.iban} {self.periode} : {self.montant}€"
+
+
+class ReleveArchive(models.Model):
+    """Finalized PDF statement of a closed month, stored on disk under its SHA-256"""
+    compte = models.ForeignKey(Compte, on_delete=models.CASCADE, related_name='releves')
+    periode = models.CharField(max_length=7)
+    empreinte = models.CharField(max_length=64)
+    taille = models.PositiveIntegerField()
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Relevé archivé"
+        verbose_name_plural = "Relevés archivés"
+        constraints = [
+            models.UniqueConstraint(fields=['compte', 'periode'], name='releve_unique_par_periode'),
+        ]
+
+    def __str__(self):
+        return f"{self.compte.iban} {self.periode} ({self.empreinte[:12]})"
+
+
+class SequenceShard(models.Model):
+    """Named counter on one shard: ids of a sharded model (shards.allouer_identifiants), outbox positions, fragment versions"""
+    nom = models.CharField(max_length=100, unique=True)
+    valeur = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Séquence de shard"
+        verbose_name_plural = "Séquences de shard"
+
+    def __str__(self):
+        return f"{self.nom} = {self.valeur}"
+
+
+class VirementInterShard(models.Model):
+    """Transfer to an account on another shard, recorded on the source shard with its debit"""
+    STATUT_CHOICES = [
+        ('DEBITE', 'Débité, crédit en attente'),
+        ('TERMINE', 'Terminé'),
+        ('ANNULE', 'Annulé (source recréditée)'),
+    ]
+
+    reference = models.UUIDField(unique=True)
+    compte_source = models.ForeignKey(Compte, on_delete=models.CASCADE, related_name='virements_intershards')
+    iban_destination = models.CharField(max_length=34)
+    compte_destination_id = models.BigIntegerField()
+    montant = MoneyField(max_digits=12)
+    description = models.TextField(blank=True)
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='DEBITE')
+    motif = models.CharField(max_length=200, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Virement inter-shards"
+        verbose_name_plural = "Virements inter-shards"
+        indexes = [
+            models.Index(fields=['statut', 'date_creation'], name='virement_intershard_statut_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} {self.compte_source_id} → {self.iban_destination} : {self.statut}"
+
+
+class ProfilRisque(models.Model):
+    """Running statistics of an account's debits, updated in O(1) by each scored operation"""
+    compte = models.OneToOneField(Compte, on_delete=models.CASCADE, primary_key=True, related_name='profil_risque')
+    # Welford : nombre d'observations, moyenne et somme des carrés des écarts des montants
+    nombre = models.PositiveIntegerField(default=0)
+    moyenne = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)
+    # Vélocité : opérations depuis le début de la fenêtre courante
+    debut_fenetre = models.DateTimeField(null=True, blank=True)
+    operations_fenetre = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Profil de risque"
+        verbose_name_plural = "Profils de risque"
+
+    def __str__(self):
+        return f"{self.compte_id} : {self.nombre} opération(s), moyenne {self.moyenne:.2f}"
+
+
+class AlerteAnomalie(models.Model):
+    """Operation flagged by the anomaly scoring, waiting for a human review"""
+    STATUT_CHOICES = [
+        ('A_REVOIR', 'À revoir'),
+        ('LEGITIME', 'Légitime'),
+        ('FRAUDE', 'Fraude confirmée'),
+    ]
+
+    compte = models.ForeignKey(Compte, on_delete=models.CASCADE, related_name='alertes')
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='alerte')
+    score = models.FloatField()
+    motifs = models.CharField(max_length=200)
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='A_REVOIR')
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_revue = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Alerte d'anomalie"
+        verbose_name_plural = "Alertes d'anomalie"
+        indexes = [
+            models.Index(fields=['statut', 'date_creation'], name='alerte_statut_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.compte_id} #{self.transaction_id} ({self.score:.1f}) : {self.statut}"
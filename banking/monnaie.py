@@ -0,0 +1,97 @@
+"""
+Amounts stored as whole centimes.
+
+``MoneyField`` keeps ``solde``/``montant`` in a BIGINT column of centimes: SUM
+and comparisons run on integers in the database (SQLite no longer stores the
+amounts as REAL), and bulk jobs read the raw centimes with ``centimes()``
+instead of converting every value through float or Decimal.
+
+In Python the value is still a ``Decimal`` with exactly two places, so views,
+forms, templates (French number formatting), JSON results and the outbox keep
+working unchanged. A value finer than the centime is refused rather than
+rounded.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.core import validators
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import ExpressionWrapper, F
+
+CENTIME = Decimal('0.01')
+
+
+def vers_centimes(valeur):
+    """Exact number of centimes of an amount (Decimal, int or numeric string)"""
+    if not isinstance(valeur, Decimal):
+        valeur = Decimal(str(valeur))
+    centimes = valeur.scaleb(2)
+    if centimes != centimes.to_integral_value():
+        raise ValueError(f"Montant plus précis que le centime : {valeur}")
+    return int(centimes)
+
+
+def depuis_centimes(centimes):
+    """Two-place Decimal of a whole number of centimes"""
+    return Decimal(int(centimes)).scaleb(-2)
+
+
+def centimes(champ):
+    """Expression reading a MoneyField as raw integer centimes (no conversion per row)"""
+    return ExpressionWrapper(F(champ), output_field=models.BigIntegerField())
+
+
+class MoneyField(models.Field):
+    """Amount stored as BIGINT centimes and exposed as a two-place Decimal"""
+    description = "Montant (centimes)"
+    default_error_messages = {
+        'invalid': "« %(value)s » doit être un montant décimal.",
+    }
+
+    def __init__(self, *args, max_digits=None, **kwargs):
+        self.max_digits = max_digits
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits is not None:
+            kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    @property
+    def validators(self):
+        limites = [validators.DecimalValidator(self.max_digits, 2)] if self.max_digits else []
+        return [*limites, *super().validators]
+
+    def from_db_value(self, value, expression, connection):
+        # PostgreSQL renvoie SUM(bigint) en numeric : Decimal entier, accepté aussi
+        return None if value is None else depuis_centimes(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        try:
+            return vers_centimes(value)
+        except InvalidOperation:
+            raise ValueError(f"Montant invalide : {value!r}")
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': 2,
+            **kwargs,
+        })
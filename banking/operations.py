@@ -0,0 +1,169 @@
+"""
+Opérations d'écriture sur les comptes (dépôt, retrait, virement).
+
+Ces fonctions sont partagées par les vues HTML et l'API JSON : elles verrouillent
+les comptes concernés, appliquent les règles métier, publient l'événement dans
+l'outbox, mettent à jour les statistiques agrégées et notent les débits (``anomalies``)
+dans la même transaction, datent la dernière activité des comptes avec leur solde (``dormance``), et renvoient un résultat sérialisable (utilisé
+notamment pour rejouer les requêtes idempotentes).
+
+Chaque opération s'exécute sur le shard du compte (``shards``) ; un virement
+vers un compte d'un autre shard passe par ``virements_intershards``.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .anomalies import noter_operation
+from .models import Compte, Transaction as BankTransaction
+from .outbox import publier_transaction
+from .rollups import comptabiliser_transaction
+from .shards import liste_shards, shard, shard_par_identifiant
+from .virements_intershards import effectuer_virement_intershard
+
+PLAFOND_RETRAIT_JOURNALIER = Decimal('500000.00')  # Max 500,000 F CFA par jour
+
+
+def retraits_du_jour(compte):
+    """Total withdrawn from the account today"""
+    return BankTransaction.objects.filter(
+        compte_source=compte,
+        type_transaction='RETRAIT',
+        date_transaction__date=timezone.localdate()
+    ).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
+
+
+def _resultat(trans, compte):
+    """Serializable summary of a completed operation"""
+    return {
+        'transaction_id': trans.id,
+        'type_transaction': trans.type_transaction,
+        'compte_id': compte.id,
+        'montant': str(trans.montant),
+        'solde': str(compte.solde),
+    }
+
+
+def trouver_iban(iban, alias_prefere=None):
+    """(account id, shard) of an IBAN, looking at ``alias_prefere`` first; raises Compte.DoesNotExist"""
+    shards = liste_shards()
+    if alias_prefere in shards:
+        shards.remove(alias_prefere)
+        shards.insert(0, alias_prefere)
+    for alias in shards:
+        identifiant = Compte.objects.using(alias).filter(iban=iban).values_list('id', flat=True).first()
+        if identifiant is not None:
+            return identifiant, alias
+    raise Compte.DoesNotExist("Compte de destination introuvable")
+
+
+def virement_intershard(compte_id, iban_destination):
+    """Whether a transfer to ``iban_destination`` leaves the shard of the source; raises Compte.DoesNotExist"""
+    alias = shard_par_identifiant(compte_id)
+    return trouver_iban(iban_destination, alias)[1] != alias
+
+
+def effectuer_depot(compte_id, montant, description=''):
+    """Credit an account and record the DEPOT transaction"""
+    if montant <= 0:
+        raise ValueError("Le montant doit être supérieur à 0")
+
+    alias = shard_par_identifiant(compte_id)
+    with shard(alias), transaction.atomic(using=alias):
+        compte = Compte.objects.select_for_update().get(id=compte_id)
+        compte.solde += montant
+        compte.derniere_activite = timezone.now()
+        compte.save(update_fields=['solde', 'derniere_activite'])
+
+        trans = BankTransaction.objects.create(
+            compte_source=compte,
+            type_transaction='DEPOT',
+            montant=montant,
+            description=description
+        )
+        publier_transaction(trans, compte.solde)
+        comptabiliser_transaction(trans, compte.type_compte)
+    return _resultat(trans, compte)
+
+
+def effectuer_retrait(compte_id, montant, description=''):
+    """Debit an account within the balance and the daily withdrawal limit"""
+    if montant <= 0:
+        raise ValueError("Le montant doit être supérieur à 0")
+
+    alias = shard_par_identifiant(compte_id)
+    with shard(alias), transaction.atomic(using=alias):
+        compte = Compte.objects.select_for_update().get(id=compte_id)
+        disponible = PLAFOND_RETRAIT_JOURNALIER - retraits_du_jour(compte)
+
+        if montant > compte.solde:
+            raise ValueError(f"Solde insuffisant pour effectuer ce retrait (Solde: {compte.solde}€)")
+        if montant > disponible:
+            raise ValueError(f"Dépassement du plafond de retrait journalier. Vous pouvez retirer {disponible}€ aujourd'hui.")
+
+        compte.solde -= montant
+        compte.derniere_activite = timezone.now()
+        compte.save(update_fields=['solde', 'derniere_activite'])
+
+        trans = BankTransaction.objects.create(
+            compte_source=compte,
+            type_transaction='RETRAIT',
+            montant=montant,
+            description=description
+        )
+        publier_transaction(trans, compte.solde)
+        comptabiliser_transaction(trans, compte.type_compte)
+        noter_operation(trans)
+    return _resultat(trans, compte)
+
+
+def effectuer_virement(compte_id, iban_destination, montant, description=''):
+    """Move money between two accounts, locking both rows in id order"""
+    if montant <= 0:
+        raise ValueError("Le montant doit être supérieur à 0")
+
+    alias = shard_par_identifiant(compte_id)
+    destination_id, alias_destination = trouver_iban(iban_destination, alias)
+    if destination_id == compte_id:
+        raise ValueError("Le compte de destination ne peut pas être le même que le compte source.")
+    if alias_destination != alias:
+        return effectuer_virement_intershard(compte_id, destination_id, iban_destination, montant, description)
+
+    with shard(alias), transaction.atomic(using=alias):
+        # Verrouillage dans l'ordre des ids pour éviter les interblocages
+        comptes = {
+            c.id: c for c in Compte.objects.select_for_update().filter(
+                id__in=[compte_id, destination_id]
+            ).order_by('id')
+        }
+        if compte_id not in comptes:
+            raise Compte.DoesNotExist("Compte source introuvable")
+        source = comptes[compte_id]
+        destination = comptes[destination_id]
+
+        if source.solde < montant:
+            raise ValueError("Solde insuffisant sur le compte source.")
+
+        # Débit / Crédit
+        source.solde -= montant
+        destination.solde += montant
+        source.derniere_activite = destination.derniere_activite = timezone.now()
+        source.save(update_fields=['solde', 'derniere_activite'])
+        destination.save(update_fields=['solde', 'derniere_activite'])
+
+        trans = BankTransaction.objects.create(
+            compte_source=source,
+            compte_destination=destination,
+            type_transaction='VIREMENT',
+            montant=montant,
+            description=description
+        )
+        publier_transaction(trans, source.solde, destination.solde)
+        comptabiliser_transaction(trans, source.type_compte, destination.type_compte)
+        noter_operation(trans)
+
+    resultat = _resultat(trans, source)
+    resultat['iban_destination'] = destination.iban
+    return resultat
@@ -0,0 +1,183 @@
+"""
+Transactional outbox feeding downstream systems (accounting, SMS, anti-fraud).
+
+Every write operation inserts its event in the same atomic block as the balance
+update, so an event exists exactly when the operation committed. Consumers read
+the outbox by increasing position from a cursor and acknowledge batches by
+advancing a named cursor, instead of re-reading overlapping date windows of
+Transaction.
+
+Ids are assigned at insert time but transactions commit in any order, so the
+feed is not ordered by id: ``ordonner_evenements`` gives the events already
+committed the next positions, under the lock of a ``SequenceShard`` row. An
+event committed later always gets a higher position than every position a
+consumer may have read, however long its transaction lasted.
+
+Events and cursors live on the shard of the operation, with positions of their
+own. The feed reads every shard and merges them: its position holds one
+position per shard, written ``"12,7,9"`` (a plain number without sharding).
+"""
+from heapq import merge
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+
+from .models import CurseurConsommateur, EvenementOutbox, SequenceShard
+from .shards import base_courante, liste_shards, shard, sharding_actif
+
+LIMITE_DEFAUT = 100
+LIMITE_MAX = 1000
+SEQUENCE_POSITIONS = 'banking.evenementoutbox.position'
+
+
+def evenement_transaction(trans, solde_source, solde_destination=None):
+    """Unsaved outbox event describing a committed Transaction"""
+    donnees = {
+        'transaction_id': trans.id,
+        'type_transaction': trans.type_transaction,
+        'compte_id': trans.compte_source_id,
+        'montant': str(trans.montant),
+        'solde': str(solde_source) if solde_source is not None else None,
+        'description': trans.description,
+        'date_transaction': trans.date_transaction.isoformat(),
+    }
+    if trans.compte_destination_id:
+        donnees['compte_destination_id'] = trans.compte_destination_id
+        donnees['solde_destination'] = str(solde_destination)
+    if trans.reference:
+        # Jambe d'un virement inter-shards : l'autre jambe porte la même référence sur l'autre shard
+        donnees['reference'] = str(trans.reference)
+        donnees['iban_contrepartie'] = trans.iban_contrepartie
+    return EvenementOutbox(
+        type_evenement=f'transaction.{trans.type_transaction.lower()}',
+        transaction_id=trans.id,
+        donnees=donnees,
+    )
+
+
+def publier_transaction(trans, solde_source, solde_destination=None):
+    """Record the event of ``trans``; must run inside the operation's atomic block"""
+    evenement = evenement_transaction(trans, solde_source, solde_destination)
+    evenement.save()
+    return evenement
+
+
+def ordonner_evenements(limite=LIMITE_MAX):
+    """Give the committed events of the current shard without a position the next positions; returns their number"""
+    alias = base_courante()
+    sequences = SequenceShard.objects.using(alias).filter(nom=SEQUENCE_POSITIONS)
+    with transaction.atomic(using=alias):
+        # Verrou de la séquence avant de lire : les attributions se suivent, chacune voit les
+        # événements validés avant elle, et un événement validé ensuite reçoit une position plus grande
+        if not sequences.update(valeur=F('valeur')):
+            plus_grand = EvenementOutbox.objects.using(alias).aggregate(m=Max('position'))['m'] or 0
+            try:
+                with transaction.atomic(using=alias):
+                    sequences.create(nom=SEQUENCE_POSITIONS, valeur=plus_grand)
+            except IntegrityError:
+                sequences.update(valeur=F('valeur'))
+        a_ordonner = list(EvenementOutbox.objects.using(alias).filter(position__isnull=True).order_by('id')[:limite])
+        if not a_ordonner:
+            return 0
+        dernier = sequences.values_list('valeur', flat=True).get()
+        for position, evenement in enumerate(a_ordonner, dernier + 1):
+            evenement.position = position
+        EvenementOutbox.objects.using(alias).bulk_update(a_ordonner, ['position'])
+        sequences.update(valeur=dernier + len(a_ordonner))
+    return len(a_ordonner)
+
+
+def lire_evenements(apres=0, limite=LIMITE_DEFAUT):
+    """Events of the current shard with a position greater than ``apres``, in feed order"""
+    limite = min(limite, LIMITE_MAX)
+    ordonner_evenements(limite)
+    return list(EvenementOutbox.objects.filter(position__gt=apres).order_by('position')[:limite])
+
+
+def serialiser(evenement, alias=None):
+    """JSON representation of an outbox event; ids are per shard, so ``alias`` is added when sharded"""
+    donnees = {
+        'id': evenement.id,
+        'position': evenement.position,
+        'type': evenement.type_evenement,
+        'transaction_id': evenement.transaction_id,
+        'date_creation': evenement.date_creation.isoformat(),
+        'donnees': evenement.donnees,
+    }
+    if alias is not None and sharding_actif():
+        donnees['shard'] = alias
+    return donnees
+
+
+def curseur(nom):
+    """Last position acknowledged by consumer ``nom`` (0 if it never acknowledged)"""
+    return CurseurConsommateur.objects.filter(nom=nom).values_list('dernier_id', flat=True).first() or 0
+
+
+def acquitter(nom, dernier_id):
+    """Move the cursor of ``nom`` forward to position ``dernier_id``; it never moves back"""
+    if dernier_id < 0:
+        raise ValueError("Curseur invalide")
+    with transaction.atomic(using=base_courante()):
+        consommateur, _ = CurseurConsommateur.objects.select_for_update().get_or_create(nom=nom)
+        if dernier_id > consommateur.dernier_id:
+            consommateur.dernier_id = dernier_id
+            consommateur.save(update_fields=['dernier_id', 'date_maj'])
+    return consommateur.dernier_id
+
+
+def lire_position(valeur):
+    """Per-shard positions of a feed position: one number, or one per shard separated by commas"""
+    positions = [int(partie) for partie in str(valeur).split(',')]
+    if len(positions) != len(liste_shards()) or min(positions) < 0:
+        raise ValueError("Curseur invalide")
+    return positions
+
+
+def formater_position(positions):
+    """Feed position as returned to consumers"""
+    return positions[0] if len(positions) == 1 else ','.join(str(position) for position in positions)
+
+
+def curseurs(nom):
+    """Per-shard positions acknowledged by consumer ``nom``"""
+    positions = []
+    for alias in liste_shards():
+        with shard(alias):
+            positions.append(curseur(nom))
+    return positions
+
+
+def lire_flux(positions, limite=LIMITE_DEFAUT):
+    """
+    ``(alias, event)`` pairs after ``positions`` on every shard, at most ``limite``.
+
+    Shards are merged by creation date while the events of each shard keep
+    their feed order, so a position built from the returned events
+    (``avancer``) never skips an event.
+    """
+    parties = []
+    for alias, apres in zip(liste_shards(), positions):
+        with shard(alias):
+            parties.append([(alias, evenement) for evenement in lire_evenements(apres, limite)])
+    lus = merge(*parties, key=lambda ligne: ligne[1].date_creation)
+    return list(islice(lus, min(limite, LIMITE_MAX)))
+
+
+def avancer(positions, lus):
+    """Positions after the ``(alias, event)`` pairs ``lus``"""
+    shards = liste_shards()
+    positions = list(positions)
+    for alias, evenement in lus:
+        positions[shards.index(alias)] = evenement.position
+    return positions
+
+
+def acquitter_flux(nom, positions):
+    """Acknowledge per-shard ``positions`` for ``nom``; returns the stored positions"""
+    resultat = []
+    for alias, dernier_id in zip(liste_shards(), positions):
+        with shard(alias):
+            resultat.append(acquitter(nom, dernier_id))
+    return resultat
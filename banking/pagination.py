@@ -0,0 +1,47 @@
+"""
+Pagination helpers for very large tables.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+# En dessous de ce volume estimé, un COUNT(*) exact reste bon marché
+SEUIL_COMPTAGE_EXACT = 10000
+
+
+def estimer_lignes(queryset):
+    """
+    Cheap row-count estimate for an unfiltered queryset, or None.
+
+    PostgreSQL reads the planner statistics (pg_class.reltuples); SQLite reads
+    MAX(pk) from the primary key index, an upper bound when rows were deleted.
+    """
+    if not isinstance(queryset, QuerySet) or queryset.query.where or queryset.query.is_sliced:
+        return None
+
+    meta = queryset.model._meta
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [meta.db_table])
+        elif connection.vendor == 'sqlite':
+            qn = connection.ops.quote_name
+            cursor.execute(f"SELECT MAX({qn(meta.pk.column)}) FROM {qn(meta.db_table)}")
+        else:
+            return None
+        ligne = cursor.fetchone()
+    if not ligne or ligne[0] is None or ligne[0] < 0:
+        return None
+    return int(ligne[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that skips the exact COUNT(*) on large unfiltered tables"""
+
+    @cached_property
+    def count(self):
+        estimation = estimer_lignes(self.object_list)
+        if estimation is None or estimation < SEUIL_COMPTAGE_EXACT:
+            return super().count
+        return estimation
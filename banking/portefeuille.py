@@ -0,0 +1,81 @@
+"""
+Consolidated view of all of a client's accounts.
+
+Per-account flows, counts and last activity come from a single grouped query
+over Transaction, grouped by (source, destination, type) and folded onto each
+account in Python, so the cost does not grow with the number of accounts.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Transaction as BankTransaction
+from .monnaie import centimes, depuis_centimes
+
+
+def _metriques_vides():
+    # Flux en centimes entiers, convertis une seule fois en Decimal à la fin
+    return {'entrees': 0, 'sorties': 0, 'nb_transactions': 0, 'derniere_activite': None}
+
+
+def _ajouter(metriques, entree, total, nombre, derniere):
+    metriques['entrees' if entree else 'sorties'] += total
+    metriques['nb_transactions'] += nombre
+    if metriques['derniere_activite'] is None or derniere > metriques['derniere_activite']:
+        metriques['derniere_activite'] = derniere
+
+
+def metriques_comptes(ids, depuis):
+    """Flows and counts since ``depuis`` and last activity, keyed by account id"""
+    metriques = {pk: _metriques_vides() for pk in ids}
+    if not ids:
+        return metriques
+
+    recents = Q(date_transaction__gte=depuis)
+    groupes = BankTransaction.objects.filter(
+        Q(compte_source_id__in=ids) | Q(compte_destination_id__in=ids)
+    ).order_by().values('compte_source_id', 'compte_destination_id', 'type_transaction').annotate(
+        total=Sum(centimes('montant'), filter=recents),
+        nombre=Count('id', filter=recents),
+        derniere=Max('date_transaction'),
+    )
+
+    for groupe in groupes:
+        total = groupe['total'] or 0
+        source = metriques.get(groupe['compte_source_id'])
+        if source is not None:
+            _ajouter(source, groupe['type_transaction'] == 'DEPOT', total, groupe['nombre'], groupe['derniere'])
+        destination = metriques.get(groupe['compte_destination_id'])
+        if destination is not None:
+            _ajouter(destination, True, total, groupe['nombre'], groupe['derniere'])
+    return metriques
+
+
+def synthese_portefeuille(client, jours=30, maintenant=None):
+    """All of a client's accounts with their ``jours``-day metrics and portfolio totals"""
+    maintenant = maintenant or timezone.now()
+    comptes = list(client.comptes.order_by('date_ouverture'))
+    metriques = metriques_comptes([c.id for c in comptes], maintenant - timedelta(days=jours))
+
+    lignes = []
+    for compte in comptes:
+        ligne = metriques[compte.id]
+        ligne['entrees'] = depuis_centimes(ligne['entrees'])
+        ligne['sorties'] = depuis_centimes(ligne['sorties'])
+        ligne['compte'] = compte
+        ligne['flux_net'] = ligne['entrees'] - ligne['sorties']
+        lignes.append(ligne)
+
+    activites = [l['derniere_activite'] for l in lignes if l['derniere_activite']]
+    return {
+        'client': client,
+        'jours': jours,
+        'comptes': lignes,
+        'solde_total': sum((c.solde for c in comptes), Decimal('0')),
+        'entrees': sum((l['entrees'] for l in lignes), Decimal('0')),
+        'sorties': sum((l['sorties'] for l in lignes), Decimal('0')),
+        'nb_transactions': sum(l['nb_transactions'] for l in lignes),
+        'derniere_activite': max(activites) if activites else None,
+    }
@@ -0,0 +1,188 @@
+"""
+On-demand request profiling.
+
+``ProfilageMiddleware`` runs a sampled fraction of requests (``TAUX``), or any
+request carrying the ``X-Profilage`` header with the configured ``JETON``,
+under cProfile. Each profiled request leaves two files in ``REPERTOIRE``:
+``<horodatage>-<vue>-<id>.prof`` (pstats format) and a ``.json`` sidecar with
+the view, status, duration and every SQL query with its duration. Only the
+``MAX_FICHIERS`` most recent profiles are kept. ``analyser_profils``
+aggregates them into the hottest functions per view.
+"""
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+EN_TETE = 'HTTP_X_PROFILAGE'
+
+CONFIGURATION_DEFAUT = {
+    'ACTIF': False,
+    'TAUX': 0.0,
+    'JETON': '',
+    'REPERTOIRE': os.path.join(tempfile.gettempdir(), 'banking-profils'),
+    'MAX_FICHIERS': 200,
+}
+
+
+def configuration():
+    """Profiling settings, read at call time so they can be overridden"""
+    return {**CONFIGURATION_DEFAUT, **getattr(settings, 'PROFILAGE', {})}
+
+
+class ChronometreSQL:
+    """Database execute wrapper recording each query with its duration"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.requetes = []
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.requetes.append({
+                'alias': self.alias,
+                'sql': sql,
+                'duree_ms': round((time.perf_counter() - debut) * 1000, 3),
+                'many': many,
+            })
+
+
+def demande_profilage(request, config):
+    """True when the request carries the authorized header or falls in the sample"""
+    jeton = request.META.get(EN_TETE)
+    if jeton and config['JETON'] and hmac.compare_digest(jeton, config['JETON']):
+        return True
+    return config['TAUX'] > 0 and random.random() < config['TAUX']
+
+
+def _nom_vue(request):
+    correspondance = getattr(request, 'resolver_match', None)
+    return correspondance.view_name if correspondance else 'non_resolue'
+
+
+def liste_profils(repertoire):
+    """Saved profile paths, oldest first"""
+    try:
+        noms = os.listdir(repertoire)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(repertoire, nom) for nom in sorted(noms) if nom.endswith('.prof')]
+
+
+def _rotation(repertoire, max_fichiers):
+    profils = liste_profils(repertoire)
+    for chemin in profils[:max(len(profils) - max_fichiers, 0)]:
+        for fichier in (chemin, chemin[:-len('.prof')] + '.json'):
+            try:
+                os.remove(fichier)
+            except FileNotFoundError:
+                pass
+
+
+def enregistrer(profileur, meta, config):
+    """Write the profile and its sidecar, then drop the oldest profiles; returns the .prof path"""
+    repertoire = config['REPERTOIRE']
+    os.makedirs(repertoire, exist_ok=True)
+    vue = re.sub(r'[^\w.-]', '_', meta['vue'])
+    base = os.path.join(
+        repertoire, f"{timezone.now().strftime('%Y%m%dT%H%M%S%f')}-{vue}-{uuid.uuid4().hex[:8]}"
+    )
+    profileur.dump_stats(base + '.prof')
+    with open(base + '.json', 'w', encoding='utf-8') as fichier:
+        json.dump(meta, fichier, ensure_ascii=False)
+    _rotation(repertoire, config['MAX_FICHIERS'])
+    return base + '.prof'
+
+
+class ProfilageMiddleware:
+    """Profile sampled or explicitly requested requests; no-op unless PROFILAGE['ACTIF']"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = configuration()
+        if not config['ACTIF'] or not demande_profilage(request, config):
+            return self.get_response(request)
+
+        profileur = cProfile.Profile()
+        chronometres = [ChronometreSQL(connexion.alias) for connexion in connections.all()]
+        with ExitStack() as pile:
+            for chronometre in chronometres:
+                pile.enter_context(connections[chronometre.alias].execute_wrapper(chronometre))
+            try:
+                profileur.enable()
+            except ValueError:
+                # Un autre profileur est déjà actif sur ce thread
+                return self.get_response(request)
+            debut = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profileur.disable()
+            duree = time.perf_counter() - debut
+
+        requetes = [requete for chronometre in chronometres for requete in chronometre.requetes]
+        enregistrer(profileur, {
+            'vue': _nom_vue(request),
+            'chemin': request.path,
+            'methode': request.method,
+            'statut': response.status_code,
+            'date': timezone.now().isoformat(),
+            'duree_ms': round(duree * 1000, 3),
+            'duree_sql_ms': round(sum(r['duree_ms'] for r in requetes), 3),
+            'requetes': requetes,
+        }, config)
+        return response
+
+
+def agreger_profils(repertoire, top=20, tri='cumulative', vue=None):
+    """
+    Saved profiles merged per view: number of profiles, mean total and SQL
+    durations, and the ``top`` functions by cumulative or own time.
+    """
+    par_vue = {}
+    for chemin in liste_profils(repertoire):
+        try:
+            with open(chemin[:-len('.prof')] + '.json', encoding='utf-8') as fichier:
+                meta = json.load(fichier)
+        except (FileNotFoundError, ValueError):
+            continue
+        if vue is None or meta['vue'] == vue:
+            par_vue.setdefault(meta['vue'], []).append((chemin, meta))
+
+    colonne = {'cumulative': 3, 'tottime': 2}[tri]
+    rapports = {}
+    for nom, profils in sorted(par_vue.items()):
+        statistiques = pstats.Stats(*(chemin for chemin, _ in profils))
+        fonctions = sorted(statistiques.stats.items(), key=lambda item: item[1][colonne], reverse=True)[:top]
+        rapports[nom] = {
+            'profils': len(profils),
+            'duree_moyenne_ms': sum(meta['duree_ms'] for _, meta in profils) / len(profils),
+            'duree_sql_moyenne_ms': sum(meta['duree_sql_ms'] for _, meta in profils) / len(profils),
+            'requetes_moyennes': sum(len(meta['requetes']) for _, meta in profils) / len(profils),
+            'fonctions': [
+                {
+                    'fonction': pstats.func_std_string(fonction),
+                    'appels': appels,
+                    'temps_propre': temps_propre,
+                    'temps_cumule': temps_cumule,
+                }
+                for fonction, (_, appels, temps_propre, temps_cumule, _) in fonctions
+            ],
+        }
+    return rapports
@@ -0,0 +1,270 @@
+"""
+Monthly PDF statements and their archive.
+
+A closed month can no longer change, so its statement is generated once,
+stored under ``RELEVES_ARCHIVE['RACINE']`` at a path derived from the SHA-256
+of its bytes (``ab/abcdef….pdf``), and indexed by (account, period) in
+``ReleveArchive``. Later downloads stream the file as is: with ``FileResponse``
+(the WSGI server can use ``sendfile``), or by handing the path to the front
+web server through X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd).
+Only the current month is rendered on each request. Archives are built from
+the primary; a read replica only serves the current month and the archives
+that already exist.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.db import IntegrityError, router
+from django.db.models import Q, Sum
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .interets import bornes_periode
+from .models import Compte, ReleveArchive, Transaction as BankTransaction
+from .routage import lecture_primaire
+
+CONFIGURATION_DEFAUT = {
+    'RACINE': os.path.join(tempfile.gettempdir(), 'banking-releves'),
+    'SENDFILE': '',  # '', 'x-accel-redirect' ou 'x-sendfile'
+    'URL_INTERNE': '/releves-archives/',
+}
+
+
+def configuration():
+    """Archive settings, read at call time so they can be overridden"""
+    return {**CONFIGURATION_DEFAUT, **getattr(settings, 'RELEVES_ARCHIVE', {})}
+
+
+def periode_courante():
+    return timezone.localdate().strftime('%Y-%m')
+
+
+def periodes_precedentes(nombre):
+    """The ``nombre`` closed months before the current one, most recent first"""
+    premier = timezone.localdate().replace(day=1)
+    periodes = []
+    for _ in range(nombre):
+        premier = (premier - timedelta(days=1)).replace(day=1)
+        periodes.append(premier.strftime('%Y-%m'))
+    return periodes
+
+
+def _debut(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def generer_pdf(compte, periode):
+    """PDF bytes of the statement of ``compte`` for the month ``periode`` (AAAA-MM)"""
+    debut, fin = bornes_periode(periode)
+    client = compte.client
+    mouvements = BankTransaction.objects.filter(Q(compte_source=compte) | Q(compte_destination=compte))
+    transactions = mouvements.filter(
+        date_transaction__gte=_debut(debut), date_transaction__lt=_debut(fin)
+    ).select_related('compte_source', 'compte_destination').order_by('-date_transaction')
+
+    # Solde d'ouverture : solde actuel moins tous les mouvements depuis le début du mois
+    depuis = mouvements.filter(date_transaction__gte=_debut(debut)).aggregate(
+        entrees=Sum('montant', filter=Q(type_transaction='DEPOT') | Q(compte_destination=compte)),
+        sorties=Sum('montant', filter=Q(type_transaction__in=['RETRAIT', 'VIREMENT'], compte_source=compte)),
+    )
+    solde_debut = compte.solde - (depuis['entrees'] or 0) + (depuis['sorties'] or 0)
+
+    # Une seule requête : sommes entières en centimes côté base
+    totaux = transactions.aggregate(
+        depots=Sum('montant', filter=Q(type_transaction='DEPOT')),
+        retraits=Sum('montant', filter=Q(type_transaction='RETRAIT')),
+        sortants=Sum('montant', filter=Q(type_transaction='VIREMENT', compte_source=compte)),
+        entrants=Sum('montant', filter=Q(type_transaction='VIREMENT', compte_destination=compte)),
+    )
+    total_depots = totaux['depots'] or Decimal('0')
+    total_retraits = totaux['retraits'] or Decimal('0')
+    total_virements_sortants = totaux['sortants'] or Decimal('0')
+    total_virements_entrants = totaux['entrants'] or Decimal('0')
+
+    tampon = BytesIO()
+    # invariant : pas de date ni d'identifiant aléatoire dans les métadonnées du PDF
+    doc = SimpleDocTemplate(tampon, pagesize=A4, topMargin=1*cm, bottomMargin=1*cm, invariant=1)
+    story = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#0d6efd'),
+        alignment=TA_CENTER,
+        spaceAfter=0.5*cm
+    )
+    header_style = ParagraphStyle(
+        'CustomHeader',
+        parent=styles['Normal'],
+        fontSize=11,
+        textColor=colors.HexColor('#333333'),
+    )
+
+    month_year = debut.strftime('%B %Y')
+    story.append(Paragraph(f"RELEVÉ DE COMPTE - {month_year.upper()}", title_style))
+    story.append(Spacer(1, 0.3*cm))
+
+    info_text = f"<b>Titulaire:</b> {client.nom} {client.prenom} | <b>IBAN:</b> {compte.iban} | <b>Compte:</b> {compte.get_type_compte_display()}"
+    story.append(Paragraph(info_text, header_style))
+    story.append(Spacer(1, 0.3*cm))
+
+    summary_data = [
+        ['Libellé', 'Montant'],
+        ['Solde début de mois', f"{solde_debut} F CFA"],
+        ['Dépôts', f"+{total_depots} F CFA"],
+        ['Retraits', f"-{total_retraits} F CFA"],
+        ['Virements envoyés', f"-{total_virements_sortants} F CFA"],
+        ['Virements reçus', f"+{total_virements_entrants} F CFA"],
+    ]
+    summary_table = Table(summary_data, colWidths=[10*cm, 3*cm])
+    summary_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f9f9f9')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    story.append(summary_table)
+    story.append(Spacer(1, 0.5*cm))
+
+    if transactions:
+        story.append(Paragraph("DÉTAIL DES TRANSACTIONS", styles['Heading2']))
+        story.append(Spacer(1, 0.2*cm))
+
+        transaction_data = [['Date', 'Type', 'Description', 'Montant', 'Contrepartie']]
+        for trans in transactions:
+            if trans.type_transaction == 'VIREMENT':
+                autre = trans.compte_destination if trans.compte_source_id == compte.id else trans.compte_source
+                # Compte d'un autre shard : seul son IBAN est connu ici
+                contrepartie = autre.iban if autre is not None else trans.iban_contrepartie
+            else:
+                contrepartie = '-'
+            transaction_data.append([
+                timezone.localtime(trans.date_transaction).strftime('%d/%m/%Y'),
+                trans.get_type_transaction_display(),
+                trans.description[:30] if trans.description else '-',
+                f"{trans.montant} F CFA",
+                contrepartie
+            ])
+
+        trans_table = Table(transaction_data, colWidths=[2.5*cm, 2*cm, 4*cm, 2*cm, 3.5*cm])
+        trans_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f9f9f9')),
+            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
+            ('ALIGN', (4, 1), (4, -1), 'CENTER'),
+        ]))
+        story.append(trans_table)
+    else:
+        story.append(Paragraph("Aucune transaction ce mois-ci.", styles['Normal']))
+
+    story.append(Spacer(1, 1*cm))
+    if fin <= timezone.localdate():
+        # Mois clôturé : pas d'heure de génération, le même relevé donne les mêmes octets (empreinte, ETag)
+        footer_text = f"Relevé arrêté au {(fin - timedelta(days=1)).strftime('%d/%m/%Y')}"
+    else:
+        footer_text = f"Document généré le {timezone.localtime().strftime('%d/%m/%Y à %H:%M:%S')}"
+    story.append(Paragraph(footer_text, ParagraphStyle('Footer', parent=styles['Normal'], alignment=TA_CENTER, textColor=colors.grey, fontSize=9)))
+
+    doc.build(story)
+    return tampon.getvalue()
+
+
+def chemin_relatif(empreinte):
+    """Archive path of a PDF relative to the archive root"""
+    return os.path.join(empreinte[:2], f"{empreinte}.pdf")
+
+
+def _ecrire(contenu, empreinte, racine):
+    chemin = os.path.join(racine, chemin_relatif(empreinte))
+    if os.path.exists(chemin):
+        return chemin
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    # Écriture complète dans un temporaire puis renommage atomique : jamais de fichier tronqué servi
+    descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(chemin), suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as fichier:
+            fichier.write(contenu)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        os.replace(temporaire, chemin)
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+    return chemin
+
+
+def releve_archive(compte, periode):
+    """
+    Archived statement of a closed month, generated and stored on first use.
+
+    Returns the ReleveArchive row; raises ValueError for the current or a
+    future month, which must be rendered live.
+    """
+    debut, fin = bornes_periode(periode)
+    if fin > timezone.localdate():
+        raise ValueError("Le mois n'est pas clôturé")
+    racine = configuration()['RACINE']
+
+    archive = ReleveArchive.objects.filter(compte=compte, periode=periode).first()
+    if archive is not None and os.path.exists(os.path.join(racine, chemin_relatif(archive.empreinte))):
+        return archive
+
+    # L'archive n'est jamais régénérée : construite sur le primaire, pas sur une réplique en retard
+    with lecture_primaire():
+        compte = Compte.objects.using(router.db_for_write(Compte, instance=compte)).select_related('client').get(pk=compte.pk)
+        archive = ReleveArchive.objects.filter(compte=compte, periode=periode).first()
+        if archive is not None and os.path.exists(os.path.join(racine, chemin_relatif(archive.empreinte))):
+            return archive
+
+        contenu = generer_pdf(compte, periode)
+        empreinte = hashlib.sha256(contenu).hexdigest()
+        _ecrire(contenu, empreinte, racine)
+        if archive is not None:
+            # Fichier perdu (restauration partielle) : régénéré et réindexé
+            archive.empreinte, archive.taille = empreinte, len(contenu)
+            archive.save(update_fields=['empreinte', 'taille'])
+            return archive
+        try:
+            return ReleveArchive.objects.create(compte=compte, periode=periode, empreinte=empreinte, taille=len(contenu))
+        except IntegrityError:
+            # Archivé au même moment par une autre requête : la première version fait foi
+            return ReleveArchive.objects.get(compte=compte, periode=periode)
+
+
+def archiver_periode(periode):
+    """Archive the statement of every account active during ``periode``; returns (archived, already present)"""
+    debut, fin = bornes_periode(periode)
+    deja = set(ReleveArchive.objects.filter(periode=periode).values_list('compte_id', flat=True))
+    comptes = Compte.objects.select_related('client').filter(date_ouverture__lt=_debut(fin)).order_by('id')
+    nouveaux = 0
+    for compte in comptes.iterator(chunk_size=500):
+        if compte.id in deja:
+            continue
+        releve_archive(compte, periode)
+        nouveaux += 1
+    return nouveaux, len(deja)
@@ -0,0 +1,213 @@
+"""
+Bank-wide rollups maintained incrementally by the write path.
+
+Each operation adds its amount to the row of its day and moves the outstanding
+balance of the account types involved, in the same transaction as the balance
+update. Rows are split into ``FRAGMENTS`` slots chosen by account id so that
+concurrent operations on different accounts rarely wait on the same counter
+row; reports sum the slots. ``reconstruire`` recomputes everything from
+Transaction and Compte.
+
+Rollups are written on the shard of the operation, in its transaction; the
+reports add up the shards.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Compte, StatistiqueJournaliere, StatistiqueTypeCompte, Transaction as BankTransaction
+from .shards import liste_shards, shard
+
+FRAGMENTS = 8
+
+CHAMPS_OPERATION = {
+    'DEPOT': ('total_depots', 'nb_depots'),
+    'RETRAIT': ('total_retraits', 'nb_retraits'),
+    'VIREMENT': ('total_virements', 'nb_virements'),
+}
+
+
+def _incrementer(modele, cles, increments):
+    """Add ``increments`` to the row identified by ``cles``, creating it if needed"""
+    increments = {champ: valeur for champ, valeur in increments.items() if valeur}
+    if not increments:
+        return
+    # Value typée par le champ : les montants sont convertis en centimes comme à l'écriture
+    mises_a_jour = {
+        champ: F(champ) + Value(valeur, output_field=modele._meta.get_field(champ))
+        for champ, valeur in increments.items()
+    }
+    if modele.objects.filter(**cles).update(**mises_a_jour):
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(modele)):
+            modele.objects.create(**cles, **increments)
+    except IntegrityError:
+        # Créée entre-temps par une transaction concurrente
+        modele.objects.filter(**cles).update(**mises_a_jour)
+
+
+def _fragment(trans):
+    return (trans.compte_source_id or trans.compte_destination_id) % FRAGMENTS
+
+
+def _mouvements(trans, type_source, type_destination):
+    """Daily increments and per-type balance deltas of one transaction"""
+    total, nombre = CHAMPS_OPERATION[trans.type_transaction]
+    encours = defaultdict(Decimal)
+    if trans.compte_source_id is None:
+        # Jambe crédit d'un virement inter-shards : le virement est compté avec son débit
+        jour = {}
+    else:
+        jour = {total: trans.montant, nombre: 1}
+        signe = 1 if trans.type_transaction == 'DEPOT' else -1
+        encours[(type_source, trans.compte_source_id % FRAGMENTS)] += signe * trans.montant
+    if trans.type_transaction == 'VIREMENT' and trans.compte_destination_id:
+        encours[(type_destination, trans.compte_destination_id % FRAGMENTS)] += trans.montant
+    return jour, encours
+
+
+def comptabiliser_transaction(trans, type_source, type_destination=None):
+    """Apply one committed-to-be Transaction to the rollups (inside its atomic block)"""
+    jour, encours = _mouvements(trans, type_source, type_destination)
+    _incrementer(
+        StatistiqueJournaliere,
+        {'jour': timezone.localdate(trans.date_transaction), 'fragment': _fragment(trans)},
+        jour,
+    )
+    for (type_compte, fragment), delta in encours.items():
+        _incrementer(StatistiqueTypeCompte, {'type_compte': type_compte, 'fragment': fragment}, {'encours': delta})
+
+
+def comptabiliser_lot(mouvements):
+    """Apply many ``(trans, type_source, type_destination)`` at once, one update per row touched"""
+    par_jour = defaultdict(lambda: defaultdict(Decimal))
+    par_type = defaultdict(Decimal)
+    for trans, type_source, type_destination in mouvements:
+        jour, encours = _mouvements(trans, type_source, type_destination)
+        cle = (timezone.localdate(trans.date_transaction), _fragment(trans))
+        for champ, valeur in jour.items():
+            par_jour[cle][champ] += valeur
+        for cle_type, delta in encours.items():
+            par_type[cle_type] += delta
+
+    for (jour, fragment), increments in sorted(par_jour.items()):
+        _incrementer(StatistiqueJournaliere, {'jour': jour, 'fragment': fragment}, increments)
+    for (type_compte, fragment), delta in sorted(par_type.items()):
+        _incrementer(StatistiqueTypeCompte, {'type_compte': type_compte, 'fragment': fragment}, {'encours': delta})
+
+
+def comptabiliser_compte(compte_id, type_compte, actif, solde, signe=1):
+    """Count an account in (``signe=1``) or out of (``signe=-1``) its type's rollup"""
+    _incrementer(
+        StatistiqueTypeCompte,
+        {'type_compte': type_compte, 'fragment': compte_id % FRAGMENTS},
+        {'nb_comptes': signe, 'nb_comptes_actifs': signe if actif else 0, 'encours': signe * Decimal(solde)},
+    )
+
+
+def comptabiliser_comptes(comptes):
+    """Count many new accounts in at once (bulk_create bypasses the Compte signals)"""
+    par_type = defaultdict(lambda: {'nb_comptes': 0, 'nb_comptes_actifs': 0, 'encours': Decimal('0')})
+    for compte in comptes:
+        increments = par_type[(compte.type_compte, compte.pk % FRAGMENTS)]
+        increments['nb_comptes'] += 1
+        increments['nb_comptes_actifs'] += 1 if compte.actif else 0
+        increments['encours'] += compte.solde
+    for (type_compte, fragment), increments in sorted(par_type.items()):
+        _incrementer(StatistiqueTypeCompte, {'type_compte': type_compte, 'fragment': fragment}, increments)
+
+
+def decompter_desactivations(comptes):
+    """Take deactivated ``(id, type_compte)`` accounts out of the active counts (update() bypasses the signals)"""
+    par_type = defaultdict(int)
+    for compte_id, type_compte in comptes:
+        par_type[(type_compte, compte_id % FRAGMENTS)] += 1
+    for (type_compte, fragment), nombre in sorted(par_type.items()):
+        _incrementer(StatistiqueTypeCompte, {'type_compte': type_compte, 'fragment': fragment}, {'nb_comptes_actifs': -nombre})
+
+
+def reconstruire():
+    """Recompute every rollup of every shard from Transaction and Compte; returns the number of rows written"""
+    lignes = 0
+    for alias in liste_shards():
+        with shard(alias), transaction.atomic(using=alias):
+            lignes += _reconstruire_shard()
+    return lignes
+
+
+def _reconstruire_shard():
+    StatistiqueJournaliere.objects.all().delete()
+    StatistiqueTypeCompte.objects.all().delete()
+
+    jours = defaultdict(dict)
+    # Les jambes crédit des virements inter-shards (sans compte source) ne comptent pas une seconde fois
+    lignes = BankTransaction.objects.filter(compte_source__isnull=False).annotate(
+        jour=TruncDate('date_transaction')
+    ).order_by().values(
+        'jour', 'type_transaction'
+    ).annotate(total=Sum('montant'), nombre=Count('id'))
+    for ligne in lignes:
+        total, nombre = CHAMPS_OPERATION[ligne['type_transaction']]
+        jours[ligne['jour']].update({total: ligne['total'], nombre: ligne['nombre']})
+    StatistiqueJournaliere.objects.bulk_create(
+        [StatistiqueJournaliere(jour=jour, **valeurs) for jour, valeurs in jours.items()], batch_size=1000
+    )
+
+    types = Compte.objects.order_by().values('type_compte').annotate(
+        nombre=Count('id'), actifs=Count('id', filter=Q(actif=True)), encours=Sum('solde')
+    )
+    StatistiqueTypeCompte.objects.bulk_create([
+        StatistiqueTypeCompte(
+            type_compte=ligne['type_compte'], nb_comptes=ligne['nombre'],
+            nb_comptes_actifs=ligne['actifs'], encours=ligne['encours'] or 0,
+        )
+        for ligne in types
+    ])
+    return len(jours) + len(types)
+
+
+def _sur_les_shards(requete, cle):
+    """Rows of ``requete`` (grouped by ``cle``) summed across shards, in the order of the first shard query"""
+    shards = liste_shards()
+    if len(shards) == 1:
+        return list(requete)
+    cumul = {}
+    for alias in shards:
+        for ligne in requete.using(alias):
+            if ligne[cle] in cumul:
+                for champ, valeur in ligne.items():
+                    if champ != cle:
+                        cumul[ligne[cle]][champ] = (cumul[ligne[cle]][champ] or 0) + (valeur or 0)
+            else:
+                cumul[ligne[cle]] = dict(ligne)
+    inverse = str(requete.query.order_by[0]).startswith('-')
+    return sorted(cumul.values(), key=lambda ligne: ligne[cle], reverse=inverse)
+
+
+def statistiques_journalieres(jours=30, maintenant=None):
+    """Daily totals over the last ``jours`` days, most recent first (days without activity omitted)"""
+    depuis = timezone.localdate(maintenant) - timedelta(days=jours - 1)
+    return _sur_les_shards(
+        StatistiqueJournaliere.objects.filter(jour__gte=depuis).values('jour').annotate(
+            depots=Sum('total_depots'), nombre_depots=Sum('nb_depots'),
+            retraits=Sum('total_retraits'), nombre_retraits=Sum('nb_retraits'),
+            virements=Sum('total_virements'), nombre_virements=Sum('nb_virements'),
+        ).order_by('-jour'),
+        'jour',
+    )
+
+
+def statistiques_par_type():
+    """Account counts and outstanding balance per account type"""
+    return _sur_les_shards(
+        StatistiqueTypeCompte.objects.values('type_compte').annotate(
+            comptes=Sum('nb_comptes'), comptes_actifs=Sum('nb_comptes_actifs'), encours_total=Sum('encours'),
+        ).order_by('type_compte'),
+        'type_compte',
+    )
@@ -0,0 +1,181 @@
+"""
+Read replica routing for the reporting views.
+
+Views decorated with ``@lecture_replique`` run their queries against the
+``REPLIQUE_LECTURE['ALIAS']`` database; everything else, and every write, stays
+on ``default``. ``RouteurReplique`` (DATABASE_ROUTERS) only routes reads made
+while such a view is running, so the balance-mutating paths never read a
+lagging copy.
+
+Read-your-writes: ``EcritureRecenteMiddleware`` sets a short-lived cookie
+after each successful POST, and a client holding it is served from the primary
+for ``FENETRE_ECRITURE`` seconds. A replica that is not configured, cannot be
+reached or fails a query is skipped for ``REESSAI`` seconds and the view runs
+on the primary.
+
+Locally, point ``DB_REPLICA_NAME`` at a second SQLite file and refresh it with
+``python manage.py synchroniser_replique``.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+COOKIE = 'ecriture_recente'
+
+CONFIGURATION_DEFAUT = {
+    'ALIAS': 'replica',
+    'FENETRE_ECRITURE': 5.0,  # secondes de lecture sur le primaire après une écriture
+    'REESSAI': 30.0,  # secondes avant de retenter une réplique en échec
+}
+
+# Alias de lecture de la vue en cours (None : routage par défaut)
+_alias_lecture = ContextVar('alias_lecture', default=None)
+
+# alias -> instant (monotonic) avant lequel la réplique n'est pas retentée
+_indisponibles = {}
+_verrou = threading.Lock()
+
+
+def configuration():
+    """Replica settings, read at call time so they can be overridden"""
+    return {**CONFIGURATION_DEFAUT, **getattr(settings, 'REPLIQUE_LECTURE', {})}
+
+
+def marquer_indisponible(alias, duree):
+    with _verrou:
+        _indisponibles[alias] = time.monotonic() + duree
+
+
+def _cible(connexion):
+    return tuple(str(connexion.settings_dict[cle]) for cle in ('HOST', 'PORT', 'NAME'))
+
+
+def replique_disponible(alias, reessai):
+    """Whether reads can go to ``alias``: configured, reachable and not recently failed"""
+    if alias == DEFAULT_DB_ALIAS or alias not in connections.settings:
+        return False
+    with _verrou:
+        if _indisponibles.get(alias, 0) > time.monotonic():
+            return False
+    connexion = connections[alias]
+    if _cible(connexion) == _cible(connections[DEFAULT_DB_ALIAS]):
+        # Miroir du primaire (bases de test) : rien à gagner à changer de connexion
+        return False
+    if connexion.vendor == 'sqlite' and not os.path.exists(connexion.settings_dict['NAME']):
+        # SQLite créerait un fichier vide au lieu d'échouer
+        marquer_indisponible(alias, reessai)
+        return False
+    try:
+        connexion.ensure_connection()
+    except DatabaseError:
+        logger.warning("Réplique %s injoignable, lectures sur le primaire", alias)
+        marquer_indisponible(alias, reessai)
+        return False
+    return True
+
+
+def ecriture_recente(request, fenetre):
+    """Whether this client wrote less than ``fenetre`` seconds ago"""
+    try:
+        return time.time() - float(request.COOKIES.get(COOKIE, '')) < fenetre
+    except ValueError:
+        return False
+
+
+def lecture_replique(vue):
+    """Run a read-only view against the replica when it is safe to do so"""
+    @wraps(vue)
+    def enveloppe(request, *args, **kwargs):
+        config = configuration()
+        alias = config['ALIAS']
+        if (request.method not in ('GET', 'HEAD')
+                or ecriture_recente(request, config['FENETRE_ECRITURE'])
+                or not replique_disponible(alias, config['REESSAI'])):
+            return vue(request, *args, **kwargs)
+
+        jeton = _alias_lecture.set(alias)
+        try:
+            return vue(request, *args, **kwargs)
+        except DatabaseError:
+            # Réplique en panne ou schéma en retard : la vue est en lecture seule, on la rejoue
+            logger.warning("Échec de lecture sur la réplique %s, repli sur le primaire", alias, exc_info=True)
+            marquer_indisponible(alias, config['REESSAI'])
+            connections[alias].close()
+        finally:
+            _alias_lecture.reset(jeton)
+        return vue(request, *args, **kwargs)
+    return enveloppe
+
+
+@contextmanager
+def lecture_primaire():
+    """Send the reads of the block to the primary, even inside a ``@lecture_replique`` view"""
+    jeton = _alias_lecture.set(None)
+    try:
+        yield
+    finally:
+        _alias_lecture.reset(jeton)
+
+
+def synchroniser_sqlite(alias, source=DEFAULT_DB_ALIAS):
+    """Copy the SQLite primary into the replica file with the online backup API; returns the page count"""
+    chemins = []
+    for nom in (source, alias):
+        if nom not in connections.settings or connections[nom].vendor != 'sqlite':
+            raise ValueError(f"« {nom} » n'est pas une base SQLite configurée")
+        chemins.append(str(connections[nom].settings_dict['NAME']))
+    connections[alias].close()
+    origine, copie = (sqlite3.connect(chemin) for chemin in chemins)
+    try:
+        # Copie cohérente même pendant des écritures sur le primaire
+        origine.backup(copie)
+        return copie.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        origine.close()
+        copie.close()
+
+
+class RouteurReplique:
+    """Send the reads of ``@lecture_replique`` views to the replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _alias_lecture.get()
+
+    def db_for_write(self, model, **hints):
+        # Une instance lue sur la réplique s'enregistre sur le primaire ; sinon le shard ou default
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == configuration()['ALIAS']:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données des deux côtés : une instance lue sur la réplique peut être liée
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplique reçoit son schéma du primaire (réplication ou synchroniser_replique)
+        return False if db == configuration()['ALIAS'] else None
+
+
+class EcritureRecenteMiddleware:
+    """Mark clients that just wrote so their next reads stay on the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            fenetre = configuration()['FENETRE_ECRITURE']
+            response.set_cookie(COOKIE, f"{time.time():.3f}", max_age=max(1, int(fenetre)), httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,165 @@
+"""
+Client search index, and the description index of transactions.
+
+On SQLite the clients are mirrored into an FTS5 virtual table (kept in sync by
+the signals in ``banking.signals``) and ranked with bm25. On PostgreSQL a
+pg_trgm GIN index over the searchable columns gives fuzzy matching ranked by
+word similarity. Other backends fall back to ``icontains`` scans.
+
+Each shard indexes and is searched for its own clients; the results of the
+shards are merged by score.
+
+Transaction descriptions get the same treatment (migration 0014): an FTS5
+table over ``banking_transaction`` maintained by triggers on SQLite, a
+trigram index serving ``icontains`` on PostgreSQL. Both match every word of the
+search as the start of a word of the description, in any order.
+"""
+import re
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Client
+from .shards import base_courante, liste_shards, shard_par_identifiant
+
+FTS_TABLE = 'banking_client_fts'
+FTS_TRANSACTIONS = 'banking_transaction_fts'
+RESULTATS_MAX = 500
+
+# Expression indexée par le GIN trigramme (identique à celle de la migration 0003)
+PG_DOCUMENT = "lower(nom || ' ' || prenom || ' ' || cni || ' ' || email)"
+
+# Poids bm25 par colonne : nom, prenom, cni, email
+FTS_POIDS = (10.0, 5.0, 20.0, 2.0)
+
+
+def _requete_fts(terme):
+    """Turn free text into an FTS5 query of quoted prefix tokens"""
+    jetons = re.findall(r'\w+', terme, flags=re.UNICODE)
+    return ' '.join(f'"{jeton}"*' for jeton in jetons)
+
+
+def indexer_client(client, using=DEFAULT_DB_ALIAS):
+    """Insert or refresh a client row in the FTS index of its database (SQLite only)"""
+    if connections[using].vendor != 'sqlite':
+        return
+    with connections[using].cursor() as c:
+        c.execute(
+            f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, nom, prenom, cni, email) VALUES (%s, %s, %s, %s, %s)",
+            [client.pk, client.nom, client.prenom, client.cni, client.email]
+        )
+
+
+def indexer_clients(clients):
+    """Index many new clients of the current shard at once, e.g. after a bulk_create (SQLite only)"""
+    base = connections[base_courante()]
+    if base.vendor != 'sqlite' or not clients:
+        return
+    with base.cursor() as c:
+        c.executemany(
+            f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, nom, prenom, cni, email) VALUES (%s, %s, %s, %s, %s)",
+            [(client.pk, client.nom, client.prenom, client.cni, client.email) for client in clients]
+        )
+
+
+def desindexer_client(client_id, using=DEFAULT_DB_ALIAS):
+    """Remove a client from the FTS index of its database (SQLite only)"""
+    if connections[using].vendor != 'sqlite':
+        return
+    with connections[using].cursor() as c:
+        c.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [client_id])
+
+
+def reindexer_clients(taille_lot=5000):
+    """Rebuild the FTS index of every shard from its Client table; returns the number of rows indexed"""
+    if connection.vendor != 'sqlite':
+        return 0
+    return sum(_reindexer_shard(alias, taille_lot) for alias in liste_shards())
+
+
+def _reindexer_shard(alias, taille_lot):
+    total = 0
+    with transaction.atomic(using=alias), connections[alias].cursor() as c:
+        c.execute(f"DELETE FROM {FTS_TABLE}")
+        lignes = Client.objects.using(alias).order_by('pk').values_list('pk', 'nom', 'prenom', 'cni', 'email')
+        lot = []
+        for ligne in lignes.iterator(chunk_size=taille_lot):
+            lot.append(ligne)
+            if len(lot) >= taille_lot:
+                c.executemany(f"INSERT INTO {FTS_TABLE}(rowid, nom, prenom, cni, email) VALUES (%s, %s, %s, %s, %s)", lot)
+                total += len(lot)
+                lot = []
+        if lot:
+            c.executemany(f"INSERT INTO {FTS_TABLE}(rowid, nom, prenom, cni, email) VALUES (%s, %s, %s, %s, %s)", lot)
+            total += len(lot)
+    return total
+
+
+def _rechercher_shard(alias, terme, limite):
+    """``(score, id)`` of the matching clients of shard ``alias``, best (lowest) score first"""
+    base = connections[alias]
+    if base.vendor == 'sqlite':
+        requete = _requete_fts(terme)
+        if not requete:
+            return []
+        poids = ', '.join(str(p) for p in FTS_POIDS)
+        with base.cursor() as c:
+            c.execute(
+                f"SELECT bm25({FTS_TABLE}, {poids}) AS score, rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY score LIMIT %s",
+                [requete, limite]
+            )
+            return c.fetchall()
+
+    if base.vendor == 'postgresql':
+        with base.cursor() as c:
+            c.execute(
+                f"SELECT -word_similarity(lower(%s), {PG_DOCUMENT}) AS score, id FROM banking_client "
+                f"WHERE lower(%s) <%% {PG_DOCUMENT} ORDER BY score LIMIT %s",
+                [terme, terme, limite]
+            )
+            return c.fetchall()
+
+    filtre = Q()
+    for champ in ('nom', 'prenom', 'cni', 'email'):
+        filtre |= Q(**{f'{champ}__icontains': terme})
+    return [(0, pk) for pk in Client.objects.using(alias).filter(filtre).values_list('pk', flat=True)[:limite]]
+
+
+def rechercher_ids(terme, limite=RESULTATS_MAX):
+    """Client ids matching ``terme`` on every shard, most relevant first"""
+    terme = (terme or '').strip()
+    if not terme:
+        return []
+    resultats = [ligne for alias in liste_shards() for ligne in _rechercher_shard(alias, terme, limite)]
+    return [pk for _, pk in sorted(resultats)[:limite]]
+
+
+def rechercher_clients(terme, limite=50):
+    """Clients matching ``terme`` ordered by relevance"""
+    ids = rechercher_ids(terme, limite)
+    par_shard = defaultdict(list)
+    for pk in ids:
+        par_shard[shard_par_identifiant(pk)].append(pk)
+    clients = {}
+    for pks in par_shard.values():
+        clients.update(Client.objects.pour_client(pks[0]).in_bulk(pks))
+    return [clients[pk] for pk in ids if pk in clients]
+
+
+def filtrer_description(transactions, terme):
+    """Narrow a Transaction queryset to descriptions with a word starting with each word of ``terme``, in any order"""
+    if connection.vendor == 'sqlite':
+        requete = _requete_fts(terme)
+        if not requete:
+            return transactions
+        return transactions.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TRANSACTIONS} WHERE {FTS_TRANSACTIONS} MATCH %s", [requete])
+        )
+    # Même sémantique que la requête FTS5 : un préfixe de mot par jeton. Le icontains est servi par
+    # l'index trigramme, l'expression régulière écarte ensuite les occurrences en milieu de mot
+    for jeton in re.findall(r'\w+', terme, flags=re.UNICODE):
+        transactions = transactions.filter(description__icontains=jeton, description__iregex=rf'(^|\W){jeton}')
+    return transactions
@@ -0,0 +1,209 @@
+"""
+Client data sharded across several database aliases.
+
+``settings.SHARDS`` lists the aliases; ``['default']`` (the default) means no
+sharding and every function here is a no-op. A client and everything hanging
+off it (accounts, transactions, and the outbox events, rollups and idempotency
+keys written with them) live on ``SHARDS[client_id % len(SHARDS)]``.
+
+Client and account ids are allocated per shard from ``SequenceShard`` so that
+``id % len(SHARDS)`` is the index of their shard: any ``client_id`` or
+``compte_id`` names its shard and URLs keep working unchanged. A new client is
+placed by a hash of its CNI.
+
+Routing:
+
+- ``shard(alias)`` sends every query of the block to ``alias``
+  (``RouteurShards``); ``transaction.atomic(using=base_courante())`` makes the
+  block atomic there;
+- ``ShardMiddleware`` opens the shard of the ``compte_id``/``client_id`` of the
+  URL around the whole request;
+- outside a shard block, instances are saved on the shard of their key and
+  ``ShardManager`` offers ``pour_client``/``pour_compte`` and
+  ``sur_tous_les_shards`` for the few cross-shard listings.
+
+Transfers between two shards go through ``virements_intershards``.
+"""
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, transaction
+from django.db.models import F, Max
+from django.urls import Resolver404, resolve
+
+# Shard de la requête ou du bloc en cours (None : routage par instance, puis default)
+_shard_actif = ContextVar('shard_actif', default=None)
+
+
+def liste_shards():
+    return list(getattr(settings, 'SHARDS', None) or [DEFAULT_DB_ALIAS])
+
+
+def sharding_actif():
+    return len(liste_shards()) > 1
+
+
+def shard_par_identifiant(identifiant):
+    """Shard of a client or account id"""
+    shards = liste_shards()
+    return shards[identifiant % len(shards)]
+
+
+def shard_pour_cni(cni):
+    """Shard a new client is placed on"""
+    shards = liste_shards()
+    return shards[zlib.crc32(cni.encode()) % len(shards)]
+
+
+def base_courante():
+    """Alias of the open shard block, ``default`` outside any"""
+    return _shard_actif.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def shard(alias):
+    """Route every query of the block to ``alias``"""
+    jeton = _shard_actif.set(alias)
+    try:
+        yield alias
+    finally:
+        _shard_actif.reset(jeton)
+
+
+def shard_de_l_instance(instance):
+    """Shard an unsaved or saved instance belongs to, from its own key; None if it is not sharded"""
+    if instance._state.db in liste_shards():
+        return instance._state.db
+    nom = instance._meta.model_name
+    if nom == 'client':
+        return shard_par_identifiant(instance.pk) if instance.pk else shard_pour_cni(instance.cni)
+    if nom == 'compte':
+        return shard_par_identifiant(instance.client_id) if instance.client_id else None
+    for champ in ('compte_id', 'compte_source_id', 'compte_destination_id'):
+        identifiant = getattr(instance, champ, None)
+        if identifiant:
+            return shard_par_identifiant(identifiant)
+    return None
+
+
+def allouer_identifiants(modele, alias, nombre=1):
+    """``nombre`` fresh ids of ``modele`` on shard ``alias``, all congruent to the shard index"""
+    from .models import SequenceShard
+
+    shards = liste_shards()
+    index, pas = shards.index(alias), len(shards)
+    nom = modele._meta.label_lower
+    sequences = SequenceShard.objects.using(alias)
+    with transaction.atomic(using=alias):
+        if not sequences.filter(nom=nom).update(valeur=F('valeur') + nombre):
+            # Première allocation : on repart au-dessus des lignes déjà présentes sur le shard
+            plus_grand = modele._default_manager.using(alias).aggregate(m=Max('pk'))['m'] or 0
+            try:
+                with transaction.atomic(using=alias):
+                    sequences.create(nom=nom, valeur=plus_grand // pas + nombre)
+            except IntegrityError:
+                sequences.filter(nom=nom).update(valeur=F('valeur') + nombre)
+        dernier = sequences.get(nom=nom).valeur
+    return [valeur * pas + index for valeur in range(dernier - nombre + 1, dernier + 1)]
+
+
+def attribuer_identifiant(sender, instance, raw=False, using=None, **kwargs):
+    """pre_save handler giving a new Client or Compte an id that names its shard"""
+    if raw or instance.pk or not sharding_actif():
+        return
+    instance.pk = allouer_identifiants(sender, using)[0]
+
+
+def fusionner(parties, limite=None):
+    """
+    Lazy merge of per-shard querysets sharing one ordering, at most ``limite`` rows.
+
+    Each shard is read up to ``limite`` rows, only when the result is iterated;
+    the merge follows the direction of the first ordering field.
+    """
+    if limite is not None:
+        parties = [partie[:limite] for partie in parties]
+    ordre = parties[0].query.order_by or parties[0].model._meta.ordering
+    cles = [champ.lstrip('-') for champ in ordre]
+    if not cles:
+        fusion = (ligne for partie in parties for ligne in partie)
+    else:
+        # heapq.merge ne sait trier que dans un sens : les shards sont déjà triés dans l'ordre voulu
+        inverse = ordre[0].startswith('-')
+        fusion = merge(*parties, key=lambda ligne: tuple(getattr(ligne, champ) for champ in cles), reverse=inverse)
+    return islice(fusion, limite)
+
+
+class ShardQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # Sans base explicite, l'instance est enregistrée sur le shard de sa clé (routeur)
+        instance = self.model(**kwargs)
+        self._for_write = True
+        instance.save(force_insert=True, using=self._db)
+        return instance
+
+    def pour_client(self, client_id):
+        return self.using(shard_par_identifiant(client_id)) if sharding_actif() else self
+
+    pour_compte = pour_client
+
+    def sur_tous_les_shards(self, limite=None):
+        """
+        Rows of this queryset on every shard, merged in its ordering.
+
+        Unsharded, the queryset itself (sliced to ``limite``). The merge follows
+        the direction of the first ordering field; each shard is read up to
+        ``limite`` rows.
+        """
+        if not sharding_actif():
+            return self[:limite] if limite is not None else self
+        return list(fusionner([self.using(alias) for alias in liste_shards()], limite))
+
+
+class ShardManager(models.Manager.from_queryset(ShardQuerySet)):
+    pass
+
+
+class RouteurShards:
+    """Queries of a shard block go to its shard; new instances to the shard of their key"""
+
+    def _route(self, model, **hints):
+        alias = _shard_actif.get()
+        if alias is not None:
+            return alias
+        instance = hints.get('instance')
+        if instance is None or not sharding_actif():
+            return None
+        return shard_de_l_instance(instance)
+
+    db_for_read = _route
+    db_for_write = _route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_actif() and obj1._state.db and obj2._state.db:
+            return obj1._state.db == obj2._state.db
+        return None
+
+
+class ShardMiddleware:
+    """Run account and client views inside the shard of the id in their URL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not sharding_actif():
+            return self.get_response(request)
+        try:
+            parametres = resolve(request.path_info).kwargs
+        except Resolver404:
+            return self.get_response(request)
+        identifiant = parametres.get('compte_id') or parametres.get('client_id')
+        if identifiant is None:
+            return self.get_response(request)
+        with shard(shard_par_identifiant(int(identifiant))):
+            return self.get_response(request)
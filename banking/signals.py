@@ -0,0 +1,93 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import cache_ibans
+from .fragments import invalider
+from .models import Client, Compte
+from .rollups import comptabiliser_compte
+from .search import desindexer_client, indexer_client
+from .shards import attribuer_identifiant, shard
+
+
+@receiver(post_save, sender=Client)
+def indexer_client_enregistre(sender, instance, using=None, **kwargs):
+    """Keep the search index of the client's shard in sync on create/update"""
+    indexer_client(instance, using)
+
+
+@receiver(post_delete, sender=Client)
+def desindexer_client_supprime(sender, instance, using=None, **kwargs):
+    """Drop deleted clients from the search index of their shard"""
+    desindexer_client(instance.pk, using)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalider_fragments_clients(sender, using=None, **kwargs):
+    """Re-render cached fragments that print client names"""
+    invalider('clients', using)
+
+
+@receiver(post_save, sender=Compte)
+@receiver(post_delete, sender=Compte)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def vider_cache_ibans(sender, update_fields=None, **kwargs):
+    """Forget cached IBAN lookups when an account is opened, closed or removed, or a holder renamed"""
+    # Un mouvement ne change ni l'IBAN, ni le statut, ni le titulaire
+    if sender is Compte and _solde_seulement(update_fields):
+        return
+    cache_ibans.clear()
+
+
+def _solde_seulement(update_fields):
+    # Les opérations (update_fields=['solde', 'derniere_activite']) tiennent elles-mêmes l'encours à jour
+    return update_fields is not None and set(update_fields) <= {'solde', 'derniere_activite'}
+
+
+@receiver(pre_save, sender=Compte)
+def fixer_solde_ouverture(sender, instance, raw=False, **kwargs):
+    """An account opens with its initial balance; later balance changes are movements"""
+    if not raw and instance._state.adding:
+        instance.solde_ouverture = instance.solde
+
+
+@receiver(pre_save, sender=Compte)
+def memoriser_compte(sender, instance, raw=False, update_fields=None, using=None, **kwargs):
+    """Remember the stored state of an account about to change, for the rollups"""
+    if raw or not instance.pk or _solde_seulement(update_fields):
+        return
+    instance._etat_statistiques = Compte.objects.using(using).filter(pk=instance.pk).values_list(
+        'type_compte', 'actif', 'solde'
+    ).first()
+
+
+@receiver(post_save, sender=Compte)
+def comptabiliser_compte_enregistre(sender, instance, created, raw=False, update_fields=None, using=None, **kwargs):
+    """Move an opened, closed or retyped account between the per-type rollups"""
+    if raw or _solde_seulement(update_fields):
+        return
+    ancien = getattr(instance, '_etat_statistiques', None)
+    nouveau = (instance.type_compte, instance.actif, instance.solde)
+    if ancien == nouveau:
+        return
+    # Statistiques tenues sur le shard du compte
+    with shard(using):
+        if ancien is not None:
+            comptabiliser_compte(instance.pk, *ancien, signe=-1)
+        comptabiliser_compte(instance.pk, *nouveau)
+    instance._etat_statistiques = nouveau
+
+
+@receiver(post_delete, sender=Compte)
+def comptabiliser_compte_supprime(sender, instance, using=None, **kwargs):
+    """Take a deleted account out of its type's rollup"""
+    with shard(using):
+        comptabiliser_compte(instance.pk, instance.type_compte, instance.actif, instance.solde, signe=-1)
+
+
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=Compte)
+def attribuer_identifiant_shard(sender, instance, **kwargs):
+    """Give new clients and accounts an id naming their shard (no-op without sharding)"""
+    attribuer_identifiant(sender, instance, **kwargs)
@@ -0,0 +1,183 @@
+"""
+Concurrency stress harness for the write operations.
+
+Threads run random deposits, withdrawals and transfers through
+``effectuer_depot/retrait/virement`` (the code shared by the HTML views and the
+API) on a set of accounts, then ``verifier_invariants`` checks from the
+database that money was conserved, that every balance matches its movements,
+that no balance is negative, that no account withdrew more than the daily
+limit and that the rollups still match the balances.
+
+Database conflicts (``OperationalError``, e.g. SQLite "database is locked"
+when two deferred transactions race to write) are retried and counted: a
+rising count is the signal of a locking regression.
+"""
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.db import OperationalError, connection
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from .models import Compte, StatistiqueTypeCompte, Transaction as BankTransaction
+from .operations import PLAFOND_RETRAIT_JOURNALIER, effectuer_depot, effectuer_retrait, effectuer_virement
+
+OPERATIONS = ('DEPOT', 'RETRAIT', 'VIREMENT')
+TENTATIVES_MAX = 5
+
+
+def _montant(generateur, montant_max):
+    return Decimal(generateur.randint(1, int(montant_max * 100))) / 100
+
+
+def _percentile(durees, rang):
+    if len(durees) < 2:
+        return durees[0] if durees else 0
+    return statistics.quantiles(durees, n=100, method='inclusive')[rang - 1]
+
+
+def executer_stress(comptes, nb_threads=8, operations_par_thread=100, montant_max=Decimal('200000'), graine=None):
+    """
+    Run ``nb_threads`` x ``operations_par_thread`` random operations on ``comptes``
+    (list of Compte) and return the per-operation report plus the id of the
+    last Transaction before the run (for ``verifier_invariants``).
+    """
+    ids = [c.id for c in comptes]
+    ibans = {c.id: c.iban for c in comptes}
+    depart_id = BankTransaction.objects.aggregate(dernier=Max('id'))['dernier'] or 0
+    resultats = defaultdict(lambda: {'reussies': 0, 'refusees': 0, 'conflits': 0, 'echecs': 0, 'durees': []})
+    verrou = threading.Lock()
+    barriere = threading.Barrier(nb_threads)
+
+    def travailleur(numero):
+        generateur = random.Random(None if graine is None else graine + numero)
+        local = defaultdict(lambda: {'reussies': 0, 'refusees': 0, 'conflits': 0, 'echecs': 0, 'durees': []})
+        try:
+            barriere.wait()
+            for _ in range(operations_par_thread):
+                operation = generateur.choice(OPERATIONS)
+                compte_id = generateur.choice(ids)
+                montant = _montant(generateur, montant_max)
+                if operation == 'DEPOT':
+                    appel = partial(effectuer_depot, compte_id, montant, 'stress')
+                elif operation == 'RETRAIT':
+                    appel = partial(effectuer_retrait, compte_id, montant, 'stress')
+                else:
+                    destination = generateur.choice([i for i in ids if i != compte_id])
+                    appel = partial(effectuer_virement, compte_id, ibans[destination], montant, 'stress')
+
+                stats = local[operation]
+                debut = time.perf_counter()
+                for tentative in range(TENTATIVES_MAX):
+                    try:
+                        appel()
+                        stats['reussies'] += 1
+                        break
+                    except ValueError:
+                        # Refus métier (solde insuffisant, plafond) : comportement attendu
+                        stats['refusees'] += 1
+                        break
+                    except OperationalError:
+                        stats['conflits'] += 1
+                        time.sleep(generateur.uniform(0, 0.002 * 2 ** tentative))
+                else:
+                    stats['echecs'] += 1
+                stats['durees'].append(time.perf_counter() - debut)
+        finally:
+            connection.close()
+            with verrou:
+                for operation, stats in local.items():
+                    cumul = resultats[operation]
+                    for cle in ('reussies', 'refusees', 'conflits', 'echecs'):
+                        cumul[cle] += stats[cle]
+                    cumul['durees'].extend(stats['durees'])
+
+    debut = time.perf_counter()
+    threads = [threading.Thread(target=travailleur, args=(i,)) for i in range(nb_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duree = time.perf_counter() - debut
+
+    operations = {}
+    for operation in OPERATIONS:
+        stats = resultats[operation]
+        durees = stats.pop('durees')
+        operations[operation] = {
+            **stats,
+            'par_seconde': len(durees) / duree if duree else 0,
+            'p50_ms': _percentile(durees, 50) * 1000,
+            'p99_ms': _percentile(durees, 99) * 1000,
+        }
+    return {
+        'threads': nb_threads,
+        'operations': operations,
+        'total': nb_threads * operations_par_thread,
+        'duree': duree,
+        'par_seconde': nb_threads * operations_par_thread / duree if duree else 0,
+        'depart_id': depart_id,
+    }
+
+
+def verifier_invariants(soldes_initiaux, depart_id):
+    """
+    Check the accounts of ``soldes_initiaux`` ({compte_id: solde before the run})
+    against the transactions created after ``depart_id``; returns the list of
+    violations (empty when every invariant holds).
+    """
+    ids = list(soldes_initiaux)
+    soldes = dict(Compte.objects.filter(id__in=ids).values_list('id', 'solde'))
+    attendus = dict(soldes_initiaux)
+    retraits_jour = defaultdict(Decimal)
+    aujourd_hui = timezone.localdate()
+
+    mouvements = BankTransaction.objects.filter(
+        Q(compte_source_id__in=ids) | Q(compte_destination_id__in=ids), id__gt=depart_id
+    ).values_list('compte_source_id', 'compte_destination_id', 'type_transaction', 'montant', 'date_transaction')
+    entrees = sorties = Decimal('0')
+    for source, destination, type_transaction, montant, date_transaction in mouvements.iterator():
+        if type_transaction == 'DEPOT':
+            attendus[source] += montant
+            entrees += montant
+        elif type_transaction == 'RETRAIT':
+            attendus[source] -= montant
+            sorties += montant
+            if timezone.localdate(date_transaction) == aujourd_hui:
+                retraits_jour[source] += montant
+        else:
+            attendus[source] -= montant
+            attendus[destination] += montant
+
+    violations = []
+    total_initial, total_final = sum(soldes_initiaux.values()), sum(soldes.values())
+    if total_final != total_initial + entrees - sorties:
+        violations.append(
+            f"Conservation : {total_final} en fin contre {total_initial} + {entrees} - {sorties} attendus"
+        )
+    for compte_id in ids:
+        if soldes[compte_id] != attendus[compte_id]:
+            violations.append(f"Compte {compte_id} : solde {soldes[compte_id]}, mouvements {attendus[compte_id]}")
+        if soldes[compte_id] < 0:
+            violations.append(f"Compte {compte_id} : solde négatif {soldes[compte_id]}")
+    # Retraits du jour, y compris ceux d'avant le test
+    deja = BankTransaction.objects.filter(
+        compte_source_id__in=ids, type_transaction='RETRAIT', id__lte=depart_id,
+        date_transaction__date=aujourd_hui,
+    ).values('compte_source_id').annotate(total=Sum('montant'))
+    for ligne in deja:
+        retraits_jour[ligne['compte_source_id']] += ligne['total']
+    for compte_id, total in retraits_jour.items():
+        if total > PLAFOND_RETRAIT_JOURNALIER:
+            violations.append(f"Compte {compte_id} : {total} retirés aujourd'hui, plafond {PLAFOND_RETRAIT_JOURNALIER}")
+
+    encours = StatistiqueTypeCompte.objects.aggregate(total=Sum('encours'))['total'] or Decimal('0')
+    reel = Compte.objects.aggregate(total=Sum('solde'))['total'] or Decimal('0')
+    if encours != reel:
+        violations.append(f"Statistiques : encours agrégé {encours}, somme des soldes {reel}")
+    return violations
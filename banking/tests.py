@@ -1,3 +1,1735 @@
-from django.test import TestCase
+import io
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from banking_project.database import configuration_base_de_donnees
+
+from .admission import CompteSature, LimiteurFichier, LimiteurLocal, limiteur_courant
+from .analytics import analyser_compte, lttb, moyenne_mobile, serie_soldes
+from .anomalies import reconstruire_profils
+from .autocomplete import cache_ibans, rechercher_ibans
+from .dormance import comptes_dormants, dater_activite, seuil_dormance
+from .forms import FiltresHistoriqueForm, VirementForm
+from .fragments import version as version_fragments
+from .grand_livre import GrandLivre, verifier
+from .idempotency import purger_cles_expirees
+from .import_clients import importer_csv
+from .interets import calculer_interets, interets_courus
+from .monnaie import vers_centimes
+from .outbox import acquitter_flux, avancer, curseurs, lire_flux
+from .models import (
+    AlerteAnomalie, CleIdempotence, Client, Compte, CurseurConsommateur, InteretCompte, EvenementOutbox, ExecutionVirementPermanent,
+    ProfilRisque, ReleveArchive, Transaction as BankTransaction, VirementInterShard, VirementPermanent
+)
+from .pagination import EstimatedCountPaginator
+from .operations import effectuer_depot, effectuer_retrait, effectuer_virement
+from .portefeuille import synthese_portefeuille
+from .profilage import agreger_profils, liste_profils
+from .releves import generer_pdf, periode_courante, periodes_precedentes
+from .routage import COOKIE, synchroniser_sqlite
+from .rollups import reconstruire, statistiques_journalieres, statistiques_par_type
+from .search import rechercher_clients, reindexer_clients
+from .shards import shard, shard_pour_cni
+from .stress import executer_stress, verifier_invariants
+from .virements_intershards import reprendre_virements_intershards
+from .virements_permanents import executer_virements_permanents, prochaine_echeance
+
+
+def creer_client(suffixe='1', **kwargs):
+    """Create a client with unique cni/email"""
+    valeurs = {
+        'nom': f'Nom{suffixe}',
+        'prenom': f'Prenom{suffixe}',
+        'cni': f'CM-{suffixe}',
+        'email': f'client{suffixe}@example.cm',
+        'telephone': '+237600000000',
+        'adresse': 'Douala',
+    }
+    valeurs.update(kwargs)
+    return Client.objects.create(**valeurs)
+
+
+def creer_compte(client, iban, solde='0', **kwargs):
+    """Create an account for a client"""
+    return Compte.objects.create(client=client, iban=iban, solde=Decimal(solde), **kwargs)
+
+
+def creer_transaction(compte_source, type_transaction, montant, il_y_a=0, compte_destination=None, **kwargs):
+    """Record a transaction dated ``il_y_a`` days ago (no balance change)"""
+    trans = BankTransaction.objects.create(
+        compte_source=compte_source, compte_destination=compte_destination,
+        type_transaction=type_transaction, montant=Decimal(montant), **kwargs
+    )
+    if il_y_a:
+        date = timezone.now() - timedelta(days=il_y_a)
+        BankTransaction.objects.filter(pk=trans.pk).update(date_transaction=date)
+        trans.date_transaction = date
+    return trans
+
+
+class IdempotenceTests(TestCase):
+    def setUp(self):
+        self.client_bank = creer_client()
+        self.compte = creer_compte(self.client_bank, 'CM76000000000000000000000001', '1000.00')
+        self.autre = creer_compte(self.client_bank, 'CM76000000000000000000000002', '0.00')
+
+    def test_depot_form_rejoue_sans_doublon(self):
+        url = reverse('depot', args=[self.compte.id])
+        donnees = {'montant': '250', 'description': 'Espèces', 'idempotency_key': 'cle-depot-1'}
+        self.client.post(url, donnees)
+        response = self.client.post(url, donnees)
+
+        self.assertRedirects(response, reverse('dashboard', args=[self.compte.id]))
+        self.compte.refresh_from_db()
+        self.assertEqual(self.compte.solde, Decimal('1250.00'))
+        self.assertEqual(BankTransaction.objects.filter(type_transaction='DEPOT').count(), 1)
+
+    def test_api_virement_rejoue_le_resultat_original(self):
+        url = reverse('api_virement', args=[self.compte.id])
+        corps = json.dumps({'iban_destination': self.autre.iban, 'montant': '1000'})
+        premiere = self.client.post(url, corps, content_type='application/json', HTTP_IDEMPOTENCY_KEY='v-1')
+        seconde = self.client.post(url, corps, content_type='application/json', HTTP_IDEMPOTENCY_KEY='v-1')
+
+        self.assertEqual(premiere.status_code, 201)
+        self.assertEqual(seconde.status_code, 200)
+        self.assertEqual(seconde['Idempotent-Replayed'], 'true')
+        self.assertEqual(premiere.json(), seconde.json())
+        self.autre.refresh_from_db()
+        self.assertEqual(self.autre.solde, Decimal('1000.00'))
+
+    def test_api_cle_reutilisee_pour_autre_montant(self):
+        url = reverse('api_depot', args=[self.compte.id])
+        self.client.post(url, json.dumps({'montant': '10'}), content_type='application/json', HTTP_IDEMPOTENCY_KEY='k')
+        response = self.client.post(url, json.dumps({'montant': '20'}), content_type='application/json', HTTP_IDEMPOTENCY_KEY='k')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(BankTransaction.objects.count(), 1)
+
+    def test_echec_non_enregistre(self):
+        url = reverse('api_retrait', args=[self.compte.id])
+        response = self.client.post(url, json.dumps({'montant': '5000'}), content_type='application/json', HTTP_IDEMPOTENCY_KEY='r-1')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CleIdempotence.objects.filter(cle='r-1').exists())
+
+    def test_api_rejette_les_montants_et_corps_invalides(self):
+        url = reverse('api_depot', args=[self.compte.id])
+        for montant in ('NaN', 'sNaN', 'Infinity', '-Infinity', '1e30', '10000000000', '0.001', 'abc'):
+            with self.subTest(montant=montant):
+                response = self.client.post(url, {'montant': montant}, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        for corps in ('[1]', '"100"', '12', 'null', '{'):
+            with self.subTest(corps=corps):
+                response = self.client.post(url, corps, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(url, {'montant': '9999999999.99'}, content_type='application/json').status_code, 201)
+        self.assertEqual(self.client.post(url, {'montant': '1.500'}, content_type='application/json').status_code, 201)
+        self.assertFalse(BankTransaction.objects.filter(montant__lt=1).exists())
+
+    def test_purge_des_cles_expirees(self):
+        maintenant = timezone.now()
+        CleIdempotence.objects.create(cle='vieille', operation='depot:1', empreinte='x', date_expiration=maintenant - timedelta(hours=1))
+        CleIdempotence.objects.create(cle='recente', operation='depot:1', empreinte='x', date_expiration=maintenant + timedelta(hours=1))
+
+        self.assertEqual(purger_cles_expirees(maintenant), 1)
+        self.assertTrue(CleIdempotence.objects.filter(cle='recente').exists())
+
+
+# Sans contrôle d'admission : toutes les requêtes doivent atteindre l'opération
+@override_settings(ADMISSION={'MODE': 'aucun'})
+class IdempotenceConcurrenceTests(TransactionTestCase):
+    NB_THREADS = 12
+
+    def test_meme_cle_depuis_plusieurs_threads(self):
+        compte = creer_compte(creer_client(), 'CM76000000000000000000000009', '0.00')
+        url = reverse('api_depot', args=[compte.id])
+        corps = json.dumps({'montant': '100'})
+        depart = threading.Barrier(self.NB_THREADS)
+        statuts = []
+
+        def envoyer():
+            try:
+                depart.wait()
+                response = self.client_class().post(url, corps, content_type='application/json', HTTP_IDEMPOTENCY_KEY='meme-cle')
+                statuts.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=envoyer) for _ in range(self.NB_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuts), [200] * (self.NB_THREADS - 1) + [201])
+        compte.refresh_from_db()
+        self.assertEqual(compte.solde, Decimal('100.00'))
+        self.assertEqual(BankTransaction.objects.filter(compte_source=compte).count(), 1)
+
+
+class RechercheClientsTests(TestCase):
+    def setUp(self):
+        self.nadege = creer_client('1', nom='Mbarga', prenom='Nadège', cni='CM-1234567890')
+        self.paul = creer_client('2', nom='Fouda', prenom='Paul', email='paul.mbarga@example.cm')
+        self.autre = creer_client('3', nom='Etoa', prenom='Samuel')
+
+    def test_prefixe_et_accents(self):
+        self.assertEqual(rechercher_clients('nadege'), [self.nadege])
+        self.assertEqual(rechercher_clients('mbar nad'), [self.nadege])
+        self.assertEqual(rechercher_clients('1234567'), [self.nadege])
+
+    def test_classement_par_pertinence(self):
+        # Le nom pèse plus lourd que l'email dans le classement
+        self.assertEqual(rechercher_clients('mbarga'), [self.nadege, self.paul])
+
+    def test_index_synchronise_par_signaux(self):
+        self.autre.nom = 'Ndongo'
+        self.autre.save()
+        self.assertEqual(rechercher_clients('ndongo'), [self.autre])
+        self.assertEqual(rechercher_clients('etoa'), [])
+
+        self.autre.delete()
+        self.assertEqual(rechercher_clients('ndongo'), [])
+
+    def test_reindexation_apres_import_en_masse(self):
+        Client.objects.bulk_create([Client(nom='Abena', prenom='Joseph', cni='CM-9', email='j@example.cm', telephone='1', adresse='Yaoundé')])
+        self.assertEqual(rechercher_clients('abena'), [])
+        self.assertEqual(reindexer_clients(), 4)
+        self.assertEqual(len(rechercher_clients('abena')), 1)
+
+    def test_vue_recherche(self):
+        response = self.client.get(reverse('recherche_clients'), {'q': 'fouda'})
+        self.assertEqual(list(response.context['clients']), [self.paul])
+
+    def test_recherche_admin_classee(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.cm', 'secret')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:banking_client_changelist'), {'q': 'mbarga'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.nadege, self.paul])
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.cm', 'secret')
+        self.client.force_login(admin_user)
+
+    def creer_donnees(self, nombre):
+        """Create ``nombre`` clients, each with one account and one transfer"""
+        precedent = None
+        for i in range(nombre):
+            compte = creer_compte(creer_client(f'{nombre}-{i}'), f'CM76{nombre:04d}{i:020d}', '100')
+            BankTransaction.objects.create(compte_source=compte, compte_destination=precedent, type_transaction='VIREMENT', montant=Decimal('1'))
+            precedent = compte
+
+    def nombre_requetes(self, url):
+        with CaptureQueriesContext(connection) as contexte:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(contexte.captured_queries)
+
+    def test_nombre_de_requetes_constant(self):
+        for nom in ('transaction', 'compte', 'client'):
+            url = reverse(f'admin:banking_{nom}_changelist')
+            BankTransaction.objects.all().delete()
+            Compte.objects.all().delete()
+            Client.objects.all().delete()
+            self.creer_donnees(3)
+            petit = self.nombre_requetes(url)
+            self.creer_donnees(30)
+            with self.subTest(changelist=nom):
+                self.assertEqual(self.nombre_requetes(url), petit)
+
+    def test_pagination_estimee_sur_table_non_filtree(self):
+        self.creer_donnees(5)
+        BankTransaction.objects.filter(pk=BankTransaction.objects.order_by('pk').first().pk).delete()
+
+        with mock.patch('banking.pagination.SEUIL_COMPTAGE_EXACT', 0):
+            estimee = EstimatedCountPaginator(BankTransaction.objects.all(), 100).count
+            exacte = EstimatedCountPaginator(BankTransaction.objects.filter(type_transaction='VIREMENT'), 100).count
+
+        self.assertEqual(estimee, BankTransaction.objects.order_by('-pk').first().pk)
+        self.assertEqual(exacte, 4)
+
+
+class AutocompletionIbanTests(TestCase):
+    def setUp(self):
+        cache_ibans.clear()
+        self.titulaire = creer_client('1', nom='Mbarga', prenom='Nadège')
+        self.source = creer_compte(self.titulaire, 'CM76AAAA0000000000000000000001', '500')
+        self.destination = creer_compte(creer_client('2'), 'CM76AAAB0000000000000000000002', '0')
+        creer_compte(creer_client('3'), 'CM76AAAA0000000000000000000003', '0', actif=False)
+
+    def test_recherche_par_prefixe(self):
+        resultats = rechercher_ibans('cm76 aaaa')
+        self.assertEqual([r['iban'] for r in resultats], [self.source.iban])
+        self.assertEqual(resultats[0]['titulaire'], 'Mbarga Nadège')
+        self.assertEqual(rechercher_ibans('CM7'), [])
+
+    def test_cache_borne_et_invalide(self):
+        rechercher_ibans('CM76AAA')
+        with self.assertNumQueries(0):
+            rechercher_ibans('CM76AAA')
+
+        creer_compte(creer_client('4'), 'CM76AAAC0000000000000000000004', '0')
+        self.assertEqual(len(rechercher_ibans('CM76AAA')), 3)
+
+    def test_cache_garde_aux_mouvements_vide_au_renommage(self):
+        rechercher_ibans('CM76AAAA')
+        self.source.solde = Decimal('400')
+        self.source.save(update_fields=['solde', 'derniere_activite'])
+        with self.assertNumQueries(0):
+            rechercher_ibans('CM76AAAA')
+
+        self.titulaire.nom = 'Essomba'
+        self.titulaire.save()
+        self.assertEqual(rechercher_ibans('CM76AAAA')[0]['titulaire'], 'Essomba Nadège')
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('api_recherche_iban'), {'q': 'CM76AAAB'})
+        self.assertEqual(response.json()['resultats'][0]['id'], self.destination.id)
+
+    def test_formulaire_valide_par_cle(self):
+        form = VirementForm(
+            {'compte_source': self.source.iban, 'iban_destination': self.destination.iban.lower(), 'montant': '10'},
+            client=self.titulaire
+        )
+        with self.assertNumQueries(2):
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['compte_source'], self.source)
+
+    def test_formulaire_refuse_compte_inconnu(self):
+        form = VirementForm({'compte_source': self.destination.iban, 'iban_destination': 'CM76ZZZZ', 'montant': '10'}, client=self.titulaire)
+        self.assertFalse(form.is_valid())
+        self.assertIn('compte_source', form.errors)
+        self.assertIn('iban_destination', form.errors)
+
+    def test_page_virement_taille_constante(self):
+        url = reverse('virement', args=[self.source.id])
+        with CaptureQueriesContext(connection) as avant:
+            taille = len(self.client.get(url).content)
+        for i in range(20):
+            creer_compte(self.titulaire, f'CM76BBBB{i:022d}', '0')
+        with CaptureQueriesContext(connection) as apres:
+            response = self.client.get(url)
+        self.assertEqual(len(apres.captured_queries), len(avant.captured_queries))
+        self.assertEqual(len(response.content), taille)
+
+    def test_virement_depuis_la_page(self):
+        url = reverse('virement', args=[self.source.id])
+        response = self.client.post(url, {'iban_destination': self.destination.iban, 'montant': '100'})
+        self.assertRedirects(response, reverse('dashboard', args=[self.source.id]))
+        self.destination.refresh_from_db()
+        self.assertEqual(self.destination.solde, Decimal('100.00'))
+
+
+class ConfigurationBaseDeDonneesTests(TestCase):
+    def test_pragmas_sqlite_appliques(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite uniquement")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_postgresql_persistant_derriere_pgbouncer(self):
+        environnement = {'DB_ENGINE': 'django.db.backends.postgresql', 'DB_POOLER': 'pgbouncer', 'DB_CONN_MAX_AGE': '300'}
+        with mock.patch.dict(os.environ, environnement):
+            config = configuration_base_de_donnees(Path('/tmp'))
+        self.assertEqual(config['CONN_MAX_AGE'], 300)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(config['OPTIONS']['keepalives'], 1)
+
+
+class AnalyseSoldesTests(TestCase):
+    def setUp(self):
+        client = creer_client()
+        self.compte = creer_compte(client, 'CM76000000000000000000000001', '1250.50')
+        self.autre = creer_compte(client, 'CM76000000000000000000000002', '0')
+        # Historique ancien, hors période : ne doit pas être relu
+        creer_transaction(self.compte, 'DEPOT', '999', il_y_a=400)
+        creer_transaction(self.compte, 'DEPOT', '1000', il_y_a=20)
+        creer_transaction(self.compte, 'RETRAIT', '200', il_y_a=10)
+        creer_transaction(self.compte, 'VIREMENT', '100', il_y_a=5, compte_destination=self.autre)
+        creer_transaction(self.autre, 'VIREMENT', '50.50', il_y_a=2, compte_destination=self.compte)
+
+    def test_serie_journaliere(self):
+        serie = serie_soldes(self.compte, jours=30)
+        soldes = (serie['soldes'] / 100).tolist()
+
+        self.assertEqual(len(soldes), 30)
+        self.assertEqual(soldes[-1], 1250.50)
+        self.assertEqual(soldes[0], 500.00)
+        self.assertEqual(soldes[-21], 1500.00)
+        self.assertEqual(soldes[-4], 1200.00)
+
+    def test_indicateurs_sur_fenetre(self):
+        resultat = analyser_compte(self.compte, jours=30, fenetre=30)
+
+        self.assertEqual(resultat['solde_min'], Decimal('500.00'))
+        self.assertEqual(resultat['solde_max'], Decimal('1500.00'))
+        self.assertEqual(resultat['entrees'], Decimal('1050.50'))
+        self.assertEqual(resultat['sorties'], Decimal('300.00'))
+        self.assertEqual(resultat['ratio_entrees_sorties'], 3.5017)
+
+    def test_moyenne_mobile(self):
+        self.assertEqual(moyenne_mobile(np.array([2, 4, 6, 8]), 2).tolist(), [2.0, 3.0, 5.0, 7.0])
+
+    def test_endpoint_json(self):
+        response = self.client.get(reverse('api_statistiques', args=[self.compte.id]), {'jours': 15, 'fenetre': 7})
+        donnees = response.json()
+        self.assertEqual(len(donnees['soldes']), 15)
+        self.assertEqual(donnees['entrees'], '50.50')
+        self.assertEqual(self.client.get(reverse('api_statistiques', args=[self.compte.id]), {'jours': 'x'}).status_code, 400)
+
+    def test_page_statistiques(self):
+        response = self.client.get(reverse('statistiques', args=[self.compte.id]))
+        self.assertEqual(response.context['total_depots'], Decimal('1000.00'))
+        self.assertEqual(response.context['count_virements_envoyes'], 1)
+        self.assertEqual(response.context['total_virements_recus'], Decimal('50.50'))
+
+
+class CourbeSoldeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.compte = creer_compte(creer_client(), 'CM76000000000000000000000001', '300')
+        creer_transaction(self.compte, 'DEPOT', '300', il_y_a=100)
+
+    def test_lttb_garde_extremites_et_pics(self):
+        x = np.arange(1000)
+        y = np.zeros(1000)
+        y[437] = 50.0
+        gardes = lttb(x, y, 20)
+
+        self.assertEqual(len(gardes), 20)
+        self.assertEqual((gardes[0], gardes[-1]), (0, 999))
+        self.assertIn(437, gardes)
+        self.assertTrue(np.all(np.diff(gardes) > 0))
+        self.assertEqual(len(lttb(x[:10], y[:10], 20)), 10)
+
+    def test_endpoint_sous_echantillonne(self):
+        response = self.client.get(reverse('api_courbe_solde', args=[self.compte.id]), {'jours': 365, 'points': 50})
+        courbe = response.json()
+        self.assertEqual(courbe['total'], 365)
+        self.assertEqual(len(courbe['soldes']), 50)
+        self.assertEqual(courbe['soldes'][-1], 300.0)
+        self.assertEqual(self.client.get(reverse('api_courbe_solde', args=[self.compte.id]), {'points': 1}).status_code, 400)
+
+    def test_page_sans_png_inline(self):
+        response = self.client.get(reverse('statistiques', args=[self.compte.id]))
+        self.assertNotContains(response, 'base64')
+        self.assertContains(response, reverse('api_courbe_solde', args=[self.compte.id]))
+        self.assertContains(response, '<title>Statistiques</title>')
+        self.assertContains(response, 'chart.umd.min.js', count=1)
+
+    def test_png_de_secours_mis_en_cache(self):
+        url = reverse('graphique_solde', args=[self.compte.id])
+        premiere = self.client.get(url)
+        self.assertEqual(premiere['Content-Type'], 'image/png')
+
+        with mock.patch('banking.views.plt') as plt:
+            seconde = self.client.get(url)
+        plt.figure.assert_not_called()
+        self.assertEqual(seconde.content, premiere.content)
+
+
+class PortefeuilleTests(TestCase):
+    def setUp(self):
+        self.titulaire = creer_client('1')
+        self.courant = creer_compte(self.titulaire, 'CM76000000000000000000000001', '700')
+        self.epargne = creer_compte(self.titulaire, 'CM76000000000000000000000002', '300', type_compte='EPARGNE')
+        tiers = creer_compte(creer_client('2'), 'CM76000000000000000000000003', '0')
+        creer_transaction(self.courant, 'DEPOT', '1000', il_y_a=3)
+        creer_transaction(self.courant, 'VIREMENT', '300', il_y_a=2, compte_destination=self.epargne)
+        creer_transaction(tiers, 'VIREMENT', '25', il_y_a=1, compte_destination=self.courant)
+        creer_transaction(self.courant, 'RETRAIT', '25', il_y_a=1)
+        creer_transaction(self.epargne, 'DEPOT', '999', il_y_a=60)
+
+    def test_metriques_par_compte(self):
+        synthese = synthese_portefeuille(self.titulaire)
+        courant, epargne = synthese['comptes']
+
+        self.assertEqual(courant['entrees'], Decimal('1025'))
+        self.assertEqual(courant['sorties'], Decimal('325'))
+        self.assertEqual(courant['nb_transactions'], 4)
+        self.assertEqual(epargne['entrees'], Decimal('300'))
+        self.assertEqual(epargne['nb_transactions'], 1)
+        self.assertGreater(courant['derniere_activite'], epargne['derniere_activite'])
+        self.assertEqual(synthese['solde_total'], Decimal('1000'))
+
+    def test_requetes_constantes_quel_que_soit_le_nombre_de_comptes(self):
+        url = reverse('portefeuille_client', args=[self.titulaire.id])
+        with CaptureQueriesContext(connection) as avant:
+            self.client.get(url)
+        for i in range(12):
+            compte = creer_compte(self.titulaire, f'CM76{i:026d}', '10')
+            creer_transaction(compte, 'DEPOT', '10')
+        with CaptureQueriesContext(connection) as apres:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['comptes']), 14)
+        self.assertEqual(len(apres.captured_queries), len(avant.captured_queries))
+
+    def test_api(self):
+        donnees = self.client.get(reverse('api_portefeuille', args=[self.titulaire.id])).json()
+        self.assertEqual([c['iban'] for c in donnees['comptes']], [self.courant.iban, self.epargne.iban])
+        self.assertEqual(donnees['comptes'][0]['flux_net'], '700.00')
+
+
+class VirementsPermanentsTests(TestCase):
+    def setUp(self):
+        self.loyer = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100')
+        self.bailleur = creer_compte(creer_client('2'), 'CM76000000000000000000000002', '0')
+        self.tontine = creer_compte(creer_client('3'), 'CM76000000000000000000000003', '0')
+        self.jour = date(2024, 1, 31)
+
+    def creer_ordre(self, source, destination, montant, **kwargs):
+        kwargs.setdefault('date_debut', self.jour)
+        kwargs.setdefault('prochaine_execution', kwargs['date_debut'])
+        return VirementPermanent.objects.create(
+            compte_source=source, compte_destination=destination, montant=Decimal(montant), **kwargs
+        )
+
+    def test_prochaine_echeance_mensuelle_garde_le_jour(self):
+        debut = date(2024, 1, 31)
+        fevrier = prochaine_echeance('MENSUEL', debut, debut)
+        self.assertEqual(fevrier, date(2024, 2, 29))
+        self.assertEqual(prochaine_echeance('MENSUEL', debut, fevrier), date(2024, 3, 31))
+        self.assertEqual(prochaine_echeance('MENSUEL', debut, date(2024, 12, 31)), date(2025, 1, 31))
+        self.assertEqual(prochaine_echeance('HEBDOMADAIRE', debut, debut), date(2024, 2, 7))
+
+    def test_execution_par_lots_et_resultats(self):
+        premier = self.creer_ordre(self.loyer, self.bailleur, '60')
+        second = self.creer_ordre(self.loyer, self.tontine, '60')
+        futur = self.creer_ordre(self.loyer, self.tontine, '10', date_debut=date(2024, 2, 1))
+
+        # taille_lot=1 : les ordres d'un même compte restent dans le même lot
+        rapport = executer_virements_permanents(self.jour, taille_lot=1)
+
+        self.assertEqual((rapport['executes'], rapport['rejetes'], rapport['lots']), (1, 1, 1))
+        statuts = {r[0]: (r[2], r[3]) for r in rapport['resultats']}
+        self.assertEqual(statuts[premier.id], ('EXECUTE', ''))
+        self.assertEqual(statuts[second.id], ('REJETE', "Solde insuffisant sur le compte source."))
+        self.assertNotIn(futur.id, statuts)
+
+        self.loyer.refresh_from_db()
+        self.bailleur.refresh_from_db()
+        self.assertEqual((self.loyer.solde, self.bailleur.solde), (Decimal('40'), Decimal('60')))
+        execution = ExecutionVirementPermanent.objects.get(ordre=premier)
+        self.assertEqual(execution.transaction.compte_destination, self.bailleur)
+        self.assertEqual(BankTransaction.objects.filter(type_transaction='VIREMENT').count(), 1)
+
+        premier.refresh_from_db()
+        self.assertEqual(premier.prochaine_execution, date(2024, 2, 29))
+
+    def test_une_seule_execution_par_echeance(self):
+        self.creer_ordre(self.loyer, self.bailleur, '10')
+        executer_virements_permanents(self.jour)
+        rapport = executer_virements_permanents(self.jour)
+
+        self.assertEqual(rapport['executes'] + rapport['rejetes'], 0)
+        self.loyer.refresh_from_db()
+        self.assertEqual(self.loyer.solde, Decimal('90'))
+
+    def test_ordre_termine_et_compte_inactif(self):
+        ordre = self.creer_ordre(self.loyer, self.bailleur, '10', frequence='QUOTIDIEN', date_fin=self.jour)
+        Compte.objects.filter(pk=self.bailleur.pk).update(actif=False)
+
+        rapport = executer_virements_permanents(self.jour)
+
+        self.assertEqual(rapport['resultats'][0][2:4], ('REJETE', "Compte inactif"))
+        ordre.refresh_from_db()
+        self.assertFalse(ordre.actif)
+
+    def test_commande_rapport_csv(self):
+        self.creer_ordre(self.loyer, self.bailleur, '10')
+        chemin = Path(settings.BASE_DIR) / 'test_rapport_virements.csv'
+        self.addCleanup(lambda: chemin.unlink(missing_ok=True))
+        sortie = io.StringIO()
+
+        call_command('executer_virements_permanents', '--date', '2024-01-31', '--rapport', str(chemin), stdout=sortie)
+
+        self.assertIn('1 virement(s) exécuté(s)', sortie.getvalue())
+        lignes = chemin.read_text(encoding='utf-8').splitlines()
+        self.assertEqual(len(lignes), 2)
+        self.assertTrue(lignes[1].endswith(',EXECUTE,,' + str(BankTransaction.objects.get().id)))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100')
+        self.autre = creer_compte(creer_client('2'), 'CM76000000000000000000000002', '0')
+
+    def test_evenement_ecrit_avec_l_operation(self):
+        self.client.post(reverse('api_virement', args=[self.compte.id]),
+                         {'iban_destination': self.autre.iban, 'montant': '30'}, content_type='application/json')
+        self.client.post(reverse('api_retrait', args=[self.compte.id]),
+                         {'montant': '1000'}, content_type='application/json')
+
+        evenement = EvenementOutbox.objects.get()
+        self.assertEqual(evenement.type_evenement, 'transaction.virement')
+        self.assertEqual(evenement.transaction_id, BankTransaction.objects.get().id)
+        self.assertEqual(evenement.donnees['solde'], '70.00')
+        self.assertEqual(evenement.donnees['solde_destination'], '30.00')
+
+    def test_flux_par_curseur_et_acquittement(self):
+        for montant in ('1', '2', '3'):
+            self.client.post(reverse('api_depot', args=[self.compte.id]), {'montant': montant}, content_type='application/json')
+        url = reverse('api_evenements')
+
+        page = self.client.get(url, {'consommateur': 'sms', 'limite': 2}).json()
+        self.assertEqual([e['donnees']['montant'] for e in page['evenements']], ['1', '2'])
+        self.assertTrue(page['encore'])
+
+        self.client.post(reverse('api_acquitter_evenements'), {'consommateur': 'sms', 'curseur': page['curseur']},
+                         content_type='application/json')
+        suite = self.client.get(url, {'consommateur': 'sms', 'limite': 2}).json()
+        self.assertEqual([e['donnees']['montant'] for e in suite['evenements']], ['3'])
+        self.assertFalse(suite['encore'])
+
+        # Le curseur ne recule jamais
+        reponse = self.client.post(reverse('api_acquitter_evenements'), {'consommateur': 'sms', 'curseur': 0},
+                                   content_type='application/json')
+        self.assertEqual(reponse.json()['curseur'], page['curseur'])
+
+    def test_commande_consommateur_fichier(self):
+        chemin = Path(settings.BASE_DIR) / 'test_evenements.jsonl'
+        self.addCleanup(lambda: chemin.unlink(missing_ok=True))
+        self.client.post(reverse('api_depot', args=[self.compte.id]), {'montant': '5'}, content_type='application/json')
+        VirementPermanent.objects.create(
+            compte_source=self.compte, compte_destination=self.autre, montant=Decimal('10'),
+            date_debut=date(2024, 1, 1), prochaine_execution=date(2024, 1, 1)
+        )
+        executer_virements_permanents(date(2024, 1, 1))
+
+        call_command('consommer_evenements', 'compta', str(chemin), '--lot', '1', stdout=io.StringIO())
+        call_command('consommer_evenements', 'compta', str(chemin), stdout=io.StringIO())
+
+        lignes = [json.loads(l) for l in chemin.read_text(encoding='utf-8').splitlines()]
+        self.assertEqual([l['type'] for l in lignes], ['transaction.depot', 'transaction.virement'])
+        self.assertEqual(lignes[1]['donnees']['solde'], '95.00')
+        self.assertEqual(CurseurConsommateur.objects.get(nom='compta').dernier_id, lignes[-1]['position'])
+
+
+class OutboxConcurrenceTests(TransactionTestCase):
+    def test_evenement_valide_tardivement_apres_le_curseur(self):
+        EvenementOutbox.objects.create(id=10, type_evenement='transaction.depot')
+        lus = lire_flux([0])
+        self.assertEqual([e.id for _, e in lus], [10])
+        acquitter_flux('compta', avancer([0], lus))
+
+        # Un id inférieur, inséré avant le dernier lu mais validé après lui (verrou, lot, commit lent)
+        insere, valider = threading.Event(), threading.Event()
+
+        def ecrire_lentement():
+            try:
+                with transaction.atomic():
+                    EvenementOutbox.objects.create(id=5, type_evenement='transaction.retrait')
+                    insere.set()
+                    valider.wait(5)
+            finally:
+                connection.close()
+
+        resultats = []
+
+        def lire():
+            try:
+                resultats.extend(lire_flux(curseurs('compta')))
+            finally:
+                connection.close()
+
+        ecrivain = threading.Thread(target=ecrire_lentement)
+        ecrivain.start()
+        insere.wait(5)
+        lecteur = threading.Thread(target=lire)
+        lecteur.start()
+        time.sleep(0.2)
+        valider.set()
+        ecrivain.join()
+        lecteur.join()
+
+        # Masqué tant qu'il n'est pas validé, puis livré après le curseur déjà acquitté
+        resultats += lire_flux(avancer(curseurs('compta'), resultats))
+        self.assertEqual([e.id for _, e in resultats], [5])
+        self.assertGreater(resultats[0][1].position, curseurs('compta')[0])
+
+
+class StatistiquesAgregeesTests(TestCase):
+    def setUp(self):
+        titulaire = creer_client('1')
+        self.courant = creer_compte(titulaire, 'CM76000000000000000000000001', '100')
+        self.epargne = creer_compte(titulaire, 'CM76000000000000000000000002', '50', type_compte='EPARGNE')
+        self.ferme = creer_compte(creer_client('2'), 'CM76000000000000000000000003', '0')
+
+    def operations(self):
+        effectuer_depot(self.courant.id, Decimal('40'))
+        effectuer_retrait(self.courant.id, Decimal('15'))
+        effectuer_virement(self.courant.id, self.epargne.iban, Decimal('25'))
+        VirementPermanent.objects.create(
+            compte_source=self.epargne, compte_destination=self.courant, montant=Decimal('5'),
+            date_debut=timezone.localdate(), prochaine_execution=timezone.localdate()
+        )
+        executer_virements_permanents()
+        self.ferme.actif = False
+        self.ferme.save()
+
+    def test_mise_a_jour_incrementale_egale_reconstruction(self):
+        self.operations()
+        incremental = (statistiques_par_type(), statistiques_journalieres())
+        reconstruire()
+        self.assertEqual((statistiques_par_type(), statistiques_journalieres()), incremental)
+
+        courant, epargne = incremental[0]
+        self.assertEqual((courant['comptes'], courant['comptes_actifs']), (2, 1))
+        self.assertEqual(courant['encours_total'], Decimal('105'))
+        self.assertEqual(epargne['encours_total'], Decimal('70'))
+        jour = incremental[1][0]
+        self.assertEqual((jour['depots'], jour['retraits'], jour['virements']), (Decimal('40'), Decimal('15'), Decimal('30')))
+        self.assertEqual(jour['nombre_virements'], 2)
+
+    def test_suppression_de_compte(self):
+        self.ferme.delete()
+        self.assertEqual([l['comptes'] for l in statistiques_par_type()], [1, 1])
+
+    def test_page_lit_uniquement_les_agregats(self):
+        self.operations()
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('statistiques_banque'))
+        self.assertEqual(response.context['encours_total'], Decimal('175'))
+        self.assertEqual(response.context['comptes_actifs'], 2)
+        for requete in requetes.captured_queries:
+            self.assertIn('banking_statistique', requete['sql'])
+
+
+class RemplissageStatistiquesTests(TransactionTestCase):
+    AVANT = [('banking', '0006_outbox')]
+    APRES = [('banking', '0007_statistiques_agregees')]
+
+    def tearDown(self):
+        executeur = MigrationExecutor(connection)
+        executeur.migrate(executeur.loader.graph.leaf_nodes())
+
+    def test_migration_remplit_les_agregats(self):
+        executeur = MigrationExecutor(connection)
+        executeur.migrate(self.AVANT)
+        apps = executeur.loader.project_state(self.AVANT).apps
+        Client_, Compte_ = apps.get_model('banking', 'Client'), apps.get_model('banking', 'Compte')
+        Transaction_ = apps.get_model('banking', 'Transaction')
+        titulaire = Client_.objects.create(nom='N', prenom='P', cni='CM-1', email='c1@example.cm', telephone='0', adresse='Douala')
+        courant = Compte_.objects.create(client=titulaire, iban='CM76000000000000000000000001', solde=Decimal('60'))
+        Compte_.objects.create(client=titulaire, iban='CM76000000000000000000000002', solde=Decimal('40'), type_compte='EPARGNE', actif=False)
+        Transaction_.objects.create(compte_source=courant, type_transaction='DEPOT', montant=Decimal('60'))
+
+        executeur = MigrationExecutor(connection)
+        executeur.migrate(self.APRES)
+        apps = executeur.loader.project_state(self.APRES).apps
+        jour = apps.get_model('banking', 'StatistiqueJournaliere').objects.get()
+        self.assertEqual((jour.total_depots, jour.nb_depots), (Decimal('60'), 1))
+        types = apps.get_model('banking', 'StatistiqueTypeCompte').objects.order_by('type_compte')
+        self.assertEqual(
+            [(t.type_compte, t.nb_comptes, t.nb_comptes_actifs, t.encours) for t in types],
+            [('COURANT', 1, 1, Decimal('60')), ('EPARGNE', 1, 0, Decimal('40'))],
+        )
+
+
+class ControleAdmissionTests(TestCase):
+    def verifier_limiteur(self, limiteur):
+        premier = limiteur.acquerir(7)
+        admis = threading.Event()
+
+        def attendre():
+            jeton = limiteur.acquerir(7)
+            admis.set()
+            limiteur.liberer(jeton)
+
+        attente = threading.Thread(target=attendre)
+        attente.start()
+        for _ in range(200):
+            if limiteur.metriques()['profondeur_file']:
+                break
+            threading.Event().wait(0.005)
+        self.assertEqual(limiteur.metriques()['comptes'][7], {'en_cours': 1, 'en_attente': 1})
+
+        # File pleine : rejet immédiat
+        with self.assertRaises(CompteSature) as rejet:
+            limiteur.acquerir(7)
+        self.assertEqual(rejet.exception.motif, 'file_pleine')
+        # Les autres comptes ne sont pas concernés
+        limiteur.liberer(limiteur.acquerir(8))
+
+        limiteur.liberer(premier)
+        attente.join()
+        self.assertTrue(admis.is_set())
+        metriques = limiteur.metriques()
+        self.assertEqual((metriques['admis'], metriques['rejets_file_pleine'], metriques['comptes']), (3, 1, {}))
+
+    def test_limiteur_local(self):
+        self.verifier_limiteur(LimiteurLocal(1, 1, 5))
+
+    def test_limiteur_fichier(self):
+        with tempfile.TemporaryDirectory() as repertoire:
+            self.verifier_limiteur(LimiteurFichier(repertoire, 1, 1, 5))
+
+    def test_limiteur_fichier_nombre_de_fichiers_borne(self):
+        with tempfile.TemporaryDirectory() as repertoire:
+            limiteur = LimiteurFichier(repertoire, 2, 1, 0.01, bandes=4)
+            for compte_id in range(100):
+                limiteur.liberer(limiteur.acquerir(compte_id))
+            self.assertEqual(len(os.listdir(repertoire)), 4)
+            # 3 et 7 partagent une bande, donc ses créneaux
+            jetons = [limiteur.acquerir(3), limiteur.acquerir(7)]
+            with self.assertRaises(CompteSature):
+                limiteur.acquerir(11)
+            for jeton in jetons:
+                limiteur.liberer(jeton)
+
+    def test_delai_d_attente(self):
+        limiteur = LimiteurLocal(1, 4, 0.05)
+        jeton = limiteur.acquerir(1)
+        with self.assertRaises(CompteSature) as rejet:
+            limiteur.acquerir(1)
+        self.assertEqual(rejet.exception.motif, 'delai')
+        limiteur.liberer(jeton)
+
+    @override_settings(ADMISSION={'MODE': 'local', 'CONCURRENCE_MAX': 1, 'FILE_MAX': 0, 'ATTENTE_MAX': 0.1})
+    def test_reponse_429(self):
+        compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '0')
+        url = reverse('api_depot', args=[compte.id])
+        limiteur = limiteur_courant()
+
+        jeton = limiteur.acquerir(compte.id)
+        response = self.client.post(url, {'montant': '10'}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.client.post(reverse('depot', args=[compte.id]), {'montant': '10'}).status_code, 429)
+        limiteur.liberer(jeton)
+
+        self.assertEqual(self.client.post(url, {'montant': '10'}, content_type='application/json').status_code, 201)
+        metriques = self.client.get(reverse('api_admission_metriques')).json()
+        self.assertEqual((metriques['admis'], metriques['rejets_file_pleine']), (2, 2))
+
+    @override_settings(ADMISSION={'MODE': 'local', 'CONCURRENCE_MAX': 1, 'FILE_MAX': 0, 'ATTENTE_MAX': 0.1})
+    def test_virements_vers_un_compte_sature(self):
+        payeur = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100')
+        marchand = creer_compte(creer_client('2'), 'CM76000000000000000000000002', '0')
+        limiteur = limiteur_courant()
+
+        jeton = limiteur.acquerir(marchand.id)
+        response = self.client.post(reverse('api_virement', args=[payeur.id]),
+                                    {'iban_destination': marchand.iban, 'montant': '10'}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        response = self.client.post(reverse('virement', args=[payeur.id]),
+                                    {'iban_destination': marchand.iban.lower(), 'montant': '10'})
+        self.assertEqual(response.status_code, 429)
+        # Le créneau du payeur, pris avant celui du marchand (ordre des ids), est rendu
+        self.assertEqual(limiteur.metriques()['comptes'], {marchand.id: {'en_cours': 1, 'en_attente': 0}})
+        limiteur.liberer(jeton)
+
+        response = self.client.post(reverse('api_virement', args=[payeur.id]),
+                                    {'iban_destination': marchand.iban, 'montant': '10'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(limiteur.metriques()['comptes'], {})
+
+
+class InteretsTests(TestCase):
+    def test_interets_courus_vectorises(self):
+        # 1 000,00 constants pendant 30 jours à 3,65 % : 3,00 ; l'ouverture au jour 15 divise par deux
+        soldes = np.array([100000, 100000])
+        vide = np.array([], dtype=np.int64)
+        interets = interets_courus(soldes, np.array([0, 15]), vide, vide, vide, 30, Decimal('0.0365'))
+        self.assertEqual(interets.tolist(), [300, 150])
+
+    def test_versement_idempotent_par_periode(self):
+        epargne = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '1365', type_compte='EPARGNE')
+        courant = creer_compte(creer_client('2'), 'CM76000000000000000000000002', '1000')
+        Compte.objects.filter(pk__in=[epargne.pk, courant.pk]).update(
+            date_ouverture=timezone.make_aware(timezone.datetime(2023, 12, 1))
+        )
+        # Dépôt de 365 le 11 janvier, retrait de 100 en février (après la période)
+        depot = creer_transaction(epargne, 'DEPOT', '365')
+        retrait = creer_transaction(epargne, 'RETRAIT', '100')
+        BankTransaction.objects.filter(pk=depot.pk).update(date_transaction=timezone.make_aware(timezone.datetime(2024, 1, 11, 10)))
+        BankTransaction.objects.filter(pk=retrait.pk).update(date_transaction=timezone.make_aware(timezone.datetime(2024, 2, 3, 10)))
+        Compte.objects.filter(pk=epargne.pk).update(solde=Decimal('1365') - Decimal('100'))
+
+        rapport = calculer_interets('2024-01', taux='0.0365', taille_lot=1)
+
+        # 10 jours à 1 000 + 21 jours à 1 365, au taux journalier de 0,01 %
+        attendu = Decimal('3.86')
+        self.assertEqual((rapport['comptes'], rapport['total']), (1, attendu))
+        epargne.refresh_from_db()
+        self.assertEqual(epargne.solde, Decimal('1265') + attendu)
+        interet = InteretCompte.objects.get(compte=epargne, periode='2024-01')
+        self.assertEqual((interet.transaction.type_transaction, interet.transaction.montant), ('DEPOT', attendu))
+
+        self.assertEqual(calculer_interets('2024-01', taux='0.0365')['comptes'], 0)
+        epargne.refresh_from_db()
+        self.assertEqual(epargne.solde, Decimal('1265') + attendu)
+
+    def test_periode_en_cours_refusee(self):
+        with self.assertRaises(ValueError):
+            calculer_interets(timezone.localdate().strftime('%Y-%m'))
+
+
+class FragmentsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.titulaire = creer_client('1')
+        self.compte = creer_compte(self.titulaire, 'CM76000000000000000000000001', '100')
+
+    def requetes_transactions(self, url):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(url)
+        return response, [r['sql'] for r in requetes.captured_queries if 'FROM "banking_transaction"' in r['sql']]
+
+    def test_table_historique_servie_depuis_le_cache(self):
+        effectuer_depot(self.compte.id, Decimal('10'))
+        url = reverse('historique_transactions')
+        self.requetes_transactions(url)
+
+        response, requetes = self.requetes_transactions(url)
+        self.assertContains(response, self.compte.iban)
+        # Seul le MAX(id) de la clé est exécuté, pas la liste
+        self.assertEqual(len(requetes), 1)
+        self.assertIn('MAX', requetes[0])
+
+        effectuer_depot(self.compte.id, Decimal('12345.67'))
+        self.assertContains(self.client.get(url), '12345,67')
+
+    def test_renommage_client_invalide_les_fragments(self):
+        self.client.get(reverse('liste_comptes'))
+        self.titulaire.nom = 'Renomme'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.titulaire.save()
+        self.assertContains(self.client.get(reverse('liste_comptes')), 'Renomme')
+
+    def test_version_partagee_et_jamais_evincee(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.titulaire.save()
+        avant = version_fragments('clients')
+        # Cache vidé (éviction LRU, autre worker) : la version ne repart pas en arrière
+        cache.clear()
+        self.assertEqual(version_fragments('clients'), avant)
+        with self.captureOnCommitCallbacks() as rappels:
+            self.titulaire.save()
+        # Pas avant la validation : un rendu concurrent lirait encore l'ancien nom
+        self.assertEqual(version_fragments('clients'), avant)
+        rappels[0]()
+        self.assertEqual(version_fragments('clients'), avant + 1)
+
+    def test_ligne_compte_suit_le_solde(self):
+        self.client.get(reverse('liste_comptes'))
+        effectuer_depot(self.compte.id, Decimal('0.50'))
+        self.assertContains(self.client.get(reverse('liste_comptes')), '100,50 F CFA')
+
+    def test_ligne_compte_suit_le_type_et_l_iban(self):
+        self.client.get(reverse('liste_comptes'))
+        self.compte.type_compte = 'EPARGNE'
+        self.compte.iban = 'CM76000000000000000000000099'
+        self.compte.save()
+        response = self.client.get(reverse('liste_comptes'))
+        self.assertContains(response, 'EPARGNE')
+        self.assertContains(response, 'CM76000000000000000000000099')
+
+    def test_tableau_dashboard(self):
+        url = reverse('dashboard', args=[self.compte.id])
+        self.assertContains(self.client.get(url), 'Aucune transaction')
+        effectuer_retrait(self.compte.id, Decimal('7.25'))
+        self.assertContains(self.client.get(url), '7,25')
+
+
+class ProfilageTests(TestCase):
+    def setUp(self):
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+        self.repertoire = repertoire.name
+        self.compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100')
+        self.url = reverse('statistiques', args=[self.compte.id])
+
+    def configuration(self, **valeurs):
+        return override_settings(PROFILAGE={
+            'ACTIF': True, 'TAUX': 0, 'JETON': 'secret', 'REPERTOIRE': self.repertoire, 'MAX_FICHIERS': 2, **valeurs,
+        })
+
+    def test_inactif_par_defaut(self):
+        with override_settings(PROFILAGE={'REPERTOIRE': self.repertoire}):
+            self.client.get(self.url, HTTP_X_PROFILAGE='secret')
+        self.assertEqual(liste_profils(self.repertoire), [])
+
+    def test_en_tete_autorise_seulement(self):
+        with self.configuration():
+            self.client.get(self.url, HTTP_X_PROFILAGE='faux')
+            self.assertEqual(liste_profils(self.repertoire), [])
+            self.client.get(self.url, HTTP_X_PROFILAGE='secret')
+
+        [profil] = liste_profils(self.repertoire)
+        with open(profil[:-len('.prof')] + '.json', encoding='utf-8') as fichier:
+            meta = json.load(fichier)
+        self.assertEqual((meta['vue'], meta['statut']), ('statistiques', 200))
+        self.assertTrue(any('banking_compte' in requete['sql'] for requete in meta['requetes']))
+
+    def test_echantillonnage_rotation_et_agregation(self):
+        with self.configuration(TAUX=1.0):
+            for _ in range(3):
+                self.client.get(self.url)
+        self.assertEqual(len(liste_profils(self.repertoire)), 2)
+        self.assertEqual(len(os.listdir(self.repertoire)), 4)
+
+        rapport = agreger_profils(self.repertoire, top=5)['statistiques']
+        self.assertEqual((rapport['profils'], len(rapport['fonctions'])), (2, 5))
+
+        sortie = io.StringIO()
+        call_command('analyser_profils', repertoire=self.repertoire, vue='statistiques', stdout=sortie)
+        self.assertIn('statistiques : 2 profil(s)', sortie.getvalue())
+
+
+class StressOperationsTests(TransactionTestCase):
+    def test_invariants_sous_charge(self):
+        comptes = [
+            creer_compte(creer_client(str(i)), f'CM760000000000000000000000{i:02d}', '300000') for i in range(4)
+        ]
+        soldes_initiaux = {c.id: c.solde for c in comptes}
+
+        rapport = executer_stress(comptes, nb_threads=4, operations_par_thread=15, graine=7)
+
+        self.assertEqual(verifier_invariants(soldes_initiaux, rapport['depart_id']), [])
+        operations = rapport['operations'].values()
+        self.assertEqual(sum(o['reussies'] + o['refusees'] + o['echecs'] for o in operations), 60)
+        self.assertGreater(sum(o['reussies'] for o in operations), 0)
+
+    def test_violation_detectee(self):
+        compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100')
+        effectuer_depot(compte.id, Decimal('50'))
+        # Écriture hors du chemin des opérations : ni transaction ni statistiques
+        Compte.objects.filter(pk=compte.pk).update(solde=Decimal('-10'))
+
+        violations = verifier_invariants({compte.id: Decimal('100')}, 0)
+        self.assertEqual(len(violations), 4)
+        self.assertIn('négatif', violations[2])
+
+    def test_refuse_sans_base_jetable(self):
+        with self.assertRaisesMessage(CommandError, '--base-jetable'):
+            call_command('stress_operations', '--comptes', '2', stdout=io.StringIO())
+        self.assertFalse(Client.objects.filter(nom__startswith='Stress').exists())
+
+
+class ImportClientsTests(TestCase):
+    CSV = (
+        "nom,prenom,cni,email,telephone,adresse,type_compte,solde,iban\n"
+        "Mbarga,Alice,CNI-1,alice@example.cm,+237600000001,Yaounde,,1000,\n"
+        "Mbarga,Alice,CNI-1,alice@example.cm,+237600000001,Yaounde,epargne,250.50,cm76 0000 0000 0000 0000 0000 0042\n"
+        "Existant,Bob,CM-1,bob@example.cm,+237600000002,Douala,,0,\n"
+        "Nouveau,Carl,CNI-3,client1@example.cm,+237600000003,Douala,,0,\n"
+        "Nouveau,Dan,CNI-4,dan@example.cm,+237600000004,Douala,CHEQUE,0,\n"
+        "Nouveau,Eve,CNI-5,pas-un-email,+237600000005,Douala,,0,\n"
+        "Nouveau,Fay,CNI-6,fay@example.cm,+237600000006,Douala,,-5,\n"
+        "Autre,Alice,CNI-1,autre@example.cm,+237600000007,Douala,,0,\n"
+    )
+
+    def test_import_par_lots_avec_rejets(self):
+        creer_client('1')
+        with CaptureQueriesContext(connection) as requetes:
+            rapport = importer_csv(io.StringIO(self.CSV), taille_lot=3)
+
+        self.assertEqual((rapport['lignes'], rapport['clients'], rapport['comptes']), (8, 1, 2))
+        self.assertEqual([(r['ligne'], r['motif']) for r in rapport['rejets']], [
+            (4, 'CNI déjà enregistrée'),
+            (5, 'E-mail déjà utilisé'),
+            (6, 'Type de compte inconnu : CHEQUE'),
+            (7, 'E-mail invalide'),
+            (8, 'Solde invalide'),
+            (9, 'CNI déjà utilisée avec un autre e-mail dans le fichier'),
+        ])
+        # Pas de requête par ligne : aucune insertion unitaire de Client ou de Compte
+        self.assertFalse([r for r in requetes.captured_queries if r['sql'].startswith('SELECT "banking_client"."id"')])
+
+        alice = Client.objects.get(cni='CNI-1')
+        comptes = list(alice.comptes.order_by('type_compte').values_list('type_compte', 'solde', 'iban'))
+        self.assertEqual(comptes[1], ('EPARGNE', Decimal('250.50'), 'CM76000000000000000000000042'))
+        self.assertEqual((comptes[0][0], comptes[0][1], len(comptes[0][2])), ('COURANT', Decimal('1000'), 32))
+        # Index de recherche et statistiques tenus à jour malgré bulk_create
+        self.assertEqual(rechercher_clients('Mbarga'), [alice])
+        self.assertEqual({l['type_compte']: l['encours_total'] for l in statistiques_par_type()},
+                         {'COURANT': Decimal('1000'), 'EPARGNE': Decimal('250.50')})
+
+    def test_colonnes_manquantes(self):
+        with self.assertRaises(ValueError):
+            importer_csv(io.StringIO("nom,prenom\nA,B\n"))
+
+    def test_vue_et_commande(self):
+        fichier = io.BytesIO(self.CSV.encode('utf-8'))
+        fichier.name = 'clients.csv'
+        response = self.client.post(reverse('import_clients'), {'fichier': fichier})
+        self.assertContains(response, 'Solde invalide')
+        self.assertEqual(Compte.objects.count(), 4)
+
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'clients.csv')
+            rejets = os.path.join(dossier, 'rejets.csv')
+            with open(chemin, 'w', encoding='utf-8') as f:
+                f.write(self.CSV)
+            sortie = io.StringIO()
+            call_command('importer_clients', chemin, rejets=rejets, stdout=sortie)
+            self.assertIn('0 client(s) et 0 compte(s) importés', sortie.getvalue())
+            with open(rejets, encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 9)
+
+
+class MontantsCentimesTests(TestCase):
+    def test_stockage_en_centimes(self):
+        compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '1234.50')
+        effectuer_depot(compte.id, Decimal('0.05'))
+        with connection.cursor() as c:
+            c.execute("SELECT solde FROM banking_compte WHERE id = %s", [compte.id])
+            self.assertEqual(c.fetchone()[0], 123455)
+        compte.refresh_from_db()
+        self.assertEqual(str(compte.solde), '1234.55')
+
+    def test_sommes_exactes(self):
+        compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '0')
+        for _ in range(10):
+            creer_transaction(compte, 'DEPOT', '0.10')
+        total = BankTransaction.objects.aggregate(total=Sum('montant'))['total']
+        self.assertEqual(str(total), '1.00')
+        self.assertEqual(BankTransaction.objects.filter(montant__gte=Decimal('0.1')).count(), 10)
+
+    def test_sous_centime_refuse(self):
+        self.assertEqual(vers_centimes(Decimal('-12.3')), -1230)
+        with self.assertRaises(ValueError):
+            vers_centimes(Decimal('0.001'))
+        compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '0')
+        with self.assertRaises(ValueError):
+            effectuer_depot(compte.id, Decimal('10.005'))
+        compte.refresh_from_db()
+        self.assertEqual(compte.solde, Decimal('0'))
+
+
+class RelevesArchiveTests(TestCase):
+    def setUp(self):
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+        self.racine = repertoire.name
+        self.compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100')
+        self.url = reverse('telecharger_releve', args=[self.compte.id])
+        self.periode = periodes_precedentes(1)[0]
+
+    def configuration(self, **valeurs):
+        return override_settings(RELEVES_ARCHIVE={'RACINE': self.racine, **valeurs})
+
+    def test_mois_cloture_archive_une_fois(self):
+        with self.configuration():
+            premiere = self.client.get(self.url, {'periode': self.periode})
+            self.assertTrue(premiere.streaming)
+            contenu = b''.join(premiere.streaming_content)
+            with mock.patch('banking.releves.generer_pdf') as generer:
+                seconde = self.client.get(self.url, {'periode': self.periode})
+                generer.assert_not_called()
+            self.assertEqual(b''.join(seconde.streaming_content), contenu)
+            self.assertEqual(self.client.get(
+                self.url, {'periode': self.periode}, HTTP_IF_NONE_MATCH=seconde['ETag']
+            ).status_code, 304)
+
+        archive = ReleveArchive.objects.get(compte=self.compte, periode=self.periode)
+        self.assertTrue(contenu.startswith(b'%PDF'))
+        self.assertEqual((archive.taille, seconde['ETag']), (len(contenu), f'"{archive.empreinte}"'))
+        self.assertTrue(os.path.exists(os.path.join(self.racine, archive.empreinte[:2], f'{archive.empreinte}.pdf')))
+
+    def test_mois_cloture_reproductible(self):
+        premier = generer_pdf(self.compte, self.periode)
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(minutes=5)):
+            self.assertEqual(generer_pdf(self.compte, self.periode), premier)
+
+    def test_mois_en_cours_genere_a_la_demande(self):
+        with self.configuration():
+            reponse = self.client.get(self.url)
+            self.assertEqual(self.client.get(self.url, {'periode': '2024-13'}).status_code, 400)
+        self.assertEqual(reponse['Content-Type'], 'application/pdf')
+        self.assertIn(periode_courante()[:4], reponse['Content-Disposition'])
+        self.assertTrue(reponse.content.startswith(b'%PDF'))
+        self.assertFalse(ReleveArchive.objects.exists())
+
+    def test_x_accel_redirect_et_commande(self):
+        Compte.objects.filter(pk=self.compte.pk).update(date_ouverture=timezone.now() - timedelta(days=400))
+        sortie = io.StringIO()
+        with self.configuration():
+            call_command('archiver_releves', periode=self.periode, stdout=sortie)
+            call_command('archiver_releves', periode=self.periode, stdout=sortie)
+        self.assertIn('1 relevé(s) archivé(s)', sortie.getvalue())
+        self.assertIn('0 relevé(s) archivé(s), 1 déjà présent(s)', sortie.getvalue())
+
+        archive = ReleveArchive.objects.get()
+        with self.configuration(SENDFILE='x-accel-redirect', URL_INTERNE='/interne/'):
+            reponse = self.client.get(self.url, {'periode': self.periode})
+        self.assertEqual(reponse['X-Accel-Redirect'], f'/interne/{archive.empreinte[:2]}/{archive.empreinte}.pdf')
+        self.assertEqual(reponse.content, b'')
+
+
+@override_settings(ADMISSION={'MODE': 'aucun'})
+class RepliqueLectureTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+        self.chemin = os.path.join(repertoire.name, 'replica.sqlite3')
+        # Seconde base SQLite déclarée à la volée sous un alias propre au test
+        self.alias = f'replique_{self._testMethodName}'
+        connections.settings[self.alias] = {**connections.settings['default'], 'NAME': self.chemin}
+        self.addCleanup(self.retirer_alias)
+        self.compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100')
+        self.url = reverse('liste_clients')
+
+    def retirer_alias(self):
+        connections[self.alias].close()
+        del connections[self.alias]
+        del connections.settings[self.alias]
+
+    def configuration(self, **valeurs):
+        return override_settings(REPLIQUE_LECTURE={'ALIAS': self.alias, 'FENETRE_ECRITURE': 5, 'REESSAI': 30, **valeurs})
+
+    def test_lectures_sur_replique_sauf_apres_ecriture(self):
+        synchroniser_sqlite(self.alias)
+        creer_client('2')
+        with self.configuration():
+            contenu = self.client.get(self.url).content.decode()
+            self.assertIn('Nom1', contenu)
+            self.assertNotIn('Nom2', contenu)
+            self.assertEqual(Client.objects.count(), 2)
+
+            reponse = self.client.post(reverse('depot', args=[self.compte.id]), {'montant': '10'})
+            self.assertIn(COOKIE, reponse.cookies)
+            self.assertIn('Nom2', self.client.get(self.url).content.decode())
+
+            self.client.cookies[COOKIE] = str(time.time() - 10)
+            self.assertNotIn('Nom2', self.client.get(self.url).content.decode())
+
+    def test_releve_archive_construit_sur_le_primaire(self):
+        synchroniser_sqlite(self.alias)
+        # Dernier mouvement du mois clôturé, pas encore répliqué
+        creer_transaction(self.compte, 'DEPOT', '40', il_y_a=timezone.localdate().day)
+        Compte.objects.filter(pk=self.compte.pk).update(solde=Decimal('140'))
+        periode = periodes_precedentes(1)[0]
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+
+        with self.configuration(), override_settings(RELEVES_ARCHIVE={'RACINE': repertoire.name}):
+            reponse = self.client.get(reverse('telecharger_releve', args=[self.compte.id]), {'periode': periode})
+            contenu = b''.join(reponse.streaming_content)
+        self.assertEqual(contenu, generer_pdf(Compte.objects.get(pk=self.compte.pk), periode))
+        self.assertNotEqual(contenu, generer_pdf(Compte.objects.using(self.alias).get(pk=self.compte.pk), periode))
+
+    def test_repli_sur_le_primaire(self):
+        with self.configuration(REESSAI=0):
+            # Réplique absente : aucun fichier créé
+            self.assertIn('Nom1', self.client.get(self.url).content.decode())
+            self.assertFalse(os.path.exists(self.chemin))
+
+            # Réplique joignable mais sans schéma : la vue est rejouée sur le primaire
+            sqlite3.connect(self.chemin).close()
+            with self.assertLogs('banking.routage', 'WARNING'):
+                reponse = self.client.get(self.url)
+        self.assertIn('Nom1', reponse.content.decode())
+
+
+class ShardsTests(TransactionTestCase):
+    ALIAS = ('shard_test_1', 'shard_test_2')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.repertoire = tempfile.TemporaryDirectory()
+        # Schéma migré une fois dans un modèle, recopié pour chaque test
+        cls.modele = os.path.join(cls.repertoire.name, 'modele.sqlite3')
+        connections.settings['shard_modele'] = {**connections.settings['default'], 'NAME': cls.modele}
+        call_command('migrate', database='shard_modele', verbosity=0)
+        connections['shard_modele'].close()
+        del connections['shard_modele']
+        del connections.settings['shard_modele']
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.repertoire.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        for alias in self.ALIAS:
+            chemin = os.path.join(self.repertoire.name, f'{alias}.sqlite3')
+            Path(chemin).write_bytes(Path(self.modele).read_bytes())
+            connections.settings[alias] = {**connections.settings['default'], 'NAME': chemin}
+            self.addCleanup(self.retirer_alias, alias)
+        reglages = override_settings(SHARDS=['default', *self.ALIAS])
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def retirer_alias(self, alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def client_sur(self, alias, suffixe, **kwargs):
+        """Client whose CNI hashes to shard ``alias``"""
+        cni = next(f'CM-{suffixe}-{n}' for n in range(1000) if shard_pour_cni(f'CM-{suffixe}-{n}') == alias)
+        return creer_client(suffixe, cni=cni, **kwargs)
+
+    def test_identifiants_et_placement(self):
+        for index, alias in enumerate(['default', *self.ALIAS]):
+            client = self.client_sur(alias, str(index))
+            compte = creer_compte(client, f'CM7600000000000000000000000{index}', '100')
+            self.assertEqual((client._state.db, client.id % 3), (alias, index))
+            self.assertEqual((compte._state.db, compte.id % 3), (alias, index))
+            self.assertTrue(Compte.objects.pour_compte(compte.id).filter(id=compte.id).exists())
+
+        self.assertEqual(Client.objects.count(), 1)
+        clients = Client.objects.order_by('nom').sur_tous_les_shards()
+        self.assertEqual([c.nom for c in clients], ['Nom0', 'Nom1', 'Nom2'])
+
+    def test_vues_sur_le_shard_du_compte(self):
+        compte = creer_compte(self.client_sur(self.ALIAS[1], '1'), 'CM76000000000000000000000001', '100')
+        reponse = self.client.post(reverse('depot', args=[compte.id]), {'montant': '25'})
+        self.assertRedirects(reponse, reverse('dashboard', args=[compte.id]))
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=compte.id).solde, Decimal('125.00'))
+        self.assertContains(self.client.get(reverse('dashboard', args=[compte.id])), compte.iban)
+        self.assertFalse(BankTransaction.objects.exists())
+
+    def test_virement_entre_deux_shards(self):
+        source = creer_compte(self.client_sur(self.ALIAS[0], '1'), 'CM76000000000000000000000001', '100')
+        destination = creer_compte(self.client_sur(self.ALIAS[1], '2'), 'CM76000000000000000000000002', '0')
+
+        resultat = effectuer_virement(source.id, destination.iban, Decimal('40'), 'Loyer')
+
+        self.assertEqual(resultat['statut'], 'TERMINE')
+        self.assertEqual(Compte.objects.using(self.ALIAS[0]).get(id=source.id).solde, Decimal('60.00'))
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=destination.id).solde, Decimal('40.00'))
+        debit = BankTransaction.objects.using(self.ALIAS[0]).get()
+        credit = BankTransaction.objects.using(self.ALIAS[1]).get()
+        self.assertEqual(debit.reference, credit.reference)
+        self.assertEqual((debit.iban_contrepartie, credit.iban_contrepartie), (destination.iban, source.iban))
+        self.assertEqual(statistiques_journalieres()[0]['nombre_virements'], 1)
+
+    def test_reprise_apres_echec_du_credit(self):
+        source = creer_compte(self.client_sur(self.ALIAS[0], '1'), 'CM76000000000000000000000001', '100')
+        destination = creer_compte(self.client_sur(self.ALIAS[1], '2'), 'CM76000000000000000000000002', '0')
+
+        with mock.patch('banking.virements_intershards._crediter', side_effect=DatabaseError('shard injoignable')):
+            with self.assertLogs('banking.virements_intershards', 'WARNING'):
+                resultat = effectuer_virement(source.id, destination.iban, Decimal('40'))
+        self.assertEqual(resultat['statut'], 'DEBITE')
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=destination.id).solde, Decimal('0.00'))
+
+        # Trop récent pour la reprise, puis repris et rejoué sans effet
+        self.assertEqual(reprendre_virements_intershards()['termines'], 0)
+        sortie = io.StringIO()
+        call_command('reprendre_virements_intershards', delai=0, stdout=sortie)
+        self.assertIn('1 virement(s) terminé(s)', sortie.getvalue())
+        virement = VirementInterShard.objects.using(self.ALIAS[0]).get()
+        self.assertEqual(virement.statut, 'TERMINE')
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=destination.id).solde, Decimal('40.00'))
+
+        VirementInterShard.objects.using(self.ALIAS[0]).update(statut='DEBITE')
+        self.assertEqual(reprendre_virements_intershards(delai=timedelta(0))['termines'], 1)
+        self.assertEqual(BankTransaction.objects.using(self.ALIAS[1]).count(), 1)
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=destination.id).solde, Decimal('40.00'))
+
+    def test_lectures_sur_tous_les_shards(self):
+        source = creer_compte(self.client_sur(self.ALIAS[0], '1', nom='Mbarga'), 'CM76000000000000000000000001', '100')
+        destination = creer_compte(self.client_sur(self.ALIAS[1], '2', nom='Ngono'), 'CM76000000000000000000000002', '0')
+
+        # Formulaire HTML vers un compte d'un autre shard
+        reponse = self.client.post(reverse('virement', args=[source.id]), {
+            'compte_source': source.iban, 'iban_destination': destination.iban, 'montant': '40',
+        })
+        self.assertRedirects(reponse, reverse('dashboard', args=[source.id]))
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=destination.id).solde, Decimal('40.00'))
+
+        self.assertEqual([c.id for c in rechercher_clients('ngono')], [destination.client_id])
+        self.assertEqual(reindexer_clients(), 2)
+        self.assertEqual({c.nom for c in rechercher_clients('Prenom')}, {'Mbarga', 'Ngono'})
+        self.assertEqual([r['iban'] for r in rechercher_ibans('CM7600')], [source.iban, destination.iban])
+        self.assertContains(self.client.get(reverse('liste_comptes')), destination.iban)
+
+        # Flux d'événements : une position par shard
+        url = reverse('api_evenements')
+        page = self.client.get(url, {'consommateur': 'compta'}).json()
+        self.assertEqual([(e['shard'], e['type']) for e in page['evenements']],
+                         [(self.ALIAS[0], 'transaction.virement'), (self.ALIAS[1], 'transaction.virement')])
+        self.assertEqual(page['curseur'], '0,{},{}'.format(*(e['position'] for e in page['evenements'])))
+        self.client.post(reverse('api_acquitter_evenements'), {'consommateur': 'compta', 'curseur': page['curseur']},
+                         content_type='application/json')
+        self.assertEqual(self.client.get(url, {'consommateur': 'compta'}).json()['evenements'], [])
+        self.assertEqual(self.client.get(url, {'apres': '3'}).status_code, 400)
+
+        # Historique global : les deux jambes, filtres résolus sur chaque shard, clé de cache par shard
+        historique = reverse('historique_transactions')
+        reponse = self.client.get(historique)
+        self.assertContains(reponse, 'Mbarga')
+        self.assertContains(reponse, 'Ngono')
+        reponse = self.client.get(historique, {'client': destination.client_id})
+        self.assertContains(reponse, 'Ngono')
+        self.assertNotContains(reponse, 'Mbarga')
+        with shard(self.ALIAS[1]):
+            effectuer_depot(destination.id, Decimal('7.25'))
+        self.assertContains(self.client.get(historique), '7,25')
+
+    def test_lot_de_virements_permanents_atomique_sur_son_shard(self):
+        client = self.client_sur(self.ALIAS[0], '1')
+        source = creer_compte(client, 'CM76000000000000000000000001', '100')
+        destination = creer_compte(client, 'CM76000000000000000000000002', '0')
+        jour = date(2024, 1, 31)
+        ordre = VirementPermanent.objects.using(self.ALIAS[0]).create(
+            compte_source=source, compte_destination=destination, montant=Decimal('10'),
+            date_debut=jour, prochaine_execution=jour,
+        )
+
+        with mock.patch('banking.virements_permanents.comptabiliser_lot', side_effect=DatabaseError('échec')):
+            with self.assertRaises(DatabaseError):
+                executer_virements_permanents(jour)
+        # Tout le lot est annulé sur le shard : rien n'est payé, l'échéance reste due
+        self.assertEqual(Compte.objects.using(self.ALIAS[0]).get(id=source.id).solde, Decimal('100.00'))
+        self.assertFalse(BankTransaction.objects.using(self.ALIAS[0]).exists())
+
+        self.assertEqual(executer_virements_permanents(jour)['executes'], 1)
+        self.assertEqual(executer_virements_permanents(jour)['executes'], 0)
+        self.assertEqual(Compte.objects.using(self.ALIAS[0]).get(id=destination.id).solde, Decimal('10.00'))
+        self.assertNotEqual(VirementPermanent.objects.using(self.ALIAS[0]).get(id=ordre.id).prochaine_execution, jour)
+
+    def test_interruption_entre_les_jambes_avec_cle_d_idempotence(self):
+        source = creer_compte(self.client_sur(self.ALIAS[0], '1'), 'CM76000000000000000000000001', '100')
+        destination = creer_compte(self.client_sur(self.ALIAS[1], '2'), 'CM76000000000000000000000002', '0')
+        url = reverse('api_virement', args=[source.id])
+        corps = json.dumps({'iban_destination': destination.iban, 'montant': '40'})
+
+        # Arrêt après le crédit, avant TERMINE : le débit est déjà validé
+        with mock.patch('banking.virements_intershards._terminer', side_effect=RuntimeError('arrêt')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, corps, content_type='application/json', HTTP_IDEMPOTENCY_KEY='cle-1')
+        self.assertEqual(Compte.objects.using(self.ALIAS[0]).get(id=source.id).solde, Decimal('60.00'))
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=destination.id).solde, Decimal('40.00'))
+        self.assertEqual(VirementInterShard.objects.using(self.ALIAS[0]).get().statut, 'DEBITE')
+
+        # La clé reste réservée : pas de second débit
+        reponse = self.client.post(url, corps, content_type='application/json', HTTP_IDEMPOTENCY_KEY='cle-1')
+        self.assertEqual(reponse.status_code, 409)
+        self.assertEqual(reprendre_virements_intershards(delai=timedelta(0))['termines'], 1)
+        self.assertEqual(Compte.objects.using(self.ALIAS[0]).get(id=source.id).solde, Decimal('60.00'))
+        self.assertEqual(Compte.objects.using(self.ALIAS[1]).get(id=destination.id).solde, Decimal('40.00'))
+
+        reponse = self.client.post(url, corps, content_type='application/json', HTTP_IDEMPOTENCY_KEY='cle-2')
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(reponse.json()['statut'], 'TERMINE')
+        rejouee = self.client.post(url, corps, content_type='application/json', HTTP_IDEMPOTENCY_KEY='cle-2')
+        self.assertEqual((rejouee.status_code, rejouee.json()), (200, reponse.json()))
+        self.assertEqual(Compte.objects.using(self.ALIAS[0]).get(id=source.id).solde, Decimal('20.00'))
+
+
+class AnomaliesTests(TestCase):
+    def setUp(self):
+        self.compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '100000')
+        self.destination = creer_compte(creer_client('2'), 'CM76000000000000000000000002', '0')
+
+    def test_statistiques_glissantes_et_file_de_revue(self):
+        montants = [100, 120, 90, 110, 105, 95, 100, 115, 85, 100]
+        for montant in montants:
+            effectuer_retrait(self.compte.id, Decimal(montant))
+        effectuer_depot(self.compte.id, Decimal('50000'))
+
+        profil = ProfilRisque.objects.get(compte=self.compte)
+        self.assertEqual(profil.nombre, len(montants))
+        self.assertAlmostEqual(profil.moyenne, np.mean(montants))
+        self.assertAlmostEqual(profil.m2 / (profil.nombre - 1), np.var(montants, ddof=1))
+        self.assertFalse(AlerteAnomalie.objects.exists())
+
+        effectuer_virement(self.compte.id, self.destination.iban, Decimal('5000'))
+        alerte = AlerteAnomalie.objects.get()
+        self.assertEqual((alerte.compte, alerte.transaction.montant), (self.compte, Decimal('5000.00')))
+        self.assertIn('montant inhabituel', alerte.motifs)
+        self.assertGreater(alerte.score, 4)
+        self.assertEqual(alerte.statut, 'A_REVOIR')
+
+    @override_settings(ANOMALIES={'OPERATIONS_MAX_FENETRE': 3})
+    def test_velocite(self):
+        for _ in range(4):
+            effectuer_retrait(self.compte.id, Decimal('10'))
+        self.assertEqual(AlerteAnomalie.objects.get().motifs, "4 débits en 60 min")
+
+        # Nouvelle fenêtre une heure plus tard
+        ProfilRisque.objects.update(debut_fenetre=timezone.now() - timedelta(hours=1))
+        effectuer_retrait(self.compte.id, Decimal('10'))
+        self.assertEqual(AlerteAnomalie.objects.count(), 1)
+
+    def test_rejeu_reproduit_les_profils(self):
+        for montant in (100, 250, 40):
+            effectuer_retrait(self.compte.id, Decimal(montant))
+            effectuer_virement(self.compte.id, self.destination.iban, Decimal(montant) / 2)
+        effectuer_retrait(self.destination.id, Decimal('30'))
+        attendus = {p.compte_id: p for p in ProfilRisque.objects.all()}
+
+        ProfilRisque.objects.all().delete()
+        sortie = io.StringIO()
+        call_command('rejouer_profils_risque', stdout=sortie)
+        self.assertIn('2 profil(s)', sortie.getvalue())
+
+        for profil in ProfilRisque.objects.all():
+            attendu = attendus[profil.compte_id]
+            self.assertEqual((profil.nombre, profil.operations_fenetre), (attendu.nombre, attendu.operations_fenetre))
+            self.assertAlmostEqual(profil.moyenne, attendu.moyenne)
+            self.assertAlmostEqual(profil.m2, attendu.m2)
+        self.assertEqual(reconstruire_profils(), 2)
+
+
+class GrandLivreTests(TestCase):
+    def setUp(self):
+        self.compte = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '1000')
+        self.autre = creer_compte(creer_client('2'), 'CM76000000000000000000000002', '0')
+        effectuer_depot(self.compte.id, Decimal('250.50'))
+        effectuer_retrait(self.compte.id, Decimal('100'))
+        effectuer_virement(self.compte.id, self.autre.iban, Decimal('300.25'))
+        effectuer_retrait(self.autre.id, Decimal('0.25'))
+        # Jambe crédit d'un virement venu d'un autre shard : pas de compte source
+        BankTransaction.objects.create(
+            compte_destination=self.autre, type_transaction='VIREMENT', montant=Decimal('40'), iban_contrepartie='CM99'
+        )
+        Compte.objects.filter(pk=self.autre.pk).update(solde=Decimal('340.00'))
+
+    def test_rejeu_reproduit_les_soldes(self):
+        rapport = verifier()
+        self.assertEqual((rapport['comptes'], rapport['mouvements'], rapport['ecarts']), (2, 5, []))
+
+        livre = GrandLivre()
+        livre.ouvrir(1, 500)
+        livre.ouvrir(2)
+        self.assertEqual(livre.appliquer([('DEPOT', 1, None, 100), ('VIREMENT', 1, 2, 250)]), 2)
+        self.assertEqual((livre.solde(1), livre.solde(2)), (350, 250))
+
+    def test_compte_ouvert_pendant_le_rejeu(self):
+        livre = GrandLivre()
+        livre.ouvrir(1, 500)
+        # Compte 3 et son premier mouvement validés entre le chargement des comptes et la lecture des transactions
+        self.assertEqual(livre.appliquer([('DEPOT', 1, None, 100), ('DEPOT', 3, None, 70), ('VIREMENT', 1, 3, 50)]), 3)
+        self.assertEqual((livre.solde(1), livre.inconnus), (550, {3}))
+
+        def livre_partiel(verrouiller=False):
+            partiel = GrandLivre()
+            partiel.ouvrir(self.compte.id, vers_centimes(Decimal('1000')))
+            return partiel
+
+        with mock.patch('banking.grand_livre.charger_comptes', side_effect=livre_partiel):
+            rapport = verifier()
+        self.assertEqual((rapport['inconnus'], rapport['ecarts']), ({self.autre.id}, []))
+
+    def test_correction_des_ecarts(self):
+        Compte.objects.filter(pk=self.compte.pk).update(solde=Decimal('1.00'))
+        with self.assertRaisesMessage(CommandError, '1 solde(s) différent(s)'):
+            call_command('rejouer_grand_livre', stdout=io.StringIO())
+
+        # Seuls les comptes désignés sont réécrits
+        with self.assertRaisesMessage(CommandError, '1 solde(s) différent(s)'):
+            call_command('rejouer_grand_livre', '--corriger', str(self.autre.id), stdout=io.StringIO())
+        self.compte.refresh_from_db()
+        self.assertEqual(self.compte.solde, Decimal('1.00'))
+
+        sortie = io.StringIO()
+        call_command('rejouer_grand_livre', '--corriger', str(self.compte.id), stdout=sortie)
+        self.assertIn('rejoué 850.25, enregistré 1.00', sortie.getvalue())
+        self.assertIn('1 solde(s) corrigé(s)', sortie.getvalue())
+        self.compte.refresh_from_db()
+        self.assertEqual(self.compte.solde, Decimal('850.25'))
+        self.assertEqual(verifier()['ecarts'], [])
+        self.assertEqual(sum(ligne['encours_total'] for ligne in statistiques_par_type()), Decimal('1190.25'))
+
+    def test_simulation_d_un_plafond(self):
+        effectuer_retrait(self.compte.id, Decimal('200'))
+        sortie = io.StringIO()
+        call_command('rejouer_grand_livre', plafond_retrait='250', stdout=sortie)
+        # 100 puis 200 le même jour : le second dépasse 250
+        self.assertIn('5 mouvement(s) accepté(s), 1 refusé(s)', sortie.getvalue())
+        self.assertIn('Plafond journalier de 250 dépassé : 1', sortie.getvalue())
+
+
+class FiltresHistoriqueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.titulaire = creer_client('1')
+        self.autre = creer_client('2')
+        self.courant = creer_compte(self.titulaire, 'CM76000000000000000000000001')
+        self.epargne = creer_compte(self.titulaire, 'CM76000000000000000000000002')
+        self.tiers = creer_compte(self.autre, 'CM76000000000000000000000003')
+        creer_transaction(self.courant, 'DEPOT', '100', il_y_a=40, description='Salaire de mars')
+        creer_transaction(self.tiers, 'VIREMENT', '250', il_y_a=3, compte_destination=self.epargne,
+                          description='Loyer appartement')
+        creer_transaction(self.tiers, 'RETRAIT', '75', description='Retrait guichet')
+        creer_transaction(self.tiers, 'VIREMENT', '30', iban_contrepartie='CM76999999999999999999999999',
+                          description='Virement vers un autre shard')
+
+    def montants(self, **filtres):
+        formulaire = FiltresHistoriqueForm(filtres)
+        transactions = formulaire.filtrer(BankTransaction.objects.all())
+        return sorted(transactions.values_list('montant', flat=True))
+
+    def test_filtres(self):
+        self.assertEqual(self.montants(iban='cm76 0000 0000 0000 0000 0000 0002'), [Decimal('250')])
+        self.assertEqual(self.montants(iban='CM76999999999999999999999999'), [Decimal('30')])
+        self.assertEqual(self.montants(client=self.titulaire.id), [Decimal('100'), Decimal('250')])
+        self.assertEqual(self.montants(type='VIREMENT', montant_min='100'), [Decimal('250')])
+        jour = timezone.localdate() - timedelta(days=3)
+        self.assertEqual(self.montants(du=jour.isoformat(), au=jour.isoformat()), [Decimal('250')])
+        self.assertEqual(self.montants(periode='7d'), [Decimal('30'), Decimal('75'), Decimal('250')])
+
+    def test_recherche_dans_la_description(self):
+        self.assertEqual(self.montants(q='loyer'), [Decimal('250')])
+        self.assertEqual(self.montants(q='salai'), [Decimal('100')])
+        self.assertEqual(self.montants(q='Loyer', client=self.autre.id), [Decimal('250')])
+
+    def test_meme_semantique_sur_chaque_backend(self):
+        # Tous les mots, dans n'importe quel ordre, chacun préfixe d'un mot de la description
+        attendus = {'appart loyer': [Decimal('250')], 'oyer': [], 'loyer salaire': [], 'VERS sha': [Decimal('30')]}
+        for vendor in ('sqlite', 'postgresql'):
+            with self.subTest(vendor=vendor), mock.patch('banking.search.connection', vendor=vendor):
+                self.assertEqual({terme: self.montants(q=terme) for terme in attendus}, attendus)
+
+    def test_filtre_invalide_signale_et_ignore(self):
+        response = self.client.get(reverse('historique_transactions'), {
+            'du': 'hier', 'montant_min': '10', 'montant_max': '5', 'type': 'RETRAIT',
+        })
+        self.assertEqual(response.status_code, 200)
+        erreurs = [str(message) for message in response.context['messages']]
+        self.assertEqual(len(erreurs), 2)
+        self.assertTrue(erreurs[0].startswith('Du : '))
+        self.assertContains(response, 'Retrait guichet')
+        self.assertNotContains(response, 'Loyer appartement')
+
+    def test_chaque_combinaison_servie_par_un_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite uniquement")
+        comptes = [self.courant, self.epargne, self.tiers] + [
+            creer_compte(self.autre, f'CM76{numero:024d}') for numero in range(4, 100)
+        ]
+        maintenant = timezone.now()
+        BankTransaction.objects.bulk_create(
+            BankTransaction(
+                type_transaction=('DEPOT', 'RETRAIT', 'VIREMENT')[numero % 3],
+                compte_source=comptes[numero % len(comptes)],
+                compte_destination=comptes[numero * 7 % len(comptes)] if numero % 3 == 2 else None,
+                montant=Decimal(numero % 1000 + 1),
+                description=('Loyer', 'Salaire', 'Facture eau', 'Courses')[numero % 4],
+                date_transaction=maintenant - timedelta(hours=numero),
+            )
+            for numero in range(3000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        valeurs = {
+            'type': 'RETRAIT', 'periode': '30d', 'du': '2024-01-01', 'au': '2024-12-31',
+            'montant_min': '100', 'montant_max': '500', 'iban': self.epargne.iban,
+            'client': self.titulaire.id, 'q': 'loyer',
+        }
+        for nombre in range(1, len(valeurs) + 1):
+            for champs in itertools.combinations(valeurs, nombre):
+                formulaire = FiltresHistoriqueForm({champ: valeurs[champ] for champ in champs})
+                plan = formulaire.filtrer(BankTransaction.objects.all()).order_by('-date_transaction').explain()
+                with self.subTest(champs=champs):
+                    self.assertNotRegex(plan, r'SCAN banking_transaction\b(?! USING INDEX)')
+                    if not set(champs) <= {'montant_min', 'montant_max'}:
+                        # Recherche bornée, pas un parcours complet d'index dans l'ordre des dates
+                        self.assertRegex(plan, r'SEARCH banking_transaction\b')
+
+
+@override_settings(DORMANCE_DELAI_JOURS=365)
+class DormanceTests(TestCase):
+    def setUp(self):
+        self.courant = creer_compte(creer_client('1'), 'CM76000000000000000000000001', '1000')
+        self.epargne = creer_compte(creer_client('2'), 'CM76000000000000000000000002', '1000', type_compte='EPARGNE')
+        self.ancien = timezone.now() - timedelta(days=400)
+        Compte.objects.update(date_ouverture=self.ancien - timedelta(days=30), derniere_activite=self.ancien)
+
+    def activite(self, compte):
+        return Compte.objects.values_list('derniere_activite', flat=True).get(pk=compte.pk)
+
+    def test_mouvements_datent_l_activite(self):
+        avant = timezone.now()
+        effectuer_virement(self.courant.id, self.epargne.iban, Decimal('10'))
+        self.assertGreaterEqual(self.activite(self.courant), avant)
+        self.assertGreaterEqual(self.activite(self.epargne), avant)
+
+        Compte.objects.update(derniere_activite=self.ancien)
+        VirementPermanent.objects.create(compte_source=self.courant, compte_destination=self.epargne,
+                                         montant=Decimal('5'), date_debut=timezone.localdate(),
+                                         prochaine_execution=timezone.localdate())
+        executer_virements_permanents(timezone.localdate())
+        self.assertGreaterEqual(self.activite(self.courant), avant)
+        self.assertGreaterEqual(self.activite(self.epargne), avant)
+
+        # Les intérêts ne réveillent pas un compte
+        Compte.objects.filter(pk=self.epargne.pk).update(derniere_activite=self.ancien)
+        premier = timezone.localdate().replace(day=1)
+        periode = (premier - timedelta(days=1)).strftime('%Y-%m')
+        self.assertEqual(calculer_interets(periode, taux='0.0365')['comptes'], 1)
+        self.assertEqual(self.activite(self.epargne), self.ancien)
+
+    def test_recalcul_depuis_l_historique(self):
+        Compte.objects.update(derniere_activite=timezone.now())
+        recu = creer_transaction(self.epargne, 'VIREMENT', '5', il_y_a=20, compte_destination=self.courant)
+        creer_transaction(self.courant, 'RETRAIT', '5', il_y_a=50)
+        epargne = Compte.objects.get(pk=self.epargne.pk)
+        interet = creer_transaction(epargne, 'DEPOT', '1', il_y_a=2)
+        InteretCompte.objects.create(compte=epargne, periode='2024-01', taux=Decimal('0.01'), montant=Decimal('1'),
+                                     transaction=interet)
+        tiers = creer_compte(creer_client('3'), 'CM76000000000000000000000003')
+
+        sortie = io.StringIO()
+        call_command('dater_activite_comptes', stdout=sortie)
+        self.assertIn('3 compte(s)', sortie.getvalue())
+        self.assertEqual(self.activite(self.courant), recu.date_transaction)
+        self.assertEqual(self.activite(self.epargne), recu.date_transaction)
+        tiers.refresh_from_db()
+        self.assertEqual(self.activite(tiers), tiers.date_ouverture)
+        self.assertEqual(dater_activite(), 3)
+
+    def test_desactivation_des_comptes_dormants(self):
+        effectuer_depot(self.epargne.id, Decimal('1'))
+        self.assertEqual(len(rechercher_ibans('CM7600')), 2)
+        sortie = io.StringIO()
+        call_command('traiter_comptes_dormants', simulation=True, stdout=sortie)
+        self.assertIn('1 compte(s) sans mouvement depuis 365 jours', sortie.getvalue())
+        self.assertTrue(Compte.objects.get(pk=self.courant.pk).actif)
+
+        call_command('traiter_comptes_dormants', stdout=sortie)
+        self.assertIn('1 compte(s) dormant(s) désactivé(s)', sortie.getvalue())
+        self.assertEqual(list(Compte.objects.filter(actif=True).values_list('pk', flat=True)), [self.epargne.pk])
+        courants = next(ligne for ligne in statistiques_par_type() if ligne['type_compte'] == 'COURANT')
+        self.assertEqual((courants['comptes'], courants['comptes_actifs']), (1, 0))
+        # update() contourne les signaux : le cache d'autocomplétion est vidé explicitement
+        self.assertEqual([r['iban'] for r in rechercher_ibans('CM7600')], [self.epargne.iban])
+
+        call_command('traiter_comptes_dormants', stdout=sortie)
+        self.assertIn('0 compte(s) dormant(s) désactivé(s)', sortie.getvalue())
+
+    def test_intervalle_sur_l_index_partiel(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite uniquement")
+        plan = comptes_dormants(seuil_dormance()).order_by().explain()
+        self.assertIn('USING INDEX compte_activite_idx (derniere_activite<?)', plan)
@@ -4,7 +4,10 @@ from . import views
 urlpatterns = [
     path('', views.liste_clients, name='index'),
     path('clients/', views.liste_clients, name='liste_clients'),
+    path('clients/recherche/', views.recherche_clients, name='recherche_clients'),
+    path('clients/import/', views.import_clients, name='import_clients'),
     path('client/<int:client_id>/', views.profile_client, name='profile_client'),
+    path('client/<int:client_id>/portefeuille/', views.portefeuille_client, name='portefeuille_client'),
     path('client/<int:client_id>/edit/', views.edit_client, name='edit_client'),
     path('client/<int:client_id>/new_compte/', views.create_compte, name='create_compte'),
     path('comptes/', views.liste_comptes, name='liste_comptes'),
@@ -15,5 +18,17 @@ urlpatterns = [
     path('telecharger_rib/<int:compte_id>/', views.telecharger_rib, name='telecharger_rib'),
     path('telecharger_releve/<int:compte_id>/', views.telecharger_releve, name='telecharger_releve'),
     path('statistiques/<int:compte_id>/', views.statistiques_compte, name='statistiques'),
+    path('statistiques/<int:compte_id>/graphique.png', views.graphique_solde, name='graphique_solde'),
     path('transactions/', views.historique_transactions, name='historique_transactions'),
+    path('api/comptes/<int:compte_id>/statistiques/', views.api_statistiques_compte, name='api_statistiques'),
+    path('api/comptes/<int:compte_id>/courbe/', views.api_courbe_solde, name='api_courbe_solde'),
+    path('api/clients/<int:client_id>/portefeuille/', views.api_portefeuille_client, name='api_portefeuille'),
+    path('gestion/statistiques/', views.statistiques_banque, name='statistiques_banque'),
+    path('api/evenements/', views.api_evenements, name='api_evenements'),
+    path('api/evenements/acquitter/', views.api_acquitter_evenements, name='api_acquitter_evenements'),
+    path('api/admission/metriques/', views.api_admission_metriques, name='api_admission_metriques'),
+    path('api/comptes/iban/', views.api_recherche_iban, name='api_recherche_iban'),
+    path('api/comptes/<int:compte_id>/depot/', views.api_depot, name='api_depot'),
+    path('api/comptes/<int:compte_id>/retrait/', views.api_retrait, name='api_retrait'),
+    path('api/comptes/<int:compte_id>/virement/', views.api_virement, name='api_virement'),
 ]
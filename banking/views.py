@@ -1,11 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db import transaction
-from django.db.models import Q, Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.utils import timezone
 from django.views.generic import TemplateView
 from .models import Client, Compte, Transaction as BankTransaction
-from decimal import Decimal
+from .idempotency import CleIdempotenceConflit, OperationEnCours, cle_depuis_requete, executer_une_fois, generer_cle
+from .autocomplete import normaliser_iban, rechercher_ibans
+from .forms import FiltresHistoriqueForm
+from .fragments import version as version_fragments
+from . import releves
+from .import_clients import COLONNES_OPTIONNELLES, COLONNES_REQUISES, importer_csv
+from .admission import controle_admission, limiteur_courant
+from .interets import bornes_periode
+from .analytics import analyser_compte, courbe_soldes, indicateurs, serie_soldes, totaux_par_type
+from .outbox import (
+    LIMITE_DEFAUT, LIMITE_MAX, acquitter_flux, avancer, curseurs, formater_position, lire_flux, lire_position,
+    serialiser,
+)
+from .portefeuille import synthese_portefeuille
+from .routage import lecture_replique
+from .rollups import statistiques_journalieres, statistiques_par_type
+from .search import rechercher_clients
+from .shards import fusionner, liste_shards, shard, shard_par_identifiant, sharding_actif
+from .operations import (
+    PLAFOND_RETRAIT_JOURNALIER, effectuer_depot, effectuer_retrait, effectuer_virement, retraits_du_jour,
+    trouver_iban, virement_intershard,
+)
+from decimal import Decimal, InvalidOperation
 import secrets
 import string
 from datetime import datetime, timedelta
@@ -15,22 +40,29 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+import io
 import json
+import os
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from io import BytesIO
-import base64
 
 # Constantes de sécurité
-PLAFOND_RETRAIT_JOURNALIER = Decimal('500000.00')  # Max 500,000 F CFA par jour
 SEUIL_VIREMENT_CONFIRMATION = Decimal('100000.00')  # Virements > 100,000 F CFA nécessitent une confirmation
 DEVISE = "F CFA"
+MONTANT_CHIFFRES_MAX = BankTransaction._meta.get_field('montant').max_digits
+JOURS_ANALYSE_MAX = 3650  # 10 ans d'historique au plus par requête d'analyse
+POINTS_COURBE_DEFAUT = 200
+POINTS_COURBE_MAX = 2000
+DUREE_CACHE_GRAPHIQUE = 3600  # secondes
 
 
+@lecture_replique
 def liste_clients(request):
     """List all clients with their accounts count"""
-    clients = Client.objects.prefetch_related('comptes').order_by('-date_creation')
+    # Avec plusieurs shards : fusion des listes de chaque shard
+    clients = Client.objects.prefetch_related('comptes').order_by('-date_creation').sur_tous_les_shards()
     
     # Add total balance to each client
     for client in clients:
@@ -41,6 +73,15 @@ def liste_clients(request):
     return render(request, 'banking/liste_clients.html', context)
 
 
+def recherche_clients(request):
+    """Search clients by name, CNI or email, most relevant first"""
+    terme = request.GET.get('q', '').strip()
+    clients = rechercher_clients(terme) if terme else []
+    
+    context = {'clients': clients, 'q': terme}
+    return render(request, 'banking/recherche_clients.html', context)
+
+
 def profile_client(request, client_id):
     """Display client profile with all their accounts"""
     client = get_object_or_404(Client, id=client_id)
@@ -57,6 +98,43 @@ def profile_client(request, client_id):
     return render(request, 'banking/profile_client.html', context)
 
 
+def portefeuille_client(request, client_id):
+    """Consolidated portfolio: every account of the client with its 30-day metrics"""
+    client = get_object_or_404(Client, id=client_id)
+    context = synthese_portefeuille(client)
+    return render(request, 'banking/portefeuille_client.html', context)
+
+
+def api_portefeuille_client(request, client_id):
+    """JSON version of the consolidated portfolio"""
+    client = get_object_or_404(Client, id=client_id)
+    try:
+        jours = int(request.GET.get('jours', 30))
+    except ValueError:
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+    if not 1 <= jours <= JOURS_ANALYSE_MAX:
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+    
+    synthese = synthese_portefeuille(client, jours=jours)
+    synthese['client'] = {'id': client.id, 'nom': client.nom, 'prenom': client.prenom}
+    synthese['comptes'] = [
+        {
+            'id': ligne['compte'].id,
+            'iban': ligne['compte'].iban,
+            'type_compte': ligne['compte'].type_compte,
+            'solde': ligne['compte'].solde,
+            'actif': ligne['compte'].actif,
+            'entrees': ligne['entrees'],
+            'sorties': ligne['sorties'],
+            'flux_net': ligne['flux_net'],
+            'nb_transactions': ligne['nb_transactions'],
+            'derniere_activite': ligne['derniere_activite'],
+        }
+        for ligne in synthese['comptes']
+    ]
+    return JsonResponse(synthese)
+
+
 def edit_client(request, client_id):
     """Edit client information"""
     client = get_object_or_404(Client, id=client_id)
@@ -81,6 +159,36 @@ def edit_client(request, client_id):
     return render(request, 'banking/edit_client.html', context)
 
 
+REJETS_AFFICHES_MAX = 200
+
+
+def import_clients(request):
+    """Bulk onboarding of clients and accounts from an uploaded CSV file"""
+    rapport = None
+    if request.method == 'POST':
+        fichier = request.FILES.get('fichier')
+        if fichier is None:
+            messages.error(request, "Veuillez choisir un fichier CSV")
+        else:
+            try:
+                rapport = importer_csv(io.TextIOWrapper(fichier.file, encoding='utf-8-sig', newline=''))
+            except (UnicodeDecodeError, ValueError) as e:
+                messages.error(request, f"Fichier refusé : {e}")
+            else:
+                messages.success(
+                    request,
+                    f"{rapport['clients']} client(s) et {rapport['comptes']} compte(s) importés, "
+                    f"{len(rapport['rejets'])} ligne(s) rejetée(s)"
+                )
+
+    context = {
+        'rapport': rapport,
+        'rejets': rapport['rejets'][:REJETS_AFFICHES_MAX] if rapport else [],
+        'colonnes': COLONNES_REQUISES + COLONNES_OPTIONNELLES,
+    }
+    return render(request, 'banking/import_clients.html', context)
+
+
 def create_compte(request, client_id):
     """Create a new account for a client"""
     client = get_object_or_404(Client, id=client_id)
@@ -142,10 +250,14 @@ def dashboard(request, compte_id):
     context = {
         'compte': compte,
         'transactions': all_transactions,
+        # Les transactions ne sont jamais modifiées : la plus récente identifie le tableau
+        'derniere_transaction': max((t.id for t in all_transactions), default=0),
+        'releves_precedents': releves.periodes_precedentes(3),
     }
     return render(request, 'banking/dashboard.html', context)
 
 
+@controle_admission()
 def depot(request, compte_id):
     """Deposit form and handler"""
     compte = get_object_or_404(Compte, id=compte_id)
@@ -158,38 +270,30 @@ def depot(request, compte_id):
             if montant <= 0:
                 messages.error(request, "Le montant doit être supérieur à 0")
             else:
-                # Create deposit transaction
-                with transaction.atomic():
-                    compte.solde += montant
-                    compte.save()
-                    
-                    BankTransaction.objects.create(
-                        compte_source=compte,
-                        type_transaction='DEPOT',
-                        montant=montant,
-                        description=description
-                    )
+                # Une clé déjà vue renvoie le résultat d'origine sans nouveau dépôt
+                executer_une_fois(
+                    cle_depuis_requete(request),
+                    f'depot:{compte.id}',
+                    {'montant': montant, 'description': description},
+                    lambda: effectuer_depot(compte.id, montant, description)
+                )
                 
                 messages.success(request, f"Dépôt de {montant} F CFA effectué avec succès")
                 return redirect('dashboard', compte_id=compte.id)
         except Exception as e:
             messages.error(request, f"Erreur: {str(e)}")
     
-    context = {'compte': compte}
+    context = {'compte': compte, 'idempotency_key': generer_cle()}
     return render(request, 'banking/depot.html', context)
 
 
+@controle_admission()
 def retrait(request, compte_id):
     """Withdrawal form and handler with daily limit"""
     compte = get_object_or_404(Compte, id=compte_id)
     
     # Calculate today's withdrawals
-    today = datetime.now().date()
-    retraits_aujourd_hui = BankTransaction.objects.filter(
-        compte_source=compte,
-        type_transaction='RETRAIT',
-        date_transaction__date=today
-    ).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
+    retraits_aujourd_hui = retraits_du_jour(compte)
     
     solde_retrait_disponible = PLAFOND_RETRAIT_JOURNALIER - retraits_aujourd_hui
     
@@ -200,25 +304,19 @@ def retrait(request, compte_id):
             
             if montant <= 0:
                 messages.error(request, "Le montant doit être supérieur à 0")
-            elif montant > compte.solde:
-                messages.error(request, f"Solde insuffisant pour effectuer ce retrait (Solde: {compte.solde}€)")
-            elif montant > solde_retrait_disponible:
-                messages.error(request, f"Dépassement du plafond de retrait journalier. Vous pouvez retirer {solde_retrait_disponible}€ aujourd'hui.")
             else:
-                # Create withdrawal transaction
-                with transaction.atomic():
-                    compte.solde -= montant
-                    compte.save()
-                    
-                    BankTransaction.objects.create(
-                        compte_source=compte,
-                        type_transaction='RETRAIT',
-                        montant=montant,
-                        description=description
-                    )
+                # Solde et plafond sont vérifiés sous verrou dans effectuer_retrait
+                executer_une_fois(
+                    cle_depuis_requete(request),
+                    f'retrait:{compte.id}',
+                    {'montant': montant, 'description': description},
+                    lambda: effectuer_retrait(compte.id, montant, description)
+                )
                 
                 messages.success(request, f"Retrait de {montant} F CFA effectué avec succès")
                 return redirect('dashboard', compte_id=compte.id)
+        except ValueError as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f"Erreur: {str(e)}")
     
@@ -227,73 +325,86 @@ def retrait(request, compte_id):
         'plafond_retrait': PLAFOND_RETRAIT_JOURNALIER,
         'retraits_aujourd_hui': retraits_aujourd_hui,
         'solde_retrait_disponible': solde_retrait_disponible,
+        'idempotency_key': generer_cle(),
     }
     return render(request, 'banking/retrait.html', context)
 
 
 from .forms import VirementForm
 
+
+def _compte_credite(iban, compte_id):
+    """Id of the account a transfer from ``compte_id`` credits; None when the IBAN is unknown"""
+    try:
+        return trouver_iban(iban, shard_par_identifiant(compte_id))[0]
+    except Compte.DoesNotExist:
+        return None
+
+
+def _destination_formulaire(request, compte_id):
+    return _compte_credite(normaliser_iban(request.POST.get('iban_destination')), compte_id)
+
+
+def _destination_json(request, compte_id):
+    try:
+        iban = str(_lire_json(request).get('iban_destination', ''))
+    except ValueError:
+        return None
+    return _compte_credite(iban, compte_id)
+
+
+@controle_admission(destination=_destination_formulaire)
 def virement(request, compte_id):
     """Transfer form and handler using transaction.atomic and select_for_update"""
     compte_source = get_object_or_404(Compte, id=compte_id)
     
+    # Le compte source est celui du tableau de bord : champ verrouillé (GET et POST)
+    form = VirementForm(
+        request.POST if request.method == 'POST' else None,
+        initial={'compte_source': compte_source},
+        client=compte_source.client
+    )
+    form.fields['compte_source'].disabled = True
+    
     if request.method == 'POST':
-        form = VirementForm(request.POST, client=compte_source.client)
         if form.is_valid():
             iban_dest = form.cleaned_data['iban_destination']
             montant = form.cleaned_data['montant']
             description = form.cleaned_data['description']
             
             try:
-                with transaction.atomic():
-                    # Utiliser select_for_update() pour éviter les conditions de course
-                    source = Compte.objects.select_for_update().get(id=compte_id)
-                    destination = Compte.objects.select_for_update().get(iban=iban_dest)
-                    
-                    if source.solde < montant:
-                        raise ValueError("Solde insuffisant")
-                    
-                    # Débit / Crédit
-                    source.solde -= montant
-                    destination.solde += montant
-                    
-                    source.save()
-                    destination.save()
-                    
-                    # Enregistrement de la transaction
-                    BankTransaction.objects.create(
-                        compte_source=source,
-                        compte_destination=destination,
-                        type_transaction='VIREMENT',
-                        montant=montant,
-                        description=description
-                    )
+                # select_for_update() et verrouillage ordonné dans effectuer_virement
+                # Vers un autre shard le débit est validé avant le crédit, hors de la transaction de la clé
+                resultat, _ = executer_une_fois(
+                    cle_depuis_requete(request),
+                    f'virement:{compte_id}',
+                    {'iban_destination': iban_dest, 'montant': montant, 'description': description},
+                    lambda: effectuer_virement(compte_id, iban_dest, montant, description),
+                    atomique=not virement_intershard(compte_id, iban_dest),
+                )
                 
                 messages.success(request, f"Virement de {montant} {DEVISE} effectué avec succès vers {iban_dest}")
-                return redirect('dashboard', compte_id=source.id)
+                return redirect('dashboard', compte_id=resultat['compte_id'])
             except Compte.DoesNotExist:
                 messages.error(request, "Le compte destinataire avec cet IBAN n'existe pas.")
             except ValueError as e:
                 messages.error(request, str(e))
             except Exception as e:
                 messages.error(request, f"Une erreur inattendue est survenue : {str(e)}")
-    else:
-        # Pré-remplir le formulaire avec le compte source
-        form = VirementForm(initial={'compte_source': compte_source}, client=compte_source.client)
-        # On peut verrouiller le champ compte_source si on vient d'un dashboard spécifique
-        form.fields['compte_source'].disabled = True
 
     context = {
         'compte': compte_source,
         'form': form,
+        'idempotency_key': generer_cle(),
     }
     return render(request, 'banking/virement.html', context)
 
 
 def liste_comptes(request):
     """List all accounts"""
-    comptes = Compte.objects.filter(actif=True).select_related('client')
-    context = {'comptes': comptes}
+    # Avec plusieurs shards : fusion des listes de chaque shard
+    comptes = Compte.objects.filter(actif=True).select_related('client').order_by('-date_ouverture').sur_tous_les_shards()
+    context = {'comptes': comptes, 'version_clients': version_fragments('clients')}
     return render(request, 'banking/liste_comptes.html', context)
 
 
@@ -396,299 +507,354 @@ def telecharger_rib(request, compte_id):
     return response
 
 
+@lecture_replique
 def telecharger_releve(request, compte_id):
-    """Download account statement (relevé mensuel) as PDF"""
-    compte = get_object_or_404(Compte, id=compte_id)
-    client = compte.client
-    
-    # Get this month's transactions
-    today = datetime.now()
-    first_day = today.replace(day=1)
-    last_day = (first_day + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-    
-    transactions = BankTransaction.objects.filter(
-        Q(compte_source=compte) | Q(compte_destination=compte),
-        date_transaction__date__gte=first_day.date(),
-        date_transaction__date__lte=last_day.date()
-    ).order_by('-date_transaction')
-    
-    # Create PDF response
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Releve_{compte.iban}_{today.strftime("%m_%Y")}.pdf"'
-    
-    # Create PDF document
-    doc = SimpleDocTemplate(response, pagesize=A4, topMargin=1*cm, bottomMargin=1*cm)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor('#0d6efd'),
-        alignment=TA_CENTER,
-        spaceAfter=0.5*cm
-    )
-    
-    header_style = ParagraphStyle(
-        'CustomHeader',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=colors.HexColor('#333333'),
-    )
-    
-    # Title
-    month_year = first_day.strftime('%B %Y')
-    story.append(Paragraph(f"RELEVÉ DE COMPTE - {month_year.upper()}", title_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # Account info
-    info_text = f"<b>Titulaire:</b> {client.nom} {client.prenom} | <b>IBAN:</b> {compte.iban} | <b>Compte:</b> {compte.get_type_compte_display()}"
-    story.append(Paragraph(info_text, header_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # Summary
-    solde_debut = compte.solde
-    total_depots = transactions.filter(type_transaction='DEPOT').aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
-    total_retraits = transactions.filter(type_transaction='RETRAIT').aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
-    total_virements_sortants = transactions.filter(type_transaction='VIREMENT', compte_source=compte).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
-    total_virements_entrants = transactions.filter(type_transaction='VIREMENT', compte_destination=compte).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
-    
-    summary_data = [
-        ['Libellé', 'Montant'],
-        ['Solde début de mois', f"{solde_debut} F CFA"],
-        ['Dépôts', f"+{total_depots} F CFA"],
-        ['Retraits', f"-{total_retraits} F CFA"],
-        ['Virements envoyés', f"-{total_virements_sortants} F CFA"],
-        ['Virements reçus', f"+{total_virements_entrants} F CFA"],
-    ]
-    summary_table = Table(summary_data, colWidths=[10*cm, 3*cm])
-    summary_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f9f9f9')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    story.append(summary_table)
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Transactions
-    if transactions:
-        story.append(Paragraph("DÉTAIL DES TRANSACTIONS", styles['Heading2']))
-        story.append(Spacer(1, 0.2*cm))
-        
-        transaction_data = [['Date', 'Type', 'Description', 'Montant', 'Contrepartie']]
-        
-        for trans in transactions:
-            date_str = trans.date_transaction.strftime('%d/%m/%Y')
-            type_str = trans.get_type_transaction_display()
-            
-            if trans.type_transaction == 'VIREMENT':
-                if trans.compte_source_id == compte.id:
-                    contrepartie = trans.compte_destination.iban
-                else:
-                    contrepartie = trans.compte_source.iban
-            else:
-                contrepartie = '-'
-            
-            montant_str = f"{trans.montant} F CFA"
-            
-            transaction_data.append([
-                date_str,
-                type_str,
-                trans.description[:30] if trans.description else '-',
-                montant_str,
-                contrepartie
-            ])
-        
-        trans_table = Table(transaction_data, colWidths=[2.5*cm, 2*cm, 4*cm, 2*cm, 3.5*cm])
-        trans_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f9f9f9')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
-            ('ALIGN', (4, 1), (4, -1), 'CENTER'),
-        ]))
-        story.append(trans_table)
+    """Download account statement (relevé mensuel) as PDF, archived once the month is closed"""
+    compte = get_object_or_404(Compte.objects.select_related('client'), id=compte_id)
+    periode = request.GET.get('periode') or releves.periode_courante()
+    try:
+        debut, _ = bornes_periode(periode)
+    except ValueError:
+        return HttpResponse("Période invalide (AAAA-MM attendu)", status=400)
+    periode = debut.strftime('%Y-%m')
+    nom_fichier = f"Releve_{compte.iban}_{periode[5:]}_{periode[:4]}.pdf"
+
+    try:
+        archive = releves.releve_archive(compte, periode)
+    except ValueError:
+        # Mois en cours : le relevé change encore, généré à chaque demande
+        response = HttpResponse(releves.generer_pdf(compte, periode), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+        return response
+
+    etag = f'"{archive.empreinte}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        return HttpResponseNotModified(headers={'ETag': etag})
+
+    configuration = releves.configuration()
+    relatif = releves.chemin_relatif(archive.empreinte)
+    chemin = os.path.join(configuration['RACINE'], relatif)
+    if configuration['SENDFILE'] == 'x-accel-redirect':
+        # nginx sert le fichier depuis un emplacement `internal` ; Django n'envoie que les en-têtes
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Accel-Redirect'] = configuration['URL_INTERNE'] + relatif
+    elif configuration['SENDFILE'] == 'x-sendfile':
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Sendfile'] = chemin
     else:
-        story.append(Paragraph("Aucune transaction ce mois-ci.", styles['Normal']))
-    
-    story.append(Spacer(1, 1*cm))
-    footer_text = f"Document généré le {datetime.now().strftime('%d/%m/%Y à %H:%M:%S')}"
-    story.append(Paragraph(footer_text, ParagraphStyle('Footer', parent=styles['Normal'], alignment=TA_CENTER, textColor=colors.grey, fontSize=9)))
-    
-    # Build PDF
-    doc.build(story)
+        # FileResponse : wsgi.file_wrapper, donc sendfile() du noyau quand le serveur le permet
+        response = FileResponse(open(chemin, 'rb'), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    response['ETag'] = etag
     return response
 
 
+@lecture_replique
 def statistiques_compte(request, compte_id):
-    """Display account statistics and charts"""
+    """Display account statistics; the chart is drawn client-side from api_courbe_solde"""
     compte = get_object_or_404(Compte, id=compte_id)
-    client = compte.client
-    
-    # Get last 90 days of transactions
-    today = datetime.now()
-    start_date = today - timedelta(days=90)
     
-    # Get all transactions for this account
-    all_transactions = BankTransaction.objects.filter(
-        Q(compte_source=compte) | Q(compte_destination=compte),
-        date_transaction__gte=start_date
-    ).order_by('date_transaction')
-    
-    # Calculate daily balances
-    daily_data = {}
-    current_balance = compte.solde
-    
-    # Get initial balance
-    before_period = BankTransaction.objects.filter(
-        Q(compte_source=compte) | Q(compte_destination=compte),
-        date_transaction__lt=start_date
-    )
-    
-    initial_changes = Decimal('0')
-    for trans in before_period:
-        if trans.type_transaction == 'DEPOT' or (trans.type_transaction == 'VIREMENT' and trans.compte_destination_id == compte.id):
-            initial_changes += trans.montant
-        else:
-            initial_changes -= trans.montant
-    
-    initial_balance = current_balance - initial_changes
-    balance = initial_balance
-    
-    # Build daily summary
-    for trans in all_transactions:
-        date_key = trans.date_transaction.date()
-        
-        if trans.type_transaction == 'DEPOT' or (trans.type_transaction == 'VIREMENT' and trans.compte_destination_id == compte.id):
-            balance += trans.montant
-        else:
-            balance -= trans.montant
-        
-        if date_key not in daily_data:
-            daily_data[date_key] = balance
-        else:
-            daily_data[date_key] = balance
-    
-    # Prepare chart data
-    dates = sorted(daily_data.keys())
-    balances = [daily_data[d] for d in dates]
-    
-    if not dates:
-        # No transactions, show current balance
-        dates = [today.date()]
-        balances = [compte.solde]
-    
-    # Create chart
-    plt.figure(figsize=(12, 6))
-    plt.plot(dates, balances, marker='o', linewidth=2, color='#0d6efd', markersize=4)
-    plt.fill_between(range(len(dates)), balances, alpha=0.3, color='#0d6efd')
-    plt.title(f'Évolution du Solde - {compte.iban}', fontsize=14, fontweight='bold')
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel('Solde (€)', fontsize=12)
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
-    # Convert to base64
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-    buffer.seek(0)
-    chart_data = base64.b64encode(buffer.getvalue()).decode()
-    plt.close()
-    
-    # Calculate statistics
-    last_30_days = today - timedelta(days=30)
-    transactions_30 = BankTransaction.objects.filter(
-        Q(compte_source=compte) | Q(compte_destination=compte),
-        date_transaction__gte=last_30_days
-    )
+    # Série journalière des 90 derniers jours (calcul vectorisé, voir analytics.py)
+    today = timezone.localdate()
+    serie = serie_soldes(compte, jours=90)
     
-    total_depots = transactions_30.filter(type_transaction='DEPOT').aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
-    total_retraits = transactions_30.filter(type_transaction='RETRAIT').aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
-    total_virements_out = transactions_30.filter(type_transaction='VIREMENT', compte_source=compte).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
-    total_virements_in = transactions_30.filter(type_transaction='VIREMENT', compte_destination=compte).aggregate(Sum('montant'))['montant__sum'] or Decimal('0')
+    # Statistiques des 30 derniers jours
+    indicateurs_30 = indicateurs(serie, fenetre=30)
     
     context = {
         'compte': compte,
-        'chart_data': chart_data,
-        'total_depots': total_depots,
-        'total_retraits': total_retraits,
-        'total_virements_out': total_virements_out,
-        'total_virements_in': total_virements_in,
-        'transaction_count': transactions_30.count(),
-        'balance_min': min(balances) if balances else compte.solde,
-        'balance_max': max(balances) if balances else compte.solde,
+        'balance_min': indicateurs_30['solde_min'],
+        'balance_max': indicateurs_30['solde_max'],
+        'indicateurs': indicateurs_30,
     }
+    context.update(totaux_par_type(serie, today - timedelta(days=29)))
     
     return render(request, 'banking/statistiques.html', context)
 
 
-def historique_transactions(request):
-    """Global transaction history with filters"""
-    transactions = BankTransaction.objects.select_related('compte_source', 'compte_destination', 'compte_source__client', 'compte_destination__client').all()
+def api_courbe_solde(request, compte_id):
+    """JSON balance curve, downsampled server-side with LTTB to ``points`` points"""
+    compte = get_object_or_404(Compte, id=compte_id)
+    try:
+        jours = int(request.GET.get('jours', 90))
+        points = int(request.GET.get('points', POINTS_COURBE_DEFAUT))
+    except ValueError:
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+    if not (1 <= jours <= JOURS_ANALYSE_MAX and 3 <= points <= POINTS_COURBE_MAX):
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+    
+    return JsonResponse(courbe_soldes(compte, jours=jours, points=points))
+
+
+def graphique_solde(request, compte_id):
+    """Server-rendered PNG of the 90-day balance (fallback without JavaScript), cached"""
+    compte = get_object_or_404(Compte, id=compte_id)
     
-    # Filtrage par type
-    type_filtre = request.GET.get('type')
-    if type_filtre:
-        transactions = transactions.filter(type_transaction=type_filtre)
+    # La clé change avec le jour et à chaque nouvelle transaction du compte
+    derniere = BankTransaction.objects.filter(
+        Q(compte_source=compte) | Q(compte_destination=compte)
+    ).aggregate(Max('id'))['id__max']
+    cle = f'graphique_solde:{compte.id}:{timezone.localdate()}:{derniere}'
+    png = cache.get(cle)
+    
+    if png is None:
+        courbe = courbe_soldes(compte, jours=90, points=POINTS_COURBE_DEFAUT)
+        dates = [datetime.strptime(d, '%Y-%m-%d').date() for d in courbe['dates']]
+        balances = courbe['soldes']
         
-    # Filtrage par période
-    periode = request.GET.get('periode')
-    today = datetime.now()
-    if periode == '7d':
-        date_debut = today - timedelta(days=7)
-        transactions = transactions.filter(date_transaction__gte=date_debut)
-    elif periode == '30d':
-        date_debut = today - timedelta(days=30)
-        transactions = transactions.filter(date_transaction__gte=date_debut)
-    elif periode == 'last_month':
-        first_day_current_month = today.replace(day=1)
-        last_day_last_month = first_day_current_month - timedelta(days=1)
-        first_day_last_month = last_day_last_month.replace(day=1)
-        transactions = transactions.filter(
-            date_transaction__date__gte=first_day_last_month.date(),
-            date_transaction__date__lte=last_day_last_month.date()
-        )
-
-    # Filtrage par montant min/max
-    montant_min = request.GET.get('montant_min')
-    if montant_min:
-        try:
-            transactions = transactions.filter(montant__gte=Decimal(montant_min))
-        except:
-            pass
+        plt.figure(figsize=(12, 6))
+        plt.plot(dates, balances, marker='o', linewidth=2, color='#0d6efd', markersize=4)
+        plt.fill_between(dates, balances, alpha=0.3, color='#0d6efd')
+        plt.title(f'Évolution du Solde - {compte.iban}', fontsize=14, fontweight='bold')
+        plt.xlabel('Date', fontsize=12)
+        plt.ylabel('Solde (€)', fontsize=12)
+        plt.grid(True, alpha=0.3)
+        plt.xticks(rotation=45)
+        plt.tight_layout()
         
-    montant_max = request.GET.get('montant_max')
-    if montant_max:
-        try:
-            transactions = transactions.filter(montant__lte=Decimal(montant_max))
-        except:
-            pass
+        buffer = BytesIO()
+        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+        plt.close()
+        png = buffer.getvalue()
+        cache.set(cle, png, DUREE_CACHE_GRAPHIQUE)
+    
+    return HttpResponse(png, content_type='image/png')
+
+
+def api_statistiques_compte(request, compte_id):
+    """JSON balance series and indicators for any period and window"""
+    compte = get_object_or_404(Compte, id=compte_id)
+    try:
+        jours = int(request.GET.get('jours', 90))
+        fenetre = int(request.GET.get('fenetre', 30))
+        fenetre_mobile = int(request.GET.get('fenetre_mobile', 7))
+    except ValueError:
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+    if not (1 <= jours <= JOURS_ANALYSE_MAX and 1 <= fenetre and 1 <= fenetre_mobile):
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+    
+    resultat = analyser_compte(compte, jours=jours, fenetre=fenetre, fenetre_mobile=fenetre_mobile)
+    return JsonResponse(resultat)
+
+
+@lecture_replique
+def historique_transactions(request):
+    """Global transaction history with filters, merged across shards"""
+    transactions = BankTransaction.objects.select_related(
+        'compte_source', 'compte_destination', 'compte_source__client', 'compte_destination__client'
+    ).order_by('-date_transaction')
+
+    formulaire = FiltresHistoriqueForm(request.GET)
+    filtres = formulaire.filtres()
+    # Un filtre invalide est signalé et ignoré, les autres s'appliquent
+    for champ, erreurs in formulaire.errors.items():
+        for erreur in erreurs:
+            messages.error(request, f"{formulaire.fields[champ].label} : {erreur}")
+
+    if sharding_actif():
+        # Filtres résolus sur chaque shard (comptes d'un IBAN ou d'un client), lignes fusionnées par date
+        parties, dernieres = [], []
+        for alias in liste_shards():
+            with shard(alias):
+                parties.append(formulaire.filtrer(transactions).using(alias))
+                dernieres.append(BankTransaction.objects.aggregate(Max('id'))['id__max'])
+        transactions = fusionner(parties)
+    else:
+        transactions = formulaire.filtrer(transactions)
+        dernieres = [BankTransaction.objects.aggregate(Max('id'))['id__max']]
+
+    # Clé du fragment : filtres valides, dernière transaction de chaque shard et version des noms de clients ;
+    # en cas de succès les transactions ne sont jamais lues
+    cle_fragment = [
+        *(f"{champ}={valeur}" for champ, valeur in sorted(filtres.items())),
+        ','.join(str(derniere) for derniere in dernieres),
+        version_fragments('clients'),
+    ]
+    if filtres.get('periode') in FiltresHistoriqueForm.PERIODES_GLISSANTES:
+        # Fenêtre glissante : le contenu change avec l'heure
+        cle_fragment.append(timezone.localtime().strftime('%Y%m%d%H'))
 
     context = {
-        'transactions': transactions.order_by('-date_transaction'),
+        'transactions': transactions,
+        'cle_fragment': ':'.join(str(partie) for partie in cle_fragment),
         'type_choices': BankTransaction.TYPE_CHOICES,
-        'filters': {
-            'type': type_filtre,
-            'periode': periode,
-            'montant_min': montant_min,
-            'montant_max': montant_max,
-        },
+        'periode_choices': FiltresHistoriqueForm.PERIODE_CHOICES[1:],
+        'filters': {champ: request.GET.get(champ, '') for champ in formulaire.fields},
         'DEVISE': DEVISE
     }
     return render(request, 'banking/historique_transactions.html', context)
+
+
+def statistiques_banque(request):
+    """Bank-wide management report, read from the rollup tables only"""
+    try:
+        jours = int(request.GET.get('jours', 30))
+    except ValueError:
+        jours = 30
+    jours = max(1, min(jours, JOURS_ANALYSE_MAX))
+
+    par_type = statistiques_par_type()
+    libelles = dict(Compte.TYPE_CHOICES)
+    for ligne in par_type:
+        ligne['libelle'] = libelles.get(ligne['type_compte'], ligne['type_compte'])
+
+    context = {
+        'jours': jours,
+        'par_jour': statistiques_journalieres(jours),
+        'par_type': par_type,
+        'comptes_actifs': sum(l['comptes_actifs'] for l in par_type),
+        'encours_total': sum((l['encours_total'] for l in par_type), Decimal('0')),
+        'DEVISE': DEVISE
+    }
+    return render(request, 'banking/statistiques_banque.html', context)
+
+
+def api_recherche_iban(request):
+    """IBAN prefix lookup for the transfer form autocomplete"""
+    return JsonResponse({'resultats': rechercher_ibans(request.GET.get('q', ''))})
+
+
+def _lire_json(request):
+    """Decode the JSON object body of an API request"""
+    try:
+        donnees = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ValueError("Corps JSON invalide")
+    if not isinstance(donnees, dict):
+        raise ValueError("Le corps JSON doit être un objet")
+    return donnees
+
+
+def _montant_json(donnees):
+    """Parse the montant field of an API payload: finite, to the centime, within the column's digits"""
+    try:
+        montant = Decimal(str(donnees.get('montant', '')))
+    except InvalidOperation:
+        raise ValueError("Montant invalide")
+    if not montant.is_finite():
+        raise ValueError("Montant invalide")
+    if montant.normalize().as_tuple().exponent < -2:
+        raise ValueError("Le montant doit être exprimé au centime près")
+    if montant.adjusted() >= MONTANT_CHIFFRES_MAX - 2:
+        raise ValueError("Montant trop élevé")
+    return montant
+
+
+def _reponse_api(request, operation, parametres, fonction, atomique=True):
+    """Run an idempotent write operation and wrap the outcome as JSON"""
+    try:
+        resultat, rejoue = executer_une_fois(cle_depuis_requete(request), operation, parametres, fonction, atomique)
+    except OperationEnCours as e:
+        return JsonResponse({'erreur': str(e)}, status=409)
+    except CleIdempotenceConflit as e:
+        return JsonResponse({'erreur': str(e)}, status=422)
+    except Compte.DoesNotExist:
+        return JsonResponse({'erreur': "Compte introuvable"}, status=404)
+    except ValueError as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+
+    response = JsonResponse(resultat, status=200 if rejoue else 201)
+    response['Idempotent-Replayed'] = 'true' if rejoue else 'false'
+    return response
+
+
+@csrf_exempt
+@require_POST
+@controle_admission(reponse_json=True)
+def api_depot(request, compte_id):
+    """JSON deposit endpoint honouring the Idempotency-Key header"""
+    try:
+        donnees = _lire_json(request)
+        montant = _montant_json(donnees)
+    except ValueError as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+    description = donnees.get('description', '')
+    return _reponse_api(
+        request, f'depot:{compte_id}', {'montant': montant, 'description': description},
+        lambda: effectuer_depot(compte_id, montant, description)
+    )
+
+
+@csrf_exempt
+@require_POST
+@controle_admission(reponse_json=True)
+def api_retrait(request, compte_id):
+    """JSON withdrawal endpoint honouring the Idempotency-Key header"""
+    try:
+        donnees = _lire_json(request)
+        montant = _montant_json(donnees)
+    except ValueError as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+    description = donnees.get('description', '')
+    return _reponse_api(
+        request, f'retrait:{compte_id}', {'montant': montant, 'description': description},
+        lambda: effectuer_retrait(compte_id, montant, description)
+    )
+
+
+@csrf_exempt
+@require_POST
+@controle_admission(reponse_json=True, destination=_destination_json)
+def api_virement(request, compte_id):
+    """JSON transfer endpoint honouring the Idempotency-Key header"""
+    try:
+        donnees = _lire_json(request)
+        montant = _montant_json(donnees)
+    except ValueError as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+    iban_dest = donnees.get('iban_destination', '')
+    description = donnees.get('description', '')
+    try:
+        intershard = virement_intershard(compte_id, iban_dest)
+    except Compte.DoesNotExist:
+        return JsonResponse({'erreur': "Compte introuvable"}, status=404)
+    # Vers un autre shard le débit est validé avant le crédit, hors de la transaction de la clé
+    return _reponse_api(
+        request, f'virement:{compte_id}',
+        {'iban_destination': iban_dest, 'montant': montant, 'description': description},
+        lambda: effectuer_virement(compte_id, iban_dest, montant, description),
+        atomique=not intershard,
+    )
+
+
+def api_evenements(request):
+    """
+    Change feed over the outbox: events after ``apres`` (or after the stored
+    cursor of ``consommateur``), oldest first, at most ``limite`` per page.
+    """
+    consommateur = request.GET.get('consommateur', '')
+    try:
+        positions = lire_position(request.GET['apres']) if 'apres' in request.GET else curseurs(consommateur)
+        limite = int(request.GET.get('limite', LIMITE_DEFAUT))
+    except ValueError:
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+    if not 1 <= limite <= LIMITE_MAX:
+        return JsonResponse({'erreur': "Paramètres invalides"}, status=400)
+
+    lus = lire_flux(positions, limite)
+    return JsonResponse({
+        'evenements': [serialiser(evenement, alias) for alias, evenement in lus],
+        'curseur': formater_position(avancer(positions, lus)),
+        'encore': len(lus) == limite,
+    })
+
+
+@csrf_exempt
+@require_POST
+def api_acquitter_evenements(request):
+    """Acknowledge every event up to ``curseur`` for a named consumer"""
+    try:
+        donnees = _lire_json(request)
+        consommateur = str(donnees.get('consommateur', '')).strip()
+        if not consommateur:
+            raise ValueError("Consommateur requis")
+        positions = acquitter_flux(consommateur, lire_position(donnees.get('curseur', '')))
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'erreur': str(e)}, status=400)
+    return JsonResponse({'consommateur': consommateur, 'curseur': formater_position(positions)})
+
+
+def api_admission_metriques(request):
+    """Per-account admission control state of this worker process"""
+    limiteur = limiteur_courant()
+    return JsonResponse(limiteur.metriques() if limiteur else {'mode': 'aucun'})
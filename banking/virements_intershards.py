@@ -0,0 +1,189 @@
+"""
+Transfers between accounts living on two different shards.
+
+No database transaction spans two shards, so such a transfer is a durable
+two-step protocol keyed by a UUID ``reference``:
+
+1. on the source shard, in one transaction: lock and debit the source, record
+   the debit leg (VIREMENT without destination account, ``iban_contrepartie``
+   set) and a ``VirementInterShard`` row in state DEBITE, with the outbox
+   event and the rollups;
+2. on the destination shard, in one transaction: lock and credit the
+   destination and record the credit leg carrying the same reference, unique
+   on the shard, which makes this step idempotent;
+3. on the source shard, mark the row TERMINE.
+
+A crash between 1 and 3 leaves a DEBITE row. ``reprendre_virements_intershards``
+(command of the same name, run at startup and then periodically) replays step
+2, a no-op when the credit leg already exists, then step 3. A destination that
+can no longer be credited (closed or removed) gets the source re-credited and
+the row ANNULE. At any time, balances plus DEBITE amounts add up to a constant.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from .anomalies import noter_operation
+from .models import Compte, Transaction as BankTransaction, VirementInterShard
+from .outbox import publier_transaction
+from .rollups import comptabiliser_transaction
+from .shards import liste_shards, shard, shard_par_identifiant
+
+logger = logging.getLogger(__name__)
+
+DELAI_REPRISE = timedelta(seconds=30)  # laisse aux virements en cours le temps de finir seuls
+
+
+class CreditImpossible(Exception):
+    """The destination account cannot receive the transfer any more"""
+
+
+def _debiter(compte_id, destination_id, iban_destination, montant, description):
+    alias = shard_par_identifiant(compte_id)
+    with shard(alias), transaction.atomic(using=alias):
+        source = Compte.objects.select_for_update().get(id=compte_id)
+        if source.solde < montant:
+            raise ValueError("Solde insuffisant sur le compte source.")
+        source.solde -= montant
+        source.derniere_activite = timezone.now()
+        source.save(update_fields=['solde', 'derniere_activite'])
+
+        reference = uuid.uuid4()
+        trans = BankTransaction.objects.create(
+            compte_source=source,
+            type_transaction='VIREMENT',
+            montant=montant,
+            description=description,
+            iban_contrepartie=iban_destination,
+            reference=reference,
+        )
+        virement = VirementInterShard.objects.create(
+            reference=reference,
+            compte_source=source,
+            iban_destination=iban_destination,
+            compte_destination_id=destination_id,
+            montant=montant,
+            description=description,
+        )
+        publier_transaction(trans, source.solde)
+        comptabiliser_transaction(trans, source.type_compte)
+        noter_operation(trans)
+    return virement, trans
+
+
+def _crediter(virement, iban_source):
+    """Step 2 on the destination shard; returns the credit leg, the existing one if already applied"""
+    alias = shard_par_identifiant(virement.compte_destination_id)
+    with shard(alias), transaction.atomic(using=alias):
+        # Verrou d'abord : deux reprises concurrentes voient l'une après l'autre la jambe crédit
+        destination = Compte.objects.select_for_update().filter(id=virement.compte_destination_id).first()
+        deja = BankTransaction.objects.filter(reference=virement.reference).first()
+        if deja is not None:
+            return deja
+        if destination is None or not destination.actif:
+            raise CreditImpossible("Compte de destination introuvable ou inactif")
+
+        destination.solde += virement.montant
+        destination.derniere_activite = timezone.now()
+        destination.save(update_fields=['solde', 'derniere_activite'])
+        trans = BankTransaction.objects.create(
+            compte_destination=destination,
+            type_transaction='VIREMENT',
+            montant=virement.montant,
+            description=virement.description,
+            iban_contrepartie=iban_source,
+            reference=virement.reference,
+        )
+        publier_transaction(trans, None, destination.solde)
+        comptabiliser_transaction(trans, None, destination.type_compte)
+    return trans
+
+
+def _terminer(virement):
+    alias = shard_par_identifiant(virement.compte_source_id)
+    VirementInterShard.objects.using(alias).filter(pk=virement.pk, statut='DEBITE').update(
+        statut='TERMINE', date_maj=timezone.now()
+    )
+    virement.statut = 'TERMINE'
+
+
+def _annuler(virement, motif):
+    """Re-credit the source of a transfer that cannot be delivered"""
+    alias = shard_par_identifiant(virement.compte_source_id)
+    with shard(alias), transaction.atomic(using=alias):
+        if not VirementInterShard.objects.select_for_update().filter(pk=virement.pk, statut='DEBITE').exists():
+            return
+        source = Compte.objects.select_for_update().get(id=virement.compte_source_id)
+        source.solde += virement.montant
+        source.derniere_activite = timezone.now()
+        source.save(update_fields=['solde', 'derniere_activite'])
+        trans = BankTransaction.objects.create(
+            compte_destination=source,
+            type_transaction='VIREMENT',
+            montant=virement.montant,
+            description=f"Annulation virement {virement.reference} : {motif}",
+            iban_contrepartie=virement.iban_destination,
+        )
+        publier_transaction(trans, None, source.solde)
+        comptabiliser_transaction(trans, None, source.type_compte)
+        VirementInterShard.objects.filter(pk=virement.pk).update(statut='ANNULE', motif=motif, date_maj=timezone.now())
+    virement.statut = 'ANNULE'
+
+
+def _achever(virement, iban_source):
+    """Steps 2 and 3, or the cancellation; returns the final status"""
+    try:
+        _crediter(virement, iban_source)
+    except IntegrityError:
+        # Jambe crédit insérée par une reprise concurrente
+        pass
+    except CreditImpossible as e:
+        _annuler(virement, str(e))
+        return virement.statut
+    _terminer(virement)
+    return virement.statut
+
+
+def effectuer_virement_intershard(compte_id, destination_id, iban_destination, montant, description=''):
+    """Transfer to an account of another shard; the result has the transfer ``reference`` and ``statut``"""
+    virement, trans = _debiter(compte_id, destination_id, iban_destination, montant, description)
+    try:
+        statut = _achever(virement, virement.compte_source.iban)
+    except DatabaseError:
+        # Débit validé : le crédit sera appliqué par la reprise
+        logger.warning("Crédit du virement %s différé", virement.reference, exc_info=True)
+        statut = virement.statut
+    if statut == 'ANNULE':
+        raise ValueError("Le compte de destination ne peut pas recevoir de virement ; le compte source a été recrédité.")
+    return {
+        'transaction_id': trans.id,
+        'type_transaction': trans.type_transaction,
+        'compte_id': compte_id,
+        'montant': str(trans.montant),
+        'solde': str(virement.compte_source.solde),
+        'iban_destination': iban_destination,
+        'reference': str(virement.reference),
+        'statut': statut,
+    }
+
+
+def reprendre_virements_intershards(delai=DELAI_REPRISE, maintenant=None):
+    """Finish or cancel the transfers left DEBITE for more than ``delai`` on every shard; returns the counts"""
+    limite = (maintenant or timezone.now()) - delai
+    rapport = {'termines': 0, 'annules': 0, 'en_echec': 0}
+    for alias in liste_shards():
+        en_attente = list(VirementInterShard.objects.using(alias).select_related('compte_source').filter(
+            statut='DEBITE', date_creation__lte=limite
+        ).order_by('date_creation'))
+        for virement in en_attente:
+            try:
+                statut = _achever(virement, virement.compte_source.iban)
+            except DatabaseError:
+                logger.warning("Reprise du virement %s en échec", virement.reference, exc_info=True)
+                rapport['en_echec'] += 1
+                continue
+            rapport['termines' if statut == 'TERMINE' else 'annules'] += 1
+    return rapport
@@ -0,0 +1,176 @@
+"""
+Batch execution of standing orders (virements permanents).
+
+Due orders are listed once, sorted by source account, and cut into chunks that
+never split an account's orders across two transactions. Each chunk runs in one
+atomic block: its orders are re-read under lock, every account it touches is
+locked in id order (the order ``effectuer_virement`` uses, so the batch cannot
+deadlock with online transfers), balances are applied in memory, then written
+back with a single ``executemany`` while the transfers, their outbox events and
+their outcomes are inserted with ``bulk_create`` and the rollups are moved once
+per row touched.
+"""
+import calendar
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    Compte, EvenementOutbox, ExecutionVirementPermanent, Transaction as BankTransaction, VirementPermanent
+)
+from .monnaie import vers_centimes
+from .outbox import evenement_transaction
+from .rollups import comptabiliser_lot
+from .shards import base_courante, liste_shards, shard
+
+TAILLE_LOT = 500
+
+
+def prochaine_echeance(frequence, date_debut, echeance):
+    """Due date following ``echeance``; monthly orders keep the day of ``date_debut``"""
+    if frequence == 'QUOTIDIEN':
+        return echeance + timedelta(days=1)
+    if frequence == 'HEBDOMADAIRE':
+        return echeance + timedelta(weeks=1)
+    annee, mois = divmod(echeance.year * 12 + echeance.month, 12)
+    # Le 31 devient le 30 ou le 28 selon le mois, puis revient au 31
+    jour = min(date_debut.day, calendar.monthrange(annee, mois + 1)[1])
+    return echeance.replace(year=annee, month=mois + 1, day=jour)
+
+
+def ordres_dus(jour):
+    """Active standing orders due on or before ``jour``"""
+    return VirementPermanent.objects.filter(
+        Q(date_fin__isnull=True) | Q(date_fin__gte=F('prochaine_execution')),
+        actif=True,
+        prochaine_execution__lte=jour,
+    )
+
+
+def _lots(ordres, taille_lot):
+    """Chunks of (id, compte_source_id) pairs; an account's orders stay together"""
+    lot = []
+    for ordre in ordres:
+        if len(lot) >= taille_lot and ordre[1] != lot[-1][1]:
+            yield lot
+            lot = []
+        lot.append(ordre)
+    if lot:
+        yield lot
+
+
+def _executer_lot(ids, jour):
+    """Execute one chunk of orders atomically; returns the per-order outcomes"""
+    with transaction.atomic(using=base_courante()):
+        ordres = list(
+            ordres_dus(jour).select_for_update().filter(id__in=ids)
+            .order_by('compte_source_id', 'id')
+        )
+        comptes_ids = {o.compte_source_id for o in ordres} | {o.compte_destination_id for o in ordres}
+        comptes = {
+            pk: [solde, actif, type_compte] for pk, solde, actif, type_compte in
+            Compte.objects.select_for_update().filter(id__in=comptes_ids)
+            .order_by('id').values_list('id', 'solde', 'actif', 'type_compte')
+        }
+
+        virements, modifies = [], set()
+        issues = []
+        for ordre in ordres:
+            source = comptes[ordre.compte_source_id]
+            destination = comptes[ordre.compte_destination_id]
+            if not (source[1] and destination[1]):
+                issues.append((ordre, None, "Compte inactif"))
+                continue
+            if source[0] < ordre.montant:
+                issues.append((ordre, None, "Solde insuffisant sur le compte source."))
+                continue
+
+            source[0] -= ordre.montant
+            destination[0] += ordre.montant
+            modifies.update((ordre.compte_source_id, ordre.compte_destination_id))
+            virement = BankTransaction(
+                compte_source_id=ordre.compte_source_id,
+                compte_destination_id=ordre.compte_destination_id,
+                type_transaction='VIREMENT',
+                montant=ordre.montant,
+                description=f"Virement permanent #{ordre.id}" + (f" - {ordre.description}" if ordre.description else ''),
+            )
+            virements.append((virement, source[0], destination[0]))
+            issues.append((ordre, virement, ''))
+
+        # executemany plutôt que bulk_update : pas d'énorme CASE WHEN à compiler
+        connexion = connections[base_courante()]
+        activite = connexion.ops.adapt_datetimefield_value(timezone.now())
+        with connexion.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {Compte._meta.db_table} SET solde = %s, derniere_activite = %s WHERE id = %s",
+                [(vers_centimes(comptes[pk][0]), activite, pk) for pk in sorted(modifies)]
+            )
+        BankTransaction.objects.bulk_create([virement for virement, _, _ in virements])
+        EvenementOutbox.objects.bulk_create([
+            evenement_transaction(virement, solde_source, solde_destination)
+            for virement, solde_source, solde_destination in virements
+        ])
+        comptabiliser_lot([
+            (virement, comptes[virement.compte_source_id][2], comptes[virement.compte_destination_id][2])
+            for virement, _, _ in virements
+        ])
+        ExecutionVirementPermanent.objects.bulk_create([
+            ExecutionVirementPermanent(
+                ordre=ordre,
+                date_echeance=ordre.prochaine_execution,
+                statut='EXECUTE' if virement else 'REJETE',
+                motif=motif,
+                transaction=virement,
+            )
+            for ordre, virement, motif in issues
+        ])
+
+        # Une échéance est consommée qu'elle soit exécutée ou rejetée :
+        # regroupement par nouvelle date pour n'émettre que quelques UPDATE
+        avances = defaultdict(list)
+        for ordre in ordres:
+            suivante = prochaine_echeance(ordre.frequence, ordre.date_debut, ordre.prochaine_execution)
+            actif = ordre.date_fin is None or suivante <= ordre.date_fin
+            avances[(suivante, actif)].append(ordre.id)
+        for (suivante, actif), ordre_ids in avances.items():
+            VirementPermanent.objects.filter(id__in=ordre_ids).update(prochaine_execution=suivante, actif=actif)
+
+    return [
+        (ordre.id, ordre.prochaine_execution, 'EXECUTE' if virement else 'REJETE', motif, virement.id if virement else None)
+        for ordre, virement, motif in issues
+    ]
+
+
+def executer_virements_permanents(jour=None, taille_lot=TAILLE_LOT):
+    """
+    Execute every standing order due on ``jour`` (today by default).
+
+    Each order runs at most once per due date; an order late by several
+    periods catches up one period per run. Returns a report with counts and
+    the per-order outcomes ``(ordre_id, echeance, statut, motif, transaction_id)``.
+    """
+    jour = jour or timezone.localdate()
+    debut = time.perf_counter()
+    resultats, lots = [], 0
+    # Un ordre et ses deux comptes sont sur le même shard
+    for alias in liste_shards():
+        with shard(alias):
+            a_traiter = list(ordres_dus(jour).order_by('compte_source_id', 'id').values_list('id', 'compte_source_id'))
+            for lot in _lots(a_traiter, taille_lot):
+                resultats.extend(_executer_lot([pk for pk, _ in lot], jour))
+                lots += 1
+
+    executes = sum(1 for r in resultats if r[2] == 'EXECUTE')
+    return {
+        'jour': jour,
+        'executes': executes,
+        'rejetes': len(resultats) - executes,
+        'lots': lots,
+        'duree': time.perf_counter() - debut,
+        'resultats': resultats,
+    }
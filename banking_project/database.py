@@ -0,0 +1,99 @@
+"""
+Database configuration built from environment variables.
+
+SQLite connections get WAL journaling, a busy timeout and relaxed fsync on
+creation so readers no longer block behind writers. PostgreSQL connections are
+persistent (CONN_MAX_AGE) with health checks and TCP keepalives; pooling is
+delegated to an external pooler such as PgBouncer (``DB_POOLER=pgbouncer``).
+
+An optional read replica (``DB_REPLICA_*``) gets the same settings; its
+variables default to the primary's, so only ``DB_REPLICA_NAME`` (SQLite) or
+``DB_REPLICA_HOST`` (PostgreSQL) usually has to be set.
+
+Extra shards (``DB_SHARDS``, a comma-separated list of database names or SQLite
+files) are aliased ``shard1``, ``shard2``… and share the primary's other
+settings; ``default`` is always the first shard.
+"""
+import os
+
+# Appliqués à chaque nouvelle connexion SQLite (voir appliquer_pragmas_sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,  # ms
+    'synchronous': 'NORMAL',  # sûr en WAL : seul le dernier commit peut être perdu en cas de coupure
+}
+
+
+def _entier(nom, defaut):
+    return int(os.environ.get(nom, defaut))
+
+
+def configuration_base_de_donnees(base_dir):
+    """Settings dict for the ``default`` alias"""
+    engine = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+    config = {
+        'ENGINE': engine,
+        'NAME': os.environ.get('DB_NAME', base_dir / 'db.sqlite3'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # Connexions persistantes, vérifiées avant réutilisation
+        'CONN_MAX_AGE': _entier('DB_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+
+    if engine.endswith('sqlite3'):
+        # Délai d'attente du pilote aligné sur busy_timeout (secondes)
+        config['OPTIONS']['timeout'] = SQLITE_PRAGMAS['busy_timeout'] / 1000
+        # Base de test sur fichier : les tests concurrents ouvrent une connexion par thread
+        config['TEST'] = {'NAME': base_dir / 'test_db.sqlite3'}
+    elif 'postgresql' in engine:
+        config['OPTIONS'].update({
+            'connect_timeout': _entier('DB_CONNECT_TIMEOUT', 5),
+            'keepalives': 1,
+            'keepalives_idle': 30,
+            'keepalives_interval': 10,
+            'keepalives_count': 3,
+        })
+        if os.environ.get('DB_POOLER') == 'pgbouncer':
+            # PgBouncer en mode transaction : les curseurs serveur ne survivent pas à la transaction
+            config['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+    return config
+
+
+def configuration_replique(base_dir):
+    """Settings dict for the read replica alias, or None when no replica is configured"""
+    if not (os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST')):
+        return None
+    config = configuration_base_de_donnees(base_dir)
+    for cle in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT'):
+        config[cle] = os.environ.get(f'DB_REPLICA_{cle}', config[cle])
+    # Tests : la réplique est un miroir de la base de test du primaire
+    config['TEST'] = {'MIRROR': 'default'}
+    return config
+
+
+def configuration_shards(base_dir):
+    """Settings dicts of the extra shard aliases, in shard order"""
+    noms = [nom.strip() for nom in os.environ.get('DB_SHARDS', '').split(',') if nom.strip()]
+    shards = {}
+    for numero, nom in enumerate(noms, start=1):
+        alias = f'shard{numero}'
+        config = configuration_base_de_donnees(base_dir)
+        config['NAME'] = nom
+        if config['ENGINE'].endswith('sqlite3'):
+            config['TEST'] = {'NAME': base_dir / f'test_db_{alias}.sqlite3'}
+        shards[alias] = config
+    return shards
+
+
+def appliquer_pragmas_sqlite(sender, connection, **kwargs):
+    """connection_created handler setting the SQLite pragmas"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nom, valeur in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {nom} = {valeur}")
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
+
+from .database import configuration_base_de_donnees, configuration_replique, configuration_shards
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,9 +45,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'banking.profilage.ProfilageMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'banking.routage.EcritureRecenteMiddleware',
+    'banking.shards.ShardMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -53,12 +59,20 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'banking_project.urls'
 
+CHARGEURS_TEMPLATES = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # En production, chaque template n'est compilé qu'une fois par processus
+            'loaders': CHARGEURS_TEMPLATES if DEBUG else [
+                ('django.template.loaders.cached.Loader', CHARGEURS_TEMPLATES),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -76,15 +90,25 @@ WSGI_APPLICATION = 'banking_project.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 # PostgreSQL configuration (use environment variables or SQLite as fallback)
+# Persistent connections, SQLite pragmas and pooling options: see banking_project/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3'),
-        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
-        'USER': os.environ.get('DB_USER', ''),
-        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
-        'HOST': os.environ.get('DB_HOST', ''),
-        'PORT': os.environ.get('DB_PORT', ''),
-    }
+    'default': configuration_base_de_donnees(BASE_DIR),
+}
+
+# Clients, comptes et transactions répartis par identifiant client (banking.shards)
+_shards = configuration_shards(BASE_DIR)
+DATABASES.update(_shards)
+SHARDS = ['default', *_shards]
+
+# Réplique en lecture des vues de consultation (banking.routage)
+_replique = configuration_replique(BASE_DIR)
+if _replique:
+    DATABASES['replica'] = _replique
+DATABASE_ROUTERS = ['banking.shards.RouteurShards', 'banking.routage.RouteurReplique']
+REPLIQUE_LECTURE = {
+    'ALIAS': 'replica',
+    'FENETRE_ECRITURE': float(os.environ.get('DB_REPLICA_FENETRE_ECRITURE', 5)),  # secondes
+    'REESSAI': float(os.environ.get('DB_REPLICA_REESSAI', 30)),  # secondes
 }
 
 # Example PostgreSQL configuration:
@@ -140,3 +164,59 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache par processus ; assez d'entrées pour les fragments d'une page de 1 000 lignes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 20000))},
+    }
+}
+
+# Durée de conservation des clés d'idempotence (heures)
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', 24))
+
+# Contrôle d'admission par compte sur les écritures : 'local' (par processus),
+# 'fichier' (partagé entre workers via REPERTOIRE) ou 'aucun'
+ADMISSION = {
+    'MODE': os.environ.get('ADMISSION_MODE', 'local'),
+    'CONCURRENCE_MAX': int(os.environ.get('ADMISSION_CONCURRENCE_MAX', 2)),
+    'FILE_MAX': int(os.environ.get('ADMISSION_FILE_MAX', 8)),
+    'ATTENTE_MAX': float(os.environ.get('ADMISSION_ATTENTE_MAX', 0.5)),  # secondes
+    'REPERTOIRE': os.environ.get('ADMISSION_REPERTOIRE', os.path.join(tempfile.gettempdir(), 'banking-admission')),
+    'BANDES': int(os.environ.get('ADMISSION_BANDES', 1024)),  # mode fichier : comptes répartis sur ces bandes
+}
+
+# Profilage cProfile à la demande : échantillon TAUX des requêtes, ou en-tête
+# X-Profilage égal à JETON ; profils + requêtes SQL dans REPERTOIRE (rotation)
+PROFILAGE = {
+    'ACTIF': os.environ.get('PROFILAGE_ACTIF', 'False') == 'True',
+    'TAUX': float(os.environ.get('PROFILAGE_TAUX', 0)),
+    'JETON': os.environ.get('PROFILAGE_JETON', ''),
+    'REPERTOIRE': os.environ.get('PROFILAGE_REPERTOIRE', os.path.join(tempfile.gettempdir(), 'banking-profils')),
+    'MAX_FICHIERS': int(os.environ.get('PROFILAGE_MAX_FICHIERS', 200)),
+}
+
+# Relevés des mois clôturés archivés sous RACINE (chemin = empreinte SHA-256) ;
+# SENDFILE délègue l'envoi au serveur web : 'x-accel-redirect' (nginx, préfixe
+# URL_INTERNE d'un emplacement internal) ou 'x-sendfile' (Apache, lighttpd)
+RELEVES_ARCHIVE = {
+    'RACINE': os.environ.get('RELEVES_RACINE', str(BASE_DIR / 'archives' / 'releves')),
+    'SENDFILE': os.environ.get('RELEVES_SENDFILE', ''),
+    'URL_INTERNE': os.environ.get('RELEVES_URL_INTERNE', '/releves-archives/'),
+}
+
+# Notation des retraits et virements : z-score du montant (Welford) et vélocité
+# par compte, les opérations signalées vont dans la file de revue (admin)
+ANOMALIES = {
+    'SEUIL_Z': float(os.environ.get('ANOMALIES_SEUIL_Z', 4)),
+    'HISTORIQUE_MIN': int(os.environ.get('ANOMALIES_HISTORIQUE_MIN', 10)),
+    'FENETRE_VELOCITE': int(os.environ.get('ANOMALIES_FENETRE_VELOCITE', 3600)),  # secondes
+    'OPERATIONS_MAX_FENETRE': int(os.environ.get('ANOMALIES_OPERATIONS_MAX_FENETRE', 10)),
+}
+
+# Taux annuel des comptes épargne (base exact/365)
+TAUX_INTERET_EPARGNE = os.environ.get('TAUX_INTERET_EPARGNE', '0.025')
+
+# Un compte actif sans mouvement du titulaire depuis ce délai est dormant
+DORMANCE_DELAI_JOURS = int(os.environ.get('DORMANCE_DELAI_JOURS', 365))
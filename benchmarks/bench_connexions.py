@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark lecture/écriture concurrentes sur SQLite : réglages par défaut vs
+pragmas de banking_project/database.py (WAL, busy_timeout, synchronous).
+
+Usage :
+    python benchmarks/bench_connexions.py [lecteurs] [ecrivains] [secondes]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from banking_project.database import SQLITE_PRAGMAS
+
+NB_COMPTES = 1000
+
+
+def preparer(chemin):
+    connexion = sqlite3.connect(chemin)
+    connexion.executescript("""
+        CREATE TABLE compte (id INTEGER PRIMARY KEY, solde INTEGER NOT NULL);
+        CREATE TABLE mouvement (id INTEGER PRIMARY KEY, compte_id INTEGER, montant INTEGER);
+    """)
+    connexion.executemany("INSERT INTO compte(id, solde) VALUES (?, 0)", [(i,) for i in range(NB_COMPTES)])
+    connexion.commit()
+    connexion.close()
+
+
+def ouvrir(chemin, optimise):
+    connexion = sqlite3.connect(chemin, isolation_level=None, check_same_thread=False)
+    if optimise:
+        for nom, valeur in SQLITE_PRAGMAS.items():
+            connexion.execute(f"PRAGMA {nom} = {valeur}")
+    return connexion
+
+
+def executer(optimise, lecteurs, ecrivains, duree):
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, 'bench.sqlite3')
+        preparer(chemin)
+        compteurs = {'lectures': 0, 'ecritures': 0, 'erreurs': 0}
+        verrou = threading.Lock()
+        fin = time.monotonic() + duree
+
+        def lire():
+            connexion = ouvrir(chemin, optimise)
+            n = 0
+            while time.monotonic() < fin:
+                try:
+                    connexion.execute("SELECT SUM(solde), COUNT(*) FROM compte").fetchone()
+                    n += 1
+                except sqlite3.OperationalError:
+                    with verrou:
+                        compteurs['erreurs'] += 1
+            with verrou:
+                compteurs['lectures'] += n
+
+        def ecrire(numero):
+            connexion = ouvrir(chemin, optimise)
+            n = 0
+            while time.monotonic() < fin:
+                compte_id = (numero * 7919 + n) % NB_COMPTES
+                try:
+                    connexion.execute("BEGIN IMMEDIATE")
+                    connexion.execute("UPDATE compte SET solde = solde + 1 WHERE id = ?", (compte_id,))
+                    connexion.execute("INSERT INTO mouvement(compte_id, montant) VALUES (?, 1)", (compte_id,))
+                    connexion.execute("COMMIT")
+                    n += 1
+                except sqlite3.OperationalError:
+                    if connexion.in_transaction:
+                        connexion.execute("ROLLBACK")
+                    with verrou:
+                        compteurs['erreurs'] += 1
+            with verrou:
+                compteurs['ecritures'] += n
+
+        threads = [threading.Thread(target=lire) for _ in range(lecteurs)]
+        threads += [threading.Thread(target=ecrire, args=(i,)) for i in range(ecrivains)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return compteurs
+
+
+def main():
+    lecteurs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    ecrivains = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    duree = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    print(f"{lecteurs} lecteurs, {ecrivains} écrivains, {duree:.0f} s par mode\n")
+    print(f"{'mode':<10} {'lectures/s':>12} {'écritures/s':>12} {'erreurs':>8}")
+    for nom, optimise in (('défaut', False), ('optimisé', True)):
+        resultat = executer(optimise, lecteurs, ecrivains, duree)
+        print(f"{nom:<10} {resultat['lectures'] / duree:>12.0f} {resultat['ecritures'] / duree:>12.0f} {resultat['erreurs']:>8}")
+
+
+if __name__ == '__main__':
+    main()
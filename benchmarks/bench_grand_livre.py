@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark du rejeu des soldes : instances de modèles contre GrandLivre.
+
+Sur une base SQLite temporaire de N transactions, mesure :
+- le rejeu par instances Transaction (``.iterator()``, montants Decimal) ;
+- le rejeu GrandLivre lu en flux (``values_list().iterator()``, centimes entiers) ;
+- le rejeu GrandLivre seul, lignes déjà en mémoire.
+
+Usage :
+    python benchmarks/bench_grand_livre.py [transactions] [comptes]
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+DOSSIER = tempfile.mkdtemp(prefix='bench-grand-livre-')
+os.environ['DB_NAME'] = os.path.join(DOSSIER, 'bench.sqlite3')
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'banking_project.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+
+from banking.grand_livre import charger_comptes, mouvements
+from banking.models import Compte, Transaction as BankTransaction
+from banking.monnaie import depuis_centimes
+
+TYPES = ('DEPOT', 'RETRAIT', 'VIREMENT')
+
+
+def remplir(nombre, nb_comptes):
+    """Accounts and transactions inserted directly, then balances set to opening + movements"""
+    generateur = random.Random(42)
+    soldes = [10_000_000] * nb_comptes
+    lignes = []
+    for _ in range(nombre):
+        type_transaction = generateur.choice(TYPES)
+        source = generateur.randrange(nb_comptes)
+        destination = generateur.randrange(nb_comptes) if type_transaction == 'VIREMENT' else None
+        montant = generateur.randint(1, 10_000)
+        soldes[source] += montant if type_transaction == 'DEPOT' else -montant
+        if destination is not None:
+            soldes[destination] += montant
+        lignes.append((type_transaction, source + 1, destination + 1 if destination is not None else None, montant))
+
+    base = sqlite3.connect(os.environ['DB_NAME'])
+    base.execute("INSERT INTO banking_client(id, nom, prenom, cni, email, telephone, adresse, date_creation) "
+                 "VALUES (1, 'Bench', 'Bench', 'BENCH', 'bench@example.cm', '', '', '2024-01-01')")
+    base.executemany(
+        "INSERT INTO banking_compte(id, client_id, iban, solde, solde_ouverture, type_compte, date_ouverture, actif, "
+        "derniere_activite) VALUES (?, 1, ?, ?, 10000000, 'COURANT', '2024-01-01', 1, '2024-01-02')",
+        ((i + 1, f'CM76{i:024d}', solde) for i, solde in enumerate(soldes))
+    )
+    base.executemany(
+        "INSERT INTO banking_transaction(type_transaction, compte_source_id, compte_destination_id, montant, "
+        "description, date_transaction, iban_contrepartie) VALUES (?, ?, ?, ?, '', '2024-01-02 00:00:00', '')",
+        lignes
+    )
+    base.commit()
+    base.close()
+
+
+def par_instances():
+    soldes = defaultdict(int)
+    for compte in Compte.objects.only('id', 'solde_ouverture').iterator(chunk_size=10_000):
+        soldes[compte.id] = compte.solde_ouverture
+    for trans in BankTransaction.objects.order_by().iterator(chunk_size=10_000):
+        if trans.compte_source_id is not None:
+            soldes[trans.compte_source_id] += trans.montant if trans.type_transaction == 'DEPOT' else -trans.montant
+        if trans.compte_destination_id is not None:
+            soldes[trans.compte_destination_id] += trans.montant
+    return soldes
+
+
+def mesurer(fonction):
+    debut = time.perf_counter()
+    resultat = fonction()
+    return time.perf_counter() - debut, resultat
+
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    nb_comptes = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    try:
+        call_command('migrate', verbosity=0)
+        remplir(nombre, nb_comptes)
+        attendus = dict(Compte.objects.values_list('id', 'solde'))
+
+        duree_instances, soldes = mesurer(par_instances)
+        assert soldes == attendus
+
+        def en_flux():
+            livre = charger_comptes()
+            livre.appliquer(mouvements())
+            return livre
+        duree_flux, livre = mesurer(en_flux)
+        assert {i: depuis_centimes(s) for i, s in zip(livre.ids, livre.soldes)} == attendus
+
+        lignes = list(mouvements())
+        livre = charger_comptes()
+        duree_memoire, _ = mesurer(lambda: livre.appliquer(lignes))
+
+        print(f"{nombre} transactions, {nb_comptes} comptes\n")
+        print(f"{'rejeu':<36} {'durée':>8} {'lignes/s':>12}")
+        for nom, duree in (
+            ("instances Transaction (Decimal)", duree_instances),
+            ("GrandLivre, flux values_list", duree_flux),
+            ("GrandLivre, lignes en mémoire", duree_memoire),
+        ):
+            print(f"{nom:<36} {duree:>7.2f}s {nombre / duree:>12,.0f}")
+    finally:
+        connection.close()
+        shutil.rmtree(DOSSIER, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark du calcul des intérêts des comptes épargne.
+
+Usage (base dédiée, ne pas lancer sur la base de production) :
+    DB_NAME=bench.sqlite3 python manage.py migrate
+    DB_NAME=bench.sqlite3 python benchmarks/bench_interets.py 100000 [taille_lot]
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+# Setup Django environment
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'banking_project.settings')
+django.setup()
+
+from django.db import transaction
+from django.utils import timezone
+
+from banking.interets import TAILLE_LOT, calculer_interets
+from banking.models import Client, Compte, Transaction as BankTransaction
+
+PERIODE = '2024-01'
+DEBUT = timezone.make_aware(datetime(2024, 1, 1))
+
+
+def remplir(nombre, taille_lot=10000):
+    """``nombre`` savings accounts opened before the period, each with a few January deposits"""
+    for debut in range(0, nombre, taille_lot):
+        with transaction.atomic():
+            clients = Client.objects.bulk_create([
+                Client(nom=f"Bench{i}", prenom='Epargne', cni=f"BENCH-INT-{i:09d}",
+                       email=f"bench.int{i}@example.cm", telephone='+237600000000', adresse='Yaoundé')
+                for i in range(debut, min(debut + taille_lot, nombre))
+            ])
+            comptes = Compte.objects.bulk_create([
+                Compte(client=client, iban=f"CM76INT{client.id:021d}", type_compte='EPARGNE',
+                       solde=Decimal(random.randint(0, 2_000_000)))
+                for client in clients
+            ])
+            Compte.objects.filter(id__in=[c.id for c in comptes]).update(date_ouverture=DEBUT - timedelta(days=30))
+            depots = [
+                BankTransaction(compte_source=compte, type_transaction='DEPOT', montant=Decimal(random.randint(1, 50_000)))
+                for compte in comptes for _ in range(3)
+            ]
+            BankTransaction.objects.bulk_create(depots)
+            for depot in depots:
+                depot.date_transaction = DEBUT + timedelta(days=random.randint(0, 30), hours=12)
+            BankTransaction.objects.bulk_update(depots, ['date_transaction'], batch_size=1000)
+
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    taille_lot = int(sys.argv[2]) if len(sys.argv) > 2 else TAILLE_LOT
+    remplir(nombre)
+
+    rapport = calculer_interets(PERIODE, taille_lot=taille_lot)
+    print(f"{rapport['comptes']} comptes, {rapport['total']} F CFA versés en {rapport['duree']:.1f} s "
+          f"({rapport['comptes_par_seconde']:.0f} comptes/s)")
+
+
+if __name__ == '__main__':
+    main()
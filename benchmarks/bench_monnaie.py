@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark montants Decimal (ancien DecimalField) contre centimes entiers (MoneyField).
+
+Mesure, sur N montants :
+- la conversion des valeurs lues en base (convertisseur Decimal de Django vs MoneyField) ;
+- la somme en Python (Decimal vs int) ;
+- la préparation NumPy des analyses (float * 100 arrondi vs centimes lus tels quels) ;
+- SUM SQL sur SQLite (colonne decimal/REAL vs INTEGER).
+
+Usage :
+    python benchmarks/bench_monnaie.py [nombre]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+import django
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'banking_project.settings')
+django.setup()
+
+from django.db import connection, models
+from django.db.models.expressions import Col
+
+from banking.monnaie import MoneyField
+
+
+def mesurer(fonction, repetitions=5):
+    """Best duration in milliseconds and the last result"""
+    meilleur, resultat = float('inf'), None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction()
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur * 1000, resultat
+
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    generateur = random.Random(42)
+    centimes = [generateur.randint(1, 50_000_000) for _ in range(nombre)]
+    # Ce que SQLite renvoie pour un DecimalField : des float
+    reels = [c / 100 for c in centimes]
+    attendu = sum(centimes)
+
+    # Convertisseur appliqué par Django à chaque valeur lue d'une colonne DecimalField SQLite
+    colonne = Col('banking_transaction', models.DecimalField(max_digits=12, decimal_places=2))
+    convertisseur = connection.ops.get_decimalfield_converter(colonne)
+    champ_monnaie = MoneyField(max_digits=12)
+
+    lignes = []
+
+    duree_decimal, decimaux = mesurer(lambda: [convertisseur(v, colonne, connection) for v in reels])
+    duree_monnaie, _ = mesurer(lambda: [champ_monnaie.from_db_value(v, None, connection) for v in centimes])
+    lignes.append(("Lecture (conversion par ligne)", duree_decimal, duree_monnaie))
+
+    duree_decimal, total_decimal = mesurer(lambda: sum(decimaux, Decimal('0')))
+    duree_monnaie, total_centimes = mesurer(lambda: sum(centimes))
+    lignes.append(("Somme Python", duree_decimal, duree_monnaie))
+    assert total_decimal.scaleb(2) == attendu == total_centimes
+
+    duree_decimal, _ = mesurer(lambda: np.rint(np.array(decimaux, dtype=np.float64) * 100).astype(np.int64))
+    duree_monnaie, _ = mesurer(lambda: np.array(centimes, dtype=np.int64))
+    lignes.append(("Colonnes NumPy (analyses)", duree_decimal, duree_monnaie))
+
+    base = sqlite3.connect(':memory:')
+    base.execute("CREATE TABLE ancien (montant decimal NOT NULL)")
+    base.execute("CREATE TABLE nouveau (montant bigint NOT NULL)")
+    base.executemany("INSERT INTO ancien VALUES (?)", ((v,) for v in reels))
+    base.executemany("INSERT INTO nouveau VALUES (?)", ((c,) for c in centimes))
+    duree_decimal, somme_reelle = mesurer(lambda: base.execute("SELECT SUM(montant) FROM ancien").fetchone()[0])
+    duree_monnaie, somme_entiere = mesurer(lambda: base.execute("SELECT SUM(montant) FROM nouveau").fetchone()[0])
+    lignes.append(("SUM SQLite", duree_decimal, duree_monnaie))
+
+    print(f"{nombre} montants\n")
+    print(f"{'étape':<32} {'Decimal':>10} {'centimes':>10} {'gain':>7}")
+    for nom, avant, apres in lignes:
+        print(f"{nom:<32} {avant:>8.1f}ms {apres:>8.1f}ms {avant / apres:>6.1f}x")
+    print(f"\nExactitude de SUM sur SQLite : decimal/REAL {Decimal(repr(somme_reelle))} "
+          f"contre {Decimal(somme_entiere).scaleb(-2)} en centimes (attendu {Decimal(attendu).scaleb(-2)})")
+
+
+if __name__ == '__main__':
+    main()
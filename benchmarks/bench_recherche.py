@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la recherche de clients : index plein texte vs scans icontains.
+
+Usage (base dédiée, ne pas lancer sur la base de production) :
+    DB_NAME=bench.sqlite3 python manage.py migrate
+    DB_NAME=bench.sqlite3 python benchmarks/bench_recherche.py 1000000
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import django
+
+# Setup Django environment
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'banking_project.settings')
+django.setup()
+
+from django.db import transaction
+from django.db.models import Q
+
+from banking.models import Client
+from banking.search import rechercher_ids, reindexer_clients
+
+NOMS = ['Tandjigora', 'Mbarga', 'Nkoulou', 'Ekambi', 'Fouda', 'Abena', 'Ndongo', 'Etoa', 'Manga', 'Bella']
+PRENOMS = ['Emmanuel', 'Brigitte', 'Samuel', 'Aminatou', 'Paul', 'Yvonne', 'Joseph', 'Clarisse', 'Didier', 'Nadège']
+TERMES = ['mbarga', 'Nadège', 'fouda sam', 'CM-00000123', 'paul.fouda12', 'ndongo clar', 'Bell']
+
+
+def remplir(nombre, taille_lot=10000):
+    """Bulk-insert synthetic clients up to ``nombre`` rows"""
+    existants = Client.objects.count()
+    for debut in range(existants, nombre, taille_lot):
+        lot = []
+        for i in range(debut, min(debut + taille_lot, nombre)):
+            nom, prenom = random.choice(NOMS), random.choice(PRENOMS)
+            lot.append(Client(
+                nom=f"{nom}{i % 997}", prenom=prenom, cni=f"CM-{i:010d}",
+                email=f"{prenom.lower()}.{nom.lower()}{i}@example.cm",
+                telephone='+237600000000', adresse='Yaoundé'
+            ))
+        with transaction.atomic():
+            Client.objects.bulk_create(lot)
+    return Client.objects.count()
+
+
+def mesurer(fonction, repetitions=20):
+    """Median and p95 latency in milliseconds"""
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append((time.perf_counter() - debut) * 1000)
+    durees.sort()
+    return statistics.median(durees), durees[int(len(durees) * 0.95) - 1]
+
+
+def scan_icontains(terme):
+    filtre = Q()
+    for champ in ('nom', 'prenom', 'cni', 'email'):
+        filtre |= Q(**{f'{champ}__icontains': terme})
+    return list(Client.objects.filter(filtre).values_list('pk', flat=True)[:500])
+
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    debut = time.perf_counter()
+    total = remplir(nombre)
+    print(f"{total} clients en base ({time.perf_counter() - debut:.1f} s)")
+
+    debut = time.perf_counter()
+    reindexer_clients()
+    print(f"Index reconstruit en {time.perf_counter() - debut:.1f} s\n")
+
+    print(f"{'terme':<15} {'index p50':>10} {'index p95':>10} {'scan p50':>10} {'scan p95':>10}")
+    for terme in TERMES:
+        index = mesurer(lambda: rechercher_ids(terme))
+        scan = mesurer(lambda: scan_icontains(terme), repetitions=3)
+        print(f"{terme:<15} {index[0]:>8.2f}ms {index[1]:>8.2f}ms {scan[0]:>8.2f}ms {scan[1]:>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark du débit d'écriture selon le nombre de shards SQLite (1, 2, 4).
+
+Chaque configuration repart de bases neuves, ouvre NB_COMPTES comptes répartis
+sur les shards, puis des threads enchaînent pendant ``secondes`` des dépôts et
+des virements (intra ou inter-shards) sur des comptes tirés au hasard. SQLite
+sérialise les écritures d'un fichier : avec plusieurs shards, les écrivains de
+shards différents ne s'attendent plus.
+
+Usage :
+    python benchmarks/bench_shards.py [threads] [secondes]
+"""
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+DOSSIER = tempfile.mkdtemp(prefix='bench-shards-')
+SHARDS_MAX = 4
+os.environ['DB_NAME'] = os.path.join(DOSSIER, 'shard0.sqlite3')
+os.environ['DB_SHARDS'] = ','.join(os.path.join(DOSSIER, f'shard{i}.sqlite3') for i in range(1, SHARDS_MAX))
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'banking_project.settings')
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connections
+from django.db.models import Sum
+
+from banking.models import Client, Compte
+from banking.operations import effectuer_depot, effectuer_virement
+from banking.virements_intershards import reprendre_virements_intershards
+
+NB_COMPTES = 200
+SOLDE_INITIAL = Decimal('1000000')
+MONTANT_DEPOT = Decimal('10')
+ALIAS = ['default', *(f'shard{i}' for i in range(1, SHARDS_MAX))]
+
+
+def preparer(nombre):
+    """Fresh databases for the first ``nombre`` aliases; returns the (id, iban) of the accounts"""
+    connections.close_all()
+    modele = os.path.join(DOSSIER, 'modele.sqlite3')
+    for alias in ALIAS[:nombre]:
+        chemin = connections.settings[alias]['NAME']
+        for suffixe in ('', '-wal', '-shm'):
+            if os.path.exists(f'{chemin}{suffixe}'):
+                os.unlink(f'{chemin}{suffixe}')
+        shutil.copyfile(modele, chemin)
+    settings.SHARDS = ALIAS[:nombre]
+
+    comptes = []
+    for i in range(NB_COMPTES):
+        client = Client.objects.create(
+            nom=f'Nom{i}', prenom='Bench', cni=f'BENCH-{i}', email=f'bench{i}@example.cm',
+            telephone='+237600000000', adresse='Douala',
+        )
+        compte = Compte.objects.create(client=client, iban=f'CM76{i:024d}', solde=SOLDE_INITIAL)
+        comptes.append((compte.id, compte.iban))
+    connections.close_all()
+    return comptes
+
+
+def executer(nombre, threads, duree):
+    comptes = preparer(nombre)
+    compteurs = {'operations': 0, 'depots': 0, 'erreurs': 0}
+    verrou = threading.Lock()
+    fin = time.monotonic() + duree
+
+    def travailler(graine):
+        generateur = random.Random(graine)
+        operations = depots = erreurs = 0
+        while time.monotonic() < fin:
+            (compte_id, _), (_, iban) = generateur.sample(comptes, 2)
+            try:
+                if generateur.random() < 0.5:
+                    effectuer_depot(compte_id, MONTANT_DEPOT)
+                    depots += 1
+                else:
+                    effectuer_virement(compte_id, iban, Decimal('1'))
+                operations += 1
+            except DatabaseError:
+                # SQLite « database is locked » : opération annulée, comptée comme conflit
+                erreurs += 1
+        connections.close_all()
+        with verrou:
+            compteurs['operations'] += operations
+            compteurs['depots'] += depots
+            compteurs['erreurs'] += erreurs
+
+    travailleurs = [threading.Thread(target=travailler, args=(i,)) for i in range(threads)]
+    for travailleur in travailleurs:
+        travailleur.start()
+    for travailleur in travailleurs:
+        travailleur.join()
+
+    # Crédits inter-shards différés par un verrou : la reprise les termine et l'argent est conservé
+    reprendre_virements_intershards(delai=timedelta(0))
+    total = sum(Compte.objects.using(alias).aggregate(t=Sum('solde'))['t'] for alias in settings.SHARDS)
+    assert total == NB_COMPTES * SOLDE_INITIAL + compteurs['depots'] * MONTANT_DEPOT, total
+    return compteurs['operations'] / duree, compteurs['erreurs']
+
+
+def main():
+    # Les crédits différés journalisent un avertissement chacun
+    logging.disable(logging.WARNING)
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    duree = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    connections.settings['modele'] = {**connections.settings['default'], 'NAME': os.path.join(DOSSIER, 'modele.sqlite3')}
+    call_command('migrate', database='modele', verbosity=0)
+    connections['modele'].close()
+
+    try:
+        print(f"{threads} threads, {duree:g} s par configuration, {NB_COMPTES} comptes\n")
+        print(f"{'shards':>6} {'opérations/s':>13} {'erreurs':>8} {'gain':>6}")
+        reference = None
+        for nombre in (1, 2, 4):
+            debit, erreurs = executer(nombre, threads, duree)
+            reference = reference or debit
+            print(f"{nombre:>6} {debit:>13.0f} {erreurs:>8} {debit / reference:>5.1f}x")
+    finally:
+        connections.close_all()
+        shutil.rmtree(DOSSIER, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark du rendu des pages à 1 000 lignes : chargeur sans cache, chargeur
+en cache, puis chargeur en cache avec fragments déjà en cache.
+
+Les objets sont construits en mémoire : aucune base n'est nécessaire.
+
+Usage :
+    python benchmarks/bench_templates.py [lignes] [repetitions]
+"""
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+# Setup Django environment
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'banking_project.settings')
+django.setup()
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context
+from django.template.backends.django import DjangoTemplates
+from django.utils import timezone
+
+from banking.models import Client, Compte, Transaction as BankTransaction
+
+PAGES = ['banking/liste_comptes.html', 'banking/historique_transactions.html', 'banking/dashboard.html']
+
+
+def donnees(lignes):
+    """Context with ``lignes`` accounts and transactions, built in memory"""
+    maintenant = timezone.now()
+    comptes = []
+    for i in range(1, lignes + 1):
+        client = Client(id=i, nom=f"Nom{i}", prenom=f"Prenom{i}", cni=f"CNI{i}", email=f"c{i}@example.cm")
+        comptes.append(Compte(id=i, client=client, iban=f"CM76{i:026d}", solde=Decimal(i) * 100,
+                              type_compte='COURANT', date_ouverture=maintenant))
+    transactions = [
+        BankTransaction(id=i, compte_source=comptes[i - 1], compte_destination=comptes[i % lignes],
+                        type_transaction=('DEPOT', 'RETRAIT', 'VIREMENT')[i % 3], montant=Decimal(i),
+                        description=f"Opération {i}", date_transaction=maintenant)
+        for i in range(1, lignes + 1)
+    ]
+    return {
+        'comptes': comptes, 'compte': comptes[0], 'transactions': transactions,
+        'version_clients': 1, 'derniere_transaction': lignes, 'cle_fragment': f'bench:{lignes}',
+        'type_choices': BankTransaction.TYPE_CHOICES, 'filters': {}, 'DEVISE': 'F CFA',
+    }
+
+
+def moteur(cache_chargeur):
+    chargeurs = settings.CHARGEURS_TEMPLATES
+    if cache_chargeur:
+        chargeurs = [('django.template.loaders.cached.Loader', chargeurs)]
+    backend = DjangoTemplates({
+        'NAME': 'bench', 'DIRS': [], 'APP_DIRS': False, 'OPTIONS': {'loaders': chargeurs},
+    })
+    return backend.engine
+
+
+def mesurer(engine, page, contextes):
+    """Median render time in milliseconds over ``contextes``, template lookup included"""
+    durees = []
+    for contexte in contextes:
+        debut = time.perf_counter()
+        engine.get_template(page).render(Context(contexte))
+        durees.append((time.perf_counter() - debut) * 1000)
+    return statistics.median(durees)
+
+
+def main():
+    lignes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    contexte = donnees(lignes)
+
+    def froids(decalage):
+        # Versions différentes à chaque rendu : aucun fragment ne peut être réutilisé
+        return [
+            {**contexte, 'version_clients': v, 'derniere_transaction': v, 'cle_fragment': v}
+            for v in range(decalage, decalage + repetitions)
+        ]
+
+    print(f"{'page':<40} {'sans cache':>12} {'chargeur':>12} {'+ fragments':>12}")
+    for page in PAGES:
+        cache.clear()
+        sans_cache = mesurer(moteur(False), page, froids(0))
+        engine = moteur(True)
+        chargeur = mesurer(engine, page, froids(repetitions))
+        engine.get_template(page).render(Context(contexte))
+        fragments = mesurer(engine, page, [contexte] * repetitions)
+        print(f"{page:<40} {sans_cache:>10.1f}ms {chargeur:>10.1f}ms {fragments:>10.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark du traitement de nuit des virements permanents.
+
+Usage (base dédiée, ne pas lancer sur la base de production) :
+    DB_NAME=bench.sqlite3 python manage.py migrate
+    DB_NAME=bench.sqlite3 python benchmarks/bench_virements_permanents.py 100000 [taille_lot]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+# Setup Django environment
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'banking_project.settings')
+django.setup()
+
+from django.db import transaction
+
+from banking.models import Client, Compte, VirementPermanent
+from banking.virements_permanents import TAILLE_LOT, executer_virements_permanents
+
+JOUR = date(2030, 1, 5)
+
+
+def remplir(nombre, taille_lot=10000):
+    """One client and account per two orders, then ``nombre`` due orders"""
+    nb_comptes = max(nombre // 2, 2)
+    with transaction.atomic():
+        clients = Client.objects.bulk_create([
+            Client(nom=f"Bench{i}", prenom='Ordre', cni=f"BENCH-VP-{i:09d}",
+                   email=f"bench.vp{i}@example.cm", telephone='+237600000000', adresse='Douala')
+            for i in range(nb_comptes)
+        ], batch_size=taille_lot)
+        comptes = Compte.objects.bulk_create([
+            Compte(client=client, iban=f"CM76VP{i:022d}", solde=Decimal(random.choice(['0', '50000', '250000'])))
+            for i, client in enumerate(clients)
+        ], batch_size=taille_lot)
+
+    ids = [c.id for c in comptes]
+    for debut in range(0, nombre, taille_lot):
+        lot = []
+        for _ in range(debut, min(debut + taille_lot, nombre)):
+            source, destination = random.sample(ids, 2)
+            lot.append(VirementPermanent(
+                compte_source_id=source, compte_destination_id=destination,
+                montant=Decimal(random.randint(1, 500) * 100), description='Loyer',
+                date_debut=JOUR, prochaine_execution=JOUR,
+            ))
+        with transaction.atomic():
+            VirementPermanent.objects.bulk_create(lot)
+
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    taille_lot = int(sys.argv[2]) if len(sys.argv) > 2 else TAILLE_LOT
+
+    debut = time.perf_counter()
+    remplir(nombre)
+    print(f"{nombre} ordres créés ({time.perf_counter() - debut:.1f} s)")
+
+    rapport = executer_virements_permanents(JOUR, taille_lot=taille_lot)
+    traites = rapport['executes'] + rapport['rejetes']
+    print(f"{traites} ordres traités en {rapport['lots']} lots : {rapport['duree']:.1f} s "
+          f"({traites / rapport['duree']:.0f} ordres/s), "
+          f"{rapport['executes']} exécutés, {rapport['rejetes']} rejetés")
+
+
+if __name__ == '__main__':
+    main()